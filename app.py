@@ -4,11 +4,18 @@ from src.utils.safety import (
     extract_symptoms,
     identify_missing_symptoms,
     generate_recommendations,
-    client,
-    safety_check
+    stream_recommendations,
+    get_gateway,
+    init
 )
-from src.core.workflow import create_medical_workflow
+from src.core.workflow import warm_up_workflow, get_checkpointer
+from src.core.chat import stream_medical_chat
+from src.utils.structured_logging import log_event, request_context
+from src.utils.conversation_store import SessionConversation, get_conversation_store
 import logging
+import uuid
+
+logger = logging.getLogger(__name__)
 
 # Set page configuration
 st.set_page_config(
@@ -18,40 +25,32 @@ st.set_page_config(
 )
 
 # Initialize session state for storing conversation and medical history
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
-
 if "medical_history" not in st.session_state:
     st.session_state.medical_history = {"allergies": [], "conditions": []}
 
-
-def run_medical_chat(user_input: str, medical_history: dict) -> str:
-    """Execute the medical workflow for a given user input"""
-    try:
-        workflow = create_medical_workflow(
-            extract_fn=extract_symptoms,
-            recommend_fn=generate_recommendations,
-            missing_symptoms_fn=identify_missing_symptoms,
-            llm_client=client
-        )
-        initial_state = {
-            "user_input": user_input,
-            "symptoms": [],
-            "medical_history": medical_history,
-            "current_step": "",
-            "triage_level": None,
-            "language": "en",
-            "emergency_detected": False,
-            "response": None,
-            "needs_clarification": False,
-            "missing_symptoms": None
-        }
-        final_state = workflow.invoke(initial_state)
-        if final_state.get("response"):
-            return safety_check(final_state["response"])
-        return "No response generated. Please try again."
-    except Exception as e:
-        return f"An error occurred: {str(e)}"
+# Symptoms of earlier turns are kept in the workflow checkpoint of this thread
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = uuid.uuid4().hex
+
+# Only the latest messages stay in memory; older ones are paged in from the
+# local conversation store (see conversation_store)
+if "conversation" not in st.session_state:
+    st.session_state.conversation = SessionConversation(
+        get_conversation_store(), st.session_state.thread_id)
+conversation = st.session_state.conversation
+
+# Logging and Groq clients are set up once per process (init is idempotent)
+init()
+
+# Compile the workflow once per process; reruns and other sessions reuse it
+warm_up_workflow(
+    extract_fn=extract_symptoms,
+    recommend_fn=generate_recommendations,
+    missing_symptoms_fn=identify_missing_symptoms,
+    llm_client=get_gateway(),
+    stream_fn=stream_recommendations,
+    checkpointer=get_checkpointer()
+)
 
 
 # App title
@@ -87,12 +86,23 @@ with st.sidebar:
 
 # Display conversation history
 st.subheader("Conversation")
-for message in st.session_state.conversation_history:
-    if message["role"] == "user":
-        st.write(f"**You:** {message['content']}")
-    else:
-        st.write(f"**Assistant:** {message['content']}")
-        st.write("---")
+hidden = conversation.hidden_count()
+if hidden and st.button(f"Show earlier messages ({hidden} more)"):
+    conversation.load_earlier()
+    st.rerun()
+if conversation.earlier and st.button("Hide earlier messages"):
+    conversation.hide_earlier()
+    st.rerun()
+
+for message in conversation.earlier:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+gap = conversation.gap_count()
+if gap:
+    st.caption(f"{gap} messages not shown")
+for message in conversation.recent:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
 
 # User input
 user_input = st.text_area(
@@ -102,16 +112,21 @@ user_input = st.text_area(
 if st.button("Submit"):
     if user_input:
         # Add user message to conversation history
-        st.session_state.conversation_history.append(
-            {"role": "user", "content": user_input})
-
-        # Get medical assistant response
-        response = run_medical_chat(
-            user_input, st.session_state.medical_history)
+        conversation.append("user", user_input)
+
+        # Stream the medical assistant response as it is generated
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        with st.chat_message("assistant"), request_context():
+            log_event(logger, logging.INFO, "chat_submitted",
+                      input_chars=len(user_input),
+                      turn=conversation.count)
+            response = st.write_stream(stream_medical_chat(
+                user_input, st.session_state.medical_history,
+                thread_id=st.session_state.thread_id))
 
         # Add assistant response to conversation history
-        st.session_state.conversation_history.append(
-            {"role": "assistant", "content": response})
+        conversation.append("assistant", response)
 
         # Rerun the app to update the conversation display
         st.rerun()
@@ -120,5 +135,12 @@ if st.button("Submit"):
 
 # Clear conversation button
 if st.button("Clear Conversation"):
-    st.session_state.conversation_history = []
+    # A new thread starts the symptom collection over; the old one is
+    # dropped from the checkpointer rather than left to expire
+    try:
+        get_checkpointer().delete_thread(st.session_state.thread_id)
+    except Exception as e:
+        logger.error(f"Failed to delete conversation thread: {str(e)}")
+    st.session_state.thread_id = uuid.uuid4().hex
+    conversation.clear(st.session_state.thread_id)
     st.rerun()
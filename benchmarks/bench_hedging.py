@@ -0,0 +1,67 @@
+"""Tail latency of one provider against a hedged pair.
+
+Two fake Groq servers: the primary answers quickly but a share of its
+requests stall, the alternate is slightly slower but steady. Reports
+p50/p95/p99 for the primary alone and behind a HedgedClient.
+
+    python -m benchmarks.bench_hedging --requests 300 --tail-rate 0.03
+"""
+import argparse
+import logging
+import time
+from groq import Groq
+from benchmarks.bench_workflow import percentile
+from benchmarks.fake_groq_server import FakeServerConfig, start_fake_server
+from src.utils.providers import HedgedClient
+
+REQUEST = {
+    "model": "llama-3.1-8b-instant",
+    "messages": [{"role": "user", "content": "Suggest rest and fluids for a cold"}],
+    "max_tokens": 100
+}
+
+
+def _latencies(client, requests: int):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.chat.completions.create(**REQUEST)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _report(label: str, samples) -> None:
+    print(f"{label:<10} " + "  ".join(
+        f"p{pct}={percentile(samples, pct) * 1000:7.1f} ms" for pct in (50, 95, 99)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hedged against unhedged LLM calls")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tail-rate", type=float, default=0.03)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--alternate-latency", type=float, default=0.04)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    primary_server = start_fake_server(FakeServerConfig(
+        latency=args.latency, tail_rate=args.tail_rate, tail_latency=args.tail_latency, seed=1))
+    alternate_server = start_fake_server(FakeServerConfig(latency=args.alternate_latency, seed=2))
+    try:
+        primary = Groq(api_key="fake", base_url=primary_server.base_url, max_retries=0)
+        alternate = Groq(api_key="fake", base_url=alternate_server.base_url, max_retries=0)
+        _report("primary", _latencies(primary, args.requests))
+        # Warmed so the hedge delay comes from observed latencies
+        hedged = HedgedClient([("primary", primary), ("alternate", alternate)])
+        _latencies(hedged, 50)
+        _report("hedged", _latencies(hedged, args.requests))
+        for name, health in hedged.health_report().items():
+            print(f"{name}: {health}")
+    finally:
+        primary_server.shutdown()
+        alternate_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Microbenchmark: identify_missing_symptoms against the original nested scan.
+
+    python -m benchmarks.bench_missing_symptoms
+"""
+import logging
+import timeit
+from src.utils.safety import identify_missing_symptoms
+
+LEGACY_REQUIRED_DETAILS = {
+    "chest_pain": ["duration", "radiation", "intensity"],
+    "headache": ["onset", "frequency", "associated_nausea"],
+    "fever": ["duration", "max_temperature", "response_to_medication"]
+}
+
+
+def legacy_identify_missing_symptoms(state_symptoms):
+    """The O(S^2 * D) implementation this benchmark compares against"""
+    missing = []
+    for symptom in state_symptoms:
+        if symptom in LEGACY_REQUIRED_DETAILS:
+            for detail in LEGACY_REQUIRED_DETAILS[symptom]:
+                if not any(detail in s for s in state_symptoms):
+                    missing.append(f"{symptom}_{detail}")
+    return missing if missing else None
+
+
+def make_symptoms(size: int):
+    """Degenerate extraction output: known symptoms repeated throughout a
+    reasoning dump, as in medical_system.log"""
+    known = ["headache", "fever", "chest_pain"]
+    return [
+        known[(i // 4) % 3] if i % 4 == 0
+        else f"the patient might be describing item {i} of a reasoning dump"
+        for i in range(size)
+    ]
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    print(f"{'symptoms':>10} {'legacy (us)':>14} {'indexed (us)':>14} {'speedup':>9}")
+    for size in (3, 10, 50, 200, 1000):
+        symptoms = make_symptoms(size)
+        assert identify_missing_symptoms(symptoms) == legacy_identify_missing_symptoms(symptoms)
+        number = max(2000 // size, 5)
+        legacy = timeit.timeit(
+            lambda: legacy_identify_missing_symptoms(symptoms), number=number) / number
+        indexed = timeit.timeit(
+            lambda: identify_missing_symptoms(symptoms), number=number) / number
+        print(f"{size:>10} {legacy * 1e6:>14.1f} {indexed * 1e6:>14.1f} {legacy / indexed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""End-to-end benchmark against the local fake Groq server.
+
+Drives the compiled workflow (``workflow.invoke``) and ``run_medical_chat``
+at fixed concurrency levels and reports throughput, p50/p95/p99 latency and
+memory per request. No network access or API key is needed.
+
+    python -m benchmarks.bench_workflow --concurrency 1 4 16 --requests 200
+    python -m benchmarks.bench_workflow --compare benchmarks/results/<old>.json
+
+Results are written as JSON (by default benchmarks/results/<commit>.json)
+so runs can be compared across commits.
+"""
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.fake_groq_server import FakeServerConfig, start_fake_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+HISTORY = {"allergies": ["penicillin"], "conditions": ["asthma"]}
+
+
+def make_messages(count: int) -> List[str]:
+    """Distinct messages the local lexicon cannot fully cover, so every one
+    reaches the (fake) LLM"""
+    return [f"patient {i} reports feeling unwell with a scratchy feeling since visit {i % 7}"
+            for i in range(count)]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _run_level(call: Callable[[str], Any], messages: List[str], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+
+    def timed(message: str) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(message)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, messages))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(messages),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(messages) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2)
+        }
+    }
+
+
+def _memory_per_request(call: Callable[[str], Any], messages: List[str], concurrency: int) -> Dict[str, Any]:
+    """Separate pass under tracemalloc (which slows Python down, so its
+    timings are not reported)"""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(call, messages))
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib_per_inflight_request": round((peak - baseline) / 1024 / concurrency, 1),
+        "retained_kib_per_request": round(max(0, current - baseline) / 1024 / len(messages), 2)
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _scenarios() -> Dict[str, Callable[[str], Any]]:
+    # Imported after GROQ_BASE_URL is set so the shared gateway targets the fake server
+    from src.utils.safety import (
+        extract_symptoms,
+        generate_recommendations,
+        identify_missing_symptoms,
+        get_gateway,
+        set_response_cache
+    )
+    from src.core.workflow import build_initial_state, create_medical_workflow
+    from src.core.chat import run_medical_chat
+
+    # Every request should pay for its LLM calls
+    set_response_cache(None)
+    workflow = create_medical_workflow(
+        extract_fn=extract_symptoms,
+        recommend_fn=generate_recommendations,
+        missing_symptoms_fn=identify_missing_symptoms,
+        llm_client=get_gateway()
+    )
+    return {
+        "workflow_invoke": lambda message: workflow.invoke(build_initial_state(message, HISTORY)),
+        "run_medical_chat": lambda message: run_medical_chat(message, HISTORY)
+    }
+
+
+def run_benchmark(concurrency_levels: List[int], requests: int,
+                  config: FakeServerConfig, memory: bool = True) -> Dict[str, Any]:
+    server = start_fake_server(config)
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    try:
+        scenarios = _scenarios()
+        results = []
+        for name, call in scenarios.items():
+            # Warm-up: connection pool, compiled graph, lazily built matchers
+            _run_level(call, make_messages(4), 2)
+            for concurrency in concurrency_levels:
+                messages = make_messages(requests)
+                entry = {"scenario": name, "concurrency": concurrency,
+                         **_run_level(call, messages, concurrency)}
+                if memory:
+                    entry["memory"] = _memory_per_request(
+                        call, make_messages(min(requests, 50)), concurrency)
+                results.append(entry)
+                print(f"{name:>18} c={concurrency:<3} {entry['throughput_rps']:>8.1f} req/s  "
+                      f"p50 {entry['latency_ms']['p50']:>8.1f} ms  "
+                      f"p95 {entry['latency_ms']['p95']:>8.1f} ms  "
+                      f"p99 {entry['latency_ms']['p99']:>8.1f} ms  errors {entry['errors']}")
+    finally:
+        server.shutdown()
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fake_server": vars(config),
+        "requests_per_level": requests,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Print throughput and p95 changes between two result files"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"vs {baseline.get('commit')}:")
+    for result in current["results"]:
+        old = previous.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        rps = (result["throughput_rps"] / old["throughput_rps"] - 1) * 100
+        p95 = (result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1) * 100
+        print(f"{result['scenario']:>18} c={result['concurrency']:<3} "
+              f"throughput {rps:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the workflow against a fake Groq API")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per level")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    config = FakeServerConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              error_rate=args.error_rate, seed=args.seed)
+    report = run_benchmark(args.concurrency, args.requests, config, memory=not args.no_memory)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
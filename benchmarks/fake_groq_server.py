@@ -0,0 +1,219 @@
+"""Deterministic stand-in for the Groq chat completions API.
+
+Serves ``POST /openai/v1/chat/completions`` (the path the Groq SDK calls)
+with configurable latency, token rate and error injection, including
+``stream=True`` as server-sent events. Point the app at it with
+``GROQ_BASE_URL=http://127.0.0.1:<port>`` and any GROQ_API_KEY:
+
+    python -m benchmarks.fake_groq_server --port 8765 --latency 0.2 --tokens-per-second 200
+
+Replies depend only on the request and the seed, so runs are repeatable.
+"""
+from typing import Any, Dict, Optional, Tuple
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+EXTRACTION_REPLY = {"symptoms": [
+    {"name": "cough", "duration": "3 days", "severity": "mild"},
+    {"name": "sore_throat", "onset": "gradual"}
+]}
+RECOMMENDATION_WORDS = (
+    "Rest as much as you can, drink plenty of fluids and monitor your "
+    "temperature twice a day. Warm salt water gargles and honey may ease the "
+    "throat. See a doctor if the cough lasts more than two weeks, if you "
+    "develop a high fever, or if breathing becomes difficult."
+).split()
+
+
+@dataclass
+class FakeServerConfig:
+    latency: float = 0.05            # seconds before the first token
+    tokens_per_second: float = 0.0   # 0 sends the whole reply at once
+    completion_tokens: int = 60      # length of free-text replies
+    error_rate: float = 0.0          # share of requests that fail
+    error_status: int = 429          # 429 carries a Retry-After header
+    retry_after: float = 0.05
+    tail_rate: float = 0.0           # share of requests that are slow
+    tail_latency: float = 1.0        # extra seconds for those requests
+    seed: int = 0
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    return sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+
+
+def _reply_text(body: Dict[str, Any], config: FakeServerConfig) -> str:
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps(EXTRACTION_REPLY)
+    words = [RECOMMENDATION_WORDS[i % len(RECOMMENDATION_WORDS)]
+             for i in range(config.completion_tokens)]
+    return " ".join(words)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed
+    # ACKs add ~40 ms to every keep-alive request
+    disable_nagle_algorithm = True
+    server: "FakeGroqServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any],
+                   headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        body = json.loads(raw or b"{}")
+        config = self.server.config
+        request_number = self.server.next_request_number()
+
+        # Seeded per request, so a request's fate does not depend on thread timing
+        rng = random.Random(f"{config.seed}:{request_number}")
+        failed = rng.random() < config.error_rate
+        slow = rng.random() < config.tail_rate
+        time.sleep(config.latency + (config.tail_latency if slow else 0.0))
+        if failed:
+            headers = {"retry-after": str(config.retry_after)} if config.error_status == 429 else {}
+            self._send_json(config.error_status, {"error": {
+                "message": "injected failure", "type": "fake_error"}}, headers)
+            return
+
+        text = _reply_text(body, config)
+        completion_id = "chatcmpl-" + hashlib.sha1(raw).hexdigest()[:16]
+        usage = {
+            "prompt_tokens": _prompt_tokens(body),
+            "completion_tokens": len(text.split()),
+            "total_tokens": _prompt_tokens(body) + len(text.split())
+        }
+        if body.get("stream"):
+            self._stream(body, text, completion_id, usage, config)
+            return
+        if config.tokens_per_second:
+            time.sleep(len(text.split()) / config.tokens_per_second)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": usage
+        })
+
+    def _stream(self, body: Dict[str, Any], text: str, completion_id: str,
+                usage: Dict[str, int], config: FakeServerConfig) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None, extra=None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **(extra or {})
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if config.tokens_per_second:
+                time.sleep(1 / config.tokens_per_second)
+            event({"content": word if i == 0 else " " + word})
+        # Groq reports usage on the last chunk under x_groq
+        event({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: FakeServerConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    def handle_error(self, request, client_address) -> None:
+        # Hedged or cancelled clients hang up before their reply is sent
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def next_request_number(self) -> int:
+        with self._count_lock:
+            self.requests += 1
+            return self.requests
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_server(config: Optional[FakeServerConfig] = None,
+                      host: str = "127.0.0.1", port: int = 0) -> FakeGroqServer:
+    """Serve in a background thread; ``port=0`` picks a free port. Stop
+    with ``server.shutdown()``."""
+    server = FakeGroqServer((host, port), config or FakeServerConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = FakeServerConfig(
+        latency=args.latency, tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+        error_status=args.error_status, tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency, seed=args.seed)
+    server = FakeGroqServer((args.host, args.port), config)
+    print(f"Fake Groq API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Headless ASGI service for the medical workflow.
+
+    uvicorn src.api.server:app --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints (under /api, matching the Angular frontend's ``apiUrl``):
+
+- ``POST /api/chat/message``: one answer as JSON
+- ``POST /api/chat/stream``: the answer as server-sent events,
+  ``data: {"token": ...}`` per chunk and a final ``event: done``
+- ``GET /metrics``: Prometheus metrics, ``GET /healthz``: liveness
+
+Both endpoints continue the same conversations: a thread_id started on
+one can go on with the other. Conversations live in the checkpointer
+selected by MEDICAL_CHECKPOINT_BACKEND. The default in-memory one is
+shared by the endpoints of one worker process only, so with several
+workers either route each thread_id to the same worker or set
+MEDICAL_CHECKPOINT_BACKEND=sqlite, which every worker on a host shares
+through MEDICAL_CHECKPOINT_PATH. With MEDICAL_CACHE_PATH set the workers
+on a host also share one SQLite response cache. Identical concurrent
+stateless requests are coalesced into a single workflow run.
+"""
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import uuid
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from src.core.chat import arun_medical_chat, stream_medical_chat
+from src.core.workflow import get_checkpointer
+from src.integrations.emergency_services import get_facility_index
+from src.knowledge_graph.red_flags import screen_emergency
+from src.utils.cache import RequestCoalescer, SQLiteCache, make_cache_key
+from src.utils.safety import configure_logging, set_response_cache
+from src.utils.structured_logging import log_event, request_context
+from src.utils.telemetry import render_prometheus
+
+logger = logging.getLogger(__name__)
+
+
+class MedicalHistory(BaseModel):
+    allergies: List[str] = Field(default_factory=list)
+    conditions: List[str] = Field(default_factory=list)
+
+
+class Location(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+
+class ChatRequest(BaseModel):
+    content: str = Field(min_length=1, max_length=4000)
+    medical_history: MedicalHistory = Field(default_factory=MedicalHistory)
+    # Turns sharing a thread_id continue one conversation
+    thread_id: Optional[str] = Field(default=None, max_length=128)
+    # Lets emergency answers name the nearest emergency department
+    location: Optional[Location] = None
+
+    def coordinates(self) -> Optional[Tuple[float, float]]:
+        return (self.location.latitude, self.location.longitude) if self.location else None
+
+
+class ChatMessage(BaseModel):
+    id: str
+    content: str
+    timestamp: datetime
+    sender: str = "bot"
+    status: str = "sent"
+    thread_id: Optional[str] = None
+
+
+coalescer = RequestCoalescer()
+
+
+def _coalescing_key(request: ChatRequest) -> str:
+    history = request.medical_history.model_dump()
+    return make_cache_key(
+        "chat",
+        {"content": " ".join(request.content.lower().split()),
+         "medical_history": {field: sorted(item.lower() for item in items)
+                             for field, items in history.items()},
+         "location": request.coordinates()}
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    cache_path = os.getenv("MEDICAL_CACHE_PATH")
+    if cache_path:
+        set_response_cache(SQLiteCache(cache_path))
+    # Builds the red-flag matcher and the facility index (MEDICAL_FACILITIES_PATH)
+    # before the first emergency needs them
+    screen_emergency("")
+    get_facility_index()
+    # /chat/message (async) and /chat/stream (sync) share one conversation
+    # store; the async saver is created in the serving event loop
+    get_checkpointer()
+    get_checkpointer(asynchronous=True)
+    yield
+
+
+app = FastAPI(title="Medical Assistant API", lifespan=lifespan)
+
+
+@app.post("/api/chat/message", response_model=ChatMessage)
+async def chat_message(request: ChatRequest) -> ChatMessage:
+    with request_context() as request_id:
+        history: Dict = request.medical_history.model_dump()
+        log_event(logger, logging.INFO, "api_chat_message",
+                  input_chars=len(request.content), threaded=request.thread_id is not None)
+        if request.thread_id:
+            # Depends on the conversation so far; never shared
+            content = await arun_medical_chat(
+                request.content, history, request.thread_id, request.coordinates())
+        else:
+            content = await coalescer.run(
+                _coalescing_key(request),
+                lambda: arun_medical_chat(request.content, history,
+                                          location=request.coordinates()))
+        return ChatMessage(id=request_id, content=content,
+                           timestamp=datetime.now(timezone.utc), thread_id=request.thread_id)
+
+
+@app.post("/api/chat/stream")
+def chat_stream(request: ChatRequest) -> StreamingResponse:
+    history: Dict = request.medical_history.model_dump()
+
+    def events():
+        # Iterated in Starlette's threadpool, off the event loop
+        for chunk in stream_medical_chat(request.content, history, request.thread_id,
+                                         request.coordinates()):
+            yield f"data: {json.dumps({'token': chunk}, ensure_ascii=False)}\n\n"
+        yield f"event: done\ndata: {json.dumps({'id': uuid.uuid4().hex})}\n\n"
+
+    log_event(logger, logging.INFO, "api_chat_stream",
+              input_chars=len(request.content), threaded=request.thread_id is not None)
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    return render_prometheus()
+
+
+@app.get("/healthz")
+def healthz() -> Dict[str, str]:
+    return {"status": "ok"}
@@ -0,0 +1,187 @@
+"""Offline triage of a JSONL backlog of patient messages.
+
+Each input line is ``{"id": ..., "message": ..., "medical_history": {...}}``
+(``id`` defaults to the line number, and an optional ``"location": [lat,
+lon]`` names the nearest emergency department in emergency answers).
+Results are appended to the output JSONL as they complete, and a rerun
+against the same output file skips every id that already has a
+successful result, so an interrupted run can simply be restarted:
+
+    python -m src.core.batch messages.jsonl results.jsonl --concurrency 8 --requests-per-minute 30
+"""
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+from groq import RateLimitError
+from src.utils.llm_gateway import AsyncTokenBucket, retry_after_seconds
+from src.utils.safety import (
+    aextract_symptoms,
+    agenerate_recommendations,
+    identify_missing_symptoms,
+    get_async_gateway,
+    configure_logging,
+    safety_check
+)
+from src.utils.structured_logging import log_event, request_context
+from src.utils.telemetry import span
+from src.core.workflow import build_initial_state, get_async_medical_workflow
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 2.0
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids that already have a successful result in ``output_path``"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            if "error" not in result:
+                done.add(str(result.get("id")))
+    return done
+
+
+async def _read_records(input_path: str, skip: Set[str]) -> AsyncIterator[Dict[str, Any]]:
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+            except ValueError as e:
+                # One bad line is reported in the output, not fatal to the run
+                log_event(logger, logging.ERROR, "batch_record_invalid",
+                          line=line_number, error=str(e))
+                yield {"id": str(line_number), "error": f"Invalid record: {str(e)}"}
+                continue
+            record["id"] = str(record.get("id", line_number))
+            if record["id"] in skip:
+                continue
+            yield record
+            # Let the workers run between reads of a long file
+            await asyncio.sleep(0)
+
+
+async def triage_record(workflow, record: Dict[str, Any], limiter: Optional[AsyncTokenBucket]) -> Dict[str, Any]:
+    """Run one message through the workflow, retrying on rate limits"""
+    location = record.get("location")
+    state = build_initial_state(
+        record.get("message", ""), record.get("medical_history") or {"allergies": [], "conditions": []},
+        tuple(location) if location else None)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            final_state = await workflow.ainvoke(state)
+            response = final_state.get("response")
+            return {
+                "id": record["id"],
+                "response": safety_check(response) if response else None,
+                "triage_level": final_state.get("triage_level"),
+                "emergency_detected": final_state.get("emergency_detected", False),
+                "needs_clarification": final_state.get("needs_clarification", False),
+                "symptoms": final_state.get("symptoms", [])
+            }
+        except RateLimitError as e:
+            if attempt == MAX_ATTEMPTS:
+                return {"id": record["id"], "error": f"Rate limited: {str(e)}"}
+            delay = retry_after_seconds(e) or BASE_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            delay *= 1 + random.random() * 0.25
+            log_event(logger, logging.WARNING, "batch_rate_limited",
+                      record_id=record["id"], retry_in=round(delay, 1))
+            if limiter is not None:
+                # Everyone backs off, not only the worker that hit the limit
+                limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+        except Exception as e:
+            log_event(logger, logging.ERROR, "batch_record_failed",
+                      record_id=record["id"], error=str(e))
+            return {"id": record["id"], "error": str(e)}
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    requests_per_minute: Optional[float] = None,
+    workflow=None
+) -> Dict[str, int]:
+    """Triage every pending record of ``input_path`` into ``output_path``
+    with at most ``concurrency`` consultations in flight"""
+    workflow = workflow or get_async_medical_workflow(
+        extract_fn=aextract_symptoms,
+        recommend_fn=agenerate_recommendations,
+        missing_symptoms_fn=identify_missing_symptoms,
+        llm_client=get_async_gateway()
+    )
+    limiter = AsyncTokenBucket(requests_per_minute) if requests_per_minute else None
+    skip = completed_ids(output_path)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"succeeded": 0, "failed": 0, "skipped": len(skip)}
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                record = await queue.get()
+                try:
+                    if record is None:
+                        return
+                    if "error" in record:
+                        result = record
+                    else:
+                        with request_context(f"batch-{record['id']}"), span("triage_record", "turn"):
+                            result = await triage_record(workflow, record, limiter)
+                    counts["failed" if "error" in result else "succeeded"] += 1
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    # Every finished line is a checkpoint
+                    out.flush()
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            async for record in _read_records(input_path, skip):
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    log_event(logger, logging.INFO, "batch_complete", **counts)
+    return counts
+
+
+def main() -> None:
+    configure_logging()
+    parser = argparse.ArgumentParser(
+        description="Triage a JSONL backlog of patient messages")
+    parser.add_argument("input", help="JSONL file of messages")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=None,
+                        help="cap on consultations started per minute")
+    args = parser.parse_args()
+    counts = asyncio.run(run_batch(
+        args.input, args.output, args.concurrency, args.requests_per_minute))
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# chat.py
+from itertools import chain
+from typing import Any, Dict, Iterator, Optional, Tuple
+from src.utils.safety import (
+    extract_symptoms,
+    aextract_symptoms,
+    identify_missing_symptoms,
+    generate_recommendations,
+    agenerate_recommendations,
+    stream_recommendations,
+    get_gateway,
+    get_async_gateway,
+    safety_check,
+    stream_safety_check
+)
+from src.utils.structured_logging import request_context, run_in_own_context
+from src.utils.telemetry import span
+from src.core.workflow import (
+    build_initial_state,
+    build_turn_input,
+    get_checkpointer,
+    thread_config,
+    get_medical_workflow,
+    get_async_medical_workflow
+)
+
+
+Location = Optional[Tuple[float, float]]
+
+
+def _turn(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location):
+    """Graph input and invoke config: a fresh state, or with a thread_id
+    the next turn of that persisted conversation"""
+    if thread_id is None:
+        return build_initial_state(user_input, medical_history, location), None
+    return build_turn_input(user_input, medical_history, location), thread_config(thread_id)
+
+
+def run_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str] = None,
+                     location: Location = None) -> str:
+    """Execute the medical workflow for a given user input. Turns sharing a
+    ``thread_id`` build on the symptoms of the earlier ones; a (latitude,
+    longitude) ``location`` adds the nearest emergency department to
+    emergency answers."""
+    with request_context(), span("run_medical_chat", "turn"):
+        return _run_medical_chat(user_input, medical_history, thread_id, location)
+
+
+def _run_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location) -> str:
+    try:
+        workflow = get_medical_workflow(
+            extract_fn=extract_symptoms,
+            recommend_fn=generate_recommendations,
+            missing_symptoms_fn=identify_missing_symptoms,
+            llm_client=get_gateway(),
+            checkpointer=get_checkpointer() if thread_id else None
+        )
+        state, config = _turn(user_input, medical_history, thread_id, location)
+        final_state = workflow.invoke(state, config)
+        if final_state.get("response"):
+            return safety_check(final_state["response"])
+        return "No response generated. Please try again."
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+
+async def arun_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str] = None,
+                            location: Location = None) -> str:
+    """Async variant of run_medical_chat; the LLM calls never block the
+    event loop, so many consultations can be in flight at once"""
+    with request_context(), span("arun_medical_chat", "turn"):
+        return await _arun_medical_chat(user_input, medical_history, thread_id, location)
+
+
+async def _arun_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location) -> str:
+    try:
+        workflow = get_async_medical_workflow(
+            extract_fn=aextract_symptoms,
+            recommend_fn=agenerate_recommendations,
+            missing_symptoms_fn=identify_missing_symptoms,
+            llm_client=get_async_gateway(),
+            checkpointer=get_checkpointer(asynchronous=True) if thread_id else None
+        )
+        state, config = _turn(user_input, medical_history, thread_id, location)
+        final_state = await workflow.ainvoke(state, config)
+        if final_state.get("response"):
+            return safety_check(final_state["response"])
+        return "No response generated. Please try again."
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+
+def _stream_response(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location) -> Iterator[str]:
+    workflow = get_medical_workflow(
+        extract_fn=extract_symptoms,
+        recommend_fn=generate_recommendations,
+        missing_symptoms_fn=identify_missing_symptoms,
+        llm_client=get_gateway(),
+        stream_fn=stream_recommendations,
+        checkpointer=get_checkpointer() if thread_id else None
+    )
+    streamed = False
+    final_state: Dict[str, Any] = {}
+    state, config = _turn(user_input, medical_history, thread_id, location)
+    for mode, chunk in workflow.stream(
+            state, config, stream_mode=["custom", "values"]):
+        if mode == "custom":
+            streamed = True
+            yield chunk["token"]
+        else:
+            final_state = chunk
+
+    # Emergency and clarification answers are not generated token by token
+    if not streamed and final_state.get("response"):
+        yield final_state["response"]
+
+
+def stream_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str] = None,
+                        location: Location = None) -> Iterator[str]:
+    """Streaming variant of run_medical_chat: yields the answer as it is
+    generated, followed by the safety disclaimer"""
+    return run_in_own_context(_traced_stream(user_input, medical_history, thread_id, location))
+
+
+def _traced_stream(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location) -> Iterator[str]:
+    with request_context(), span("stream_medical_chat", "turn"):
+        yield from _stream_medical_chat(user_input, medical_history, thread_id, location)
+
+
+def _stream_medical_chat(user_input: str, medical_history: dict, thread_id: Optional[str], location: Location) -> Iterator[str]:
+    try:
+        chunks = _stream_response(user_input, medical_history, thread_id, location)
+        first = next(chunks, None)
+        if first is None:
+            yield "No response generated. Please try again."
+            return
+        yield from stream_safety_check(chain([first], chunks))
+    except Exception as e:
+        yield f"An error occurred: {str(e)}"
@@ -1,10 +1,92 @@
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Optional, Callable, Any
+from typing import TypedDict, List, Dict, Optional, Callable, Any, Iterator, Annotated, Tuple
+from collections import OrderedDict
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.memory import InMemorySaver
+from src.integrations.emergency_services import find_nearest_hospital
+from src.knowledge_graph.medical_knowledge import query_knowledge_graph
+from src.knowledge_graph.red_flags import screen_emergency
+from src.utils.structured_logging import log_event
+from src.utils.telemetry import trace_node
+
+logger = logging.getLogger(__name__)
+
+EMERGENCY_RESPONSE = (
+    "🚨 Please seek immediate medical attention! Call your local emergency "
+    "number (e.g. 911) or go to the nearest emergency department now."
+)
+
+
+def merge_findings(current: Optional[Dict[str, Any]], update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reducer letting the parallel analysis branches each add their own
+    keys to ``findings`` in the same step"""
+    return {**(current or {}), **(update or {})}
+
+
+# Symptoms kept for one conversation; the oldest go first
+MAX_CONVERSATION_SYMPTOMS = 50
+# Part of a clarification reply recorded against a pending detail
+MAX_ANSWER_CHARS = 100
+
+# Words showing which detail part of a clarification reply answers; a
+# detail not listed here is recognised by the words of its own name
+DETAIL_CUES: Dict[str, Tuple[str, ...]] = {
+    "duration": ("for", "since", "ago", "long", "minutes", "hours", "days", "weeks",
+                 "months", "years", "yesterday", "today", "morning", "night"),
+    "onset": ("started", "start", "starts", "began", "begin", "onset", "sudden",
+              "suddenly", "gradual", "gradually", "came on", "out of nowhere"),
+    "frequency": ("often", "times", "daily", "every", "constant", "constantly",
+                  "always", "occasionally", "sometimes", "once", "twice", "comes and goes"),
+    "intensity": ("mild", "moderate", "severe", "bad", "worst", "unbearable", "slight",
+                  "out of 10", "/10", "scale"),
+    "radiation": ("radiates", "radiating", "spreads", "spreading", "moves", "arm",
+                  "jaw", "shoulder", "neck", "back"),
+    "associated_nausea": ("nausea", "nauseous", "nauseated", "sick", "vomit", "vomited",
+                          "vomiting", "throw up", "threw up", "throwing up"),
+    "max_temperature": ("temperature", "temp", "degrees", "°", "thermometer"),
+    "response_to_medication": ("medication", "medicine", "meds", "pill", "pills", "took",
+                               "taken", "taking", "ibuprofen", "paracetamol", "acetaminophen",
+                               "tylenol", "advil", "aspirin", "helps", "helped", "works", "worked")
+}
+# How the clarification response asks for each detail; other details
+# fall back to CLARIFICATION_FALLBACK
+DETAIL_QUESTIONS: Dict[str, str] = {
+    "duration": "How long has the {symptom} lasted?",
+    "onset": "When did the {symptom} start, and did it start suddenly or gradually?",
+    "frequency": "How often do you get the {symptom}?",
+    "intensity": "How bad is the {symptom}: mild, moderate or severe (or out of 10)?",
+    "radiation": "Does the {symptom} spread anywhere, such as your arm, jaw, neck or back?",
+    "associated_nausea": "Do you feel sick (nausea) or have you vomited with the {symptom}?",
+    "max_temperature": "What is the highest temperature you have measured?",
+    "response_to_medication": "Have you taken any medication for the {symptom}, and did it help?"
+}
+CLARIFICATION_FALLBACK = "Could you describe the {detail} of the {symptom}?"
+CLARIFICATION_INTRO = "To assess this properly I need a few more details:"
+# Clauses end at punctuation (not a decimal point) and at "and" / "but"
+_CLAUSE_SPLIT_RE = re.compile(r"[;\n]+|[,.](?!\d)|\b(?:and|but)\b", re.IGNORECASE)
+_detail_patterns: Dict[str, Any] = {}
+
+
+def merge_symptoms(current: Optional[List[str]], update: Optional[List[str]]) -> List[str]:
+    """Reducer accumulating the symptoms of every turn of a conversation,
+    without duplicates"""
+    merged = list(dict.fromkeys((current or []) + (update or [])))
+    return merged[-MAX_CONVERSATION_SYMPTOMS:]
 
 
 class MedicalState(TypedDict):
     user_input: str
-    symptoms: List[str]
+    symptoms: Annotated[List[str], merge_symptoms]
+    # Symptoms of this turn alone; triage looks at these, so a symptom
+    # from an earlier turn does not decide every later one
+    turn_symptoms: List[str]
     medical_history: Dict
     current_step: str
     triage_level: Optional[str]
@@ -13,59 +95,205 @@ class MedicalState(TypedDict):
     response: Optional[str]
     needs_clarification: bool
     missing_symptoms: Optional[List[str]]
+    findings: Annotated[Dict[str, Any], merge_findings]
+    # Caller's (latitude, longitude), when known, for the nearest facility
+    location: Optional[Tuple[float, float]]
 
 
-def create_medical_workflow(
-    extract_fn: Callable[[str, Any], List[str]],  # Updated signature
-    recommend_fn: Callable[[List[str], Dict], str],
-    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
-    llm_client: Any  # Add LLM client parameter
-):
-    """Updated factory function with proper parameter handling"""
+def build_initial_state(user_input: str, medical_history: dict,
+                        location: Optional[Tuple[float, float]] = None) -> MedicalState:
+    """Fresh per-turn state for invoking a compiled workflow"""
+    return {
+        "user_input": user_input,
+        "symptoms": [],
+        "turn_symptoms": [],
+        "medical_history": medical_history,
+        "current_step": "",
+        "triage_level": None,
+        "language": "en",
+        "emergency_detected": False,
+        "response": None,
+        "needs_clarification": False,
+        "missing_symptoms": None,
+        "findings": {},
+        "location": location
+    }
 
-    workflow = StateGraph(MedicalState)
 
-    # Node 1: Process Input (updated)
-    # Update all nodes to maintain state continuity
+def build_turn_input(user_input: str, medical_history: dict,
+                     location: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    """Input for one turn of a checkpointed conversation: resets the
+    per-turn fields and leaves the persisted ``symptoms`` and
+    ``missing_symptoms`` to merge with this turn's"""
+    turn = build_initial_state(user_input, medical_history, location)
+    del turn["missing_symptoms"]
+    return turn
 
 
-    def process_input(state: MedicalState):
-        return {
-            **state,
-            "symptoms": extract_fn(state["user_input"], llm_client),
-            "current_step": "processed_input"
-        }
+def _detail_pattern(detail: str):
+    pattern = _detail_patterns.get(detail)
+    if pattern is None:
+        cues = DETAIL_CUES.get(detail, ()) + tuple(
+            word for word in detail.split("_") if len(word) > 3)
+        # Word cues match whole words; "/10" or "°" match anywhere
+        pattern = re.compile("|".join(
+            (r"(?<!\w)" if cue[0].isalnum() else "") + re.escape(cue)
+            + (r"(?!\w)" if cue[-1].isalnum() else "") for cue in cues) or r"(?!)",
+            re.IGNORECASE)
+        _detail_patterns[detail] = pattern
+    return pattern
+
+
+def _split_pending(entry: str) -> Tuple[str, str]:
+    """(symptom, detail) of a pending ``"<symptom>_<detail>"`` entry"""
+    for detail in sorted(DETAIL_CUES, key=len, reverse=True):
+        if entry.endswith(f"_{detail}"):
+            return entry[:-len(detail) - 1], detail
+    symptom, _, detail = entry.rpartition("_")
+    return symptom, detail
+
+
+def clarification_answers(pending: Optional[List[str]], user_input: str) -> List[str]:
+    """Record a reply to a clarification request against the details it
+    answers, in the ``"<symptom>_<detail>: <value>"`` form of extracted
+    attributes, so those details stop being reported missing.
+
+    A reply to a single question answers it. Otherwise each clause of the
+    reply goes to the details whose cue words it contains (and, when it
+    names a symptom, only to that symptom's details); details no clause
+    speaks to stay missing and are asked for again."""
+    reply = " ".join(user_input.split())
+    if not pending or not reply:
+        return []
+    if len(pending) == 1:
+        return [f"{pending[0]}: {reply[:MAX_ANSWER_CHARS]}"]
+
+    split = {entry: _split_pending(entry) for entry in pending}
+    names = {symptom.replace("_", " ") for symptom, _ in split.values() if symptom}
+    clauses = [" ".join(c.split()) for c in _CLAUSE_SPLIT_RE.split(reply) if c and c.strip()]
+    answers = []
+    for entry, (symptom, detail) in split.items():
+        matched = []
+        for clause in clauses:
+            lowered = clause.lower()
+            named = {name for name in names if name in lowered}
+            if named and symptom.replace("_", " ") not in named:
+                continue
+            if _detail_pattern(detail).search(clause):
+                matched.append(clause)
+        if matched:
+            answers.append(f"{entry}: {', '.join(matched)[:MAX_ANSWER_CHARS]}")
+    return answers
 
 
-    def assess_triage(state: MedicalState):
-        missing = missing_symptoms_fn(state["symptoms"])
-        if missing:
+def clarification_questions(pending: Optional[List[str]]) -> List[str]:
+    """One question per pending ``"<symptom>_<detail>"`` entry"""
+    questions = []
+    for entry in pending or []:
+        symptom, detail = _split_pending(entry)
+        template = DETAIL_QUESTIONS.get(detail, CLARIFICATION_FALLBACK)
+        questions.append(template.format(symptom=symptom.replace("_", " "),
+                                         detail=detail.replace("_", " ")))
+    return list(dict.fromkeys(questions))
+
+
+def clarify_symptoms(state: MedicalState):
+    """Ask for the details identify_missing_symptoms found missing"""
+    questions = clarification_questions(state.get("missing_symptoms"))
+    return {"response": "\n".join([CLARIFICATION_INTRO] + [f"- {q}" for q in questions]),
+            "current_step": "awaiting_clarification"}
+
+
+def _screen_node(emergency_screen_fn: Callable[[str], Optional[str]]):
+    def screen_emergency(state: MedicalState):
+        # Runs before any LLM call so red flags reach handle_emergency at once
+        reason = emergency_screen_fn(state["user_input"])
+        if reason:
+            log_event(logger, logging.WARNING, "emergency_screened",
+                      red_flag=reason)
             return {**state,
-                    "needs_clarification": True,
-                    "missing_symptoms": missing,
-                    "current_step": "needs_clarification"}
-        return {**state,
-                "emergency_detected": False,
-                "current_step": "triage_assessed"}
+                    "triage_level": "emergency",
+                    "emergency_detected": True,
+                    "current_step": "emergency_detected"}
+        return {**state, "current_step": "screened"}
+
+    return screen_emergency
 
-    def provide_recommendations(state: MedicalState):
-        return {
-            **state,
-            "response": recommend_fn(state["symptoms"], state["medical_history"])
-        }
+
+def _emergency_node(hospital_fn: Callable[[Optional[Tuple[float, float]]], Dict]):
+    def handle_emergency(state: MedicalState):
+        response = EMERGENCY_RESPONSE
+        location = state.get("location")
+        if location is not None:
+            # Only a real lookup is worth showing, never the placeholder
+            hospital = hospital_fn(location)
+            if "distance_km" in hospital:
+                response += (f"\n\n🏥 Nearest emergency department: {hospital['name']}, "
+                             f"{hospital['address']} ({hospital['distance']})")
+        return {"response": response, "current_step": "end"}
+
+    return handle_emergency
+
+
+def _analysis_branches(
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    triage_fn: Callable[[List[str]], str]
+) -> Dict[str, Callable]:
+    """Independent per-turn analyses that run as parallel branches after
+    extraction. Each one only writes its own key into ``findings``."""
+
+    def lookup_knowledge(state: MedicalState):
+        return {"findings": {"triage_level": triage_fn(state["turn_symptoms"])}}
+
+    def analyze_missing_details(state: MedicalState):
+        return {"findings": {"missing_symptoms": missing_symptoms_fn(state["symptoms"])}}
+
+    return {
+        "lookup_knowledge": lookup_knowledge,
+        "analyze_missing_details": analyze_missing_details
+    }
+
+
+def _assemble_workflow(
+    screen_emergency: Callable,
+    process_input: Callable,
+    analysis_branches: Dict[str, Callable],
+    handle_emergency: Callable,
+    provide_recommendations: Callable,
+    checkpointer: Optional[Any] = None
+):
+    """Wire the nodes into the graph shared by the sync and async workflows"""
+
+    workflow = StateGraph(MedicalState)
+
+    def add_node(name: str, node: Callable) -> None:
+        # Every node is timed under its own name
+        workflow.add_node(name, trace_node(name, node))
 
     # Add nodes to workflow
-    workflow.add_node("process_input", process_input)
-    workflow.add_node("assess_triage", assess_triage)
-    workflow.add_node("handle_emergency", lambda state: {
-                      "response": "Emergency!"})
-    workflow.add_node("clarify_symptoms", lambda state: {
-                      "response": "Please clarify"})
-    workflow.add_node("provide_recommendations", provide_recommendations)
+    add_node("screen_emergency", screen_emergency)
+    add_node("process_input", process_input)
+    for name, branch in analysis_branches.items():
+        add_node(name, branch)
+    add_node("assess_triage", assess_triage)
+    add_node("handle_emergency", handle_emergency)
+    add_node("clarify_symptoms", clarify_symptoms)
+    add_node("provide_recommendations", provide_recommendations)
 
     # Define workflow transitions (keep existing edge logic)
-    workflow.set_entry_point("process_input")
-    workflow.add_edge("process_input", "assess_triage")
+    workflow.set_entry_point("screen_emergency")
+    workflow.add_conditional_edges(
+        "screen_emergency",
+        lambda state: "emergency" if state["emergency_detected"] else "extract",
+        {
+            "emergency": "handle_emergency",
+            "extract": "process_input"
+        }
+    )
+    # Fan out to the analyses, then join once all of them have finished
+    for name in analysis_branches:
+        workflow.add_edge("process_input", name)
+    workflow.add_edge(list(analysis_branches), "assess_triage")
     workflow.add_conditional_edges(
         "assess_triage",
         lambda state: (
@@ -83,4 +311,365 @@ def create_medical_workflow(
     workflow.add_edge("clarify_symptoms", END)
     workflow.add_edge("provide_recommendations", END)
 
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def assess_triage(state: MedicalState):
+    """Combine the branch findings into the routing decision"""
+    findings = state.get("findings") or {}
+    triage_level = findings.get("triage_level")
+    log_event(logger, logging.INFO, "triage_assessed", sample=True,
+              triage_level=triage_level,
+              missing_count=len(findings.get("missing_symptoms") or []))
+    if triage_level == "emergency":
+        return {"triage_level": triage_level,
+                "emergency_detected": True,
+                "current_step": "emergency_detected"}
+
+    missing = findings.get("missing_symptoms")
+    if missing:
+        return {"triage_level": triage_level,
+                "needs_clarification": True,
+                "missing_symptoms": missing,
+                "current_step": "needs_clarification"}
+    return {"triage_level": triage_level,
+            "emergency_detected": False,
+            "needs_clarification": False,
+            "missing_symptoms": None,
+            "current_step": "triage_assessed"}
+
+
+def create_medical_workflow(
+    extract_fn: Callable[[str, Any], List[str]],  # Updated signature
+    recommend_fn: Callable[[List[str], Dict, Any], str],
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    llm_client: Any,  # Add LLM client parameter
+    stream_fn: Optional[Callable[[List[str], Dict, Any], Iterator[str]]] = None,
+    triage_fn: Callable[[List[str]], str] = query_knowledge_graph,
+    emergency_screen_fn: Callable[[str], Optional[str]] = screen_emergency,
+    hospital_fn: Callable[[Optional[Tuple[float, float]]], Dict] = find_nearest_hospital,
+    checkpointer: Optional[Any] = None
+):
+    """Updated factory function with proper parameter handling.
+
+    When ``stream_fn`` is given, provide_recommendations generates through it
+    and forwards each chunk as a ``{"token": ...}`` event on the graph's
+    ``custom`` stream mode, so callers using ``workflow.stream`` see tokens
+    as they arrive.
+
+    With a ``checkpointer`` the state persists per ``thread_id`` (passed in
+    the invoke config); each turn is then invoked with build_turn_input."""
+
+    # Node 1: Process Input (updated)
+    # Update all nodes to maintain state continuity
+
+    def process_input(state: MedicalState):
+        # Only the new message is extracted; the reducer merges it into
+        # the symptoms of earlier turns
+        symptoms = extract_fn(state["user_input"], llm_client) + clarification_answers(
+            state.get("missing_symptoms"), state["user_input"])
+        return {
+            **state,
+            "symptoms": symptoms,
+            "turn_symptoms": symptoms,
+            "current_step": "processed_input"
+        }
+
+    def provide_recommendations(state: MedicalState):
+        if stream_fn is None:
+            response = recommend_fn(
+                state["symptoms"], state["medical_history"], llm_client)
+        else:
+            writer = get_stream_writer()
+            parts = []
+            for chunk in stream_fn(state["symptoms"], state["medical_history"], llm_client):
+                writer({"token": chunk})
+                parts.append(chunk)
+            response = "".join(parts)
+        return {
+            **state,
+            "response": response
+        }
+
+    return _assemble_workflow(
+        _screen_node(emergency_screen_fn),
+        process_input,
+        _analysis_branches(missing_symptoms_fn, triage_fn),
+        _emergency_node(hospital_fn),
+        provide_recommendations,
+        checkpointer
+    )
+
+
+def create_async_medical_workflow(
+    extract_fn: Callable[[str, Any], Any],
+    recommend_fn: Callable[[List[str], Dict, Any], Any],
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    llm_client: Any,
+    triage_fn: Callable[[List[str]], str] = query_knowledge_graph,
+    emergency_screen_fn: Callable[[str], Optional[str]] = screen_emergency,
+    hospital_fn: Callable[[Optional[Tuple[float, float]]], Dict] = find_nearest_hospital,
+    checkpointer: Optional[Any] = None
+):
+    """Same graph as create_medical_workflow, but the LLM-bound nodes await
+    coroutine functions so the graph is driven with ``ainvoke``"""
+
+    async def process_input(state: MedicalState):
+        symptoms = await extract_fn(state["user_input"], llm_client) + clarification_answers(
+            state.get("missing_symptoms"), state["user_input"])
+        return {
+            **state,
+            "symptoms": symptoms,
+            "turn_symptoms": symptoms,
+            "current_step": "processed_input"
+        }
+
+    async def provide_recommendations(state: MedicalState):
+        return {
+            **state,
+            "response": await recommend_fn(state["symptoms"], state["medical_history"], llm_client)
+        }
+
+    return _assemble_workflow(
+        _screen_node(emergency_screen_fn),
+        process_input,
+        _analysis_branches(missing_symptoms_fn, triage_fn),
+        _emergency_node(hospital_fn),
+        provide_recommendations,
+        checkpointer
+    )
+
+
+# Compiled graphs are immutable once built, so one instance per set of
+# injected dependencies can be shared by every session in the process.
+_compiled_workflows: Dict[tuple, Any] = {}
+_compiled_workflows_lock = threading.Lock()
+
+
+def _get_or_compile(factory: Callable, **dependencies):
+    key = (factory,) + tuple(sorted(dependencies.items()))
+    workflow = _compiled_workflows.get(key)
+    if workflow is not None:
+        return workflow
+
+    with _compiled_workflows_lock:
+        # Another session may have compiled it while we waited on the lock
+        workflow = _compiled_workflows.get(key)
+        if workflow is None:
+            workflow = factory(**dependencies)
+            _compiled_workflows[key] = workflow
+        return workflow
+
+
+def get_medical_workflow(
+    extract_fn: Callable[[str, Any], List[str]],
+    recommend_fn: Callable[[List[str], Dict, Any], str],
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    llm_client: Any,
+    stream_fn: Optional[Callable[[List[str], Dict, Any], Iterator[str]]] = None,
+    checkpointer: Optional[Any] = None
+):
+    """Return the process-wide compiled workflow for these dependencies,
+    compiling it on first use"""
+    return _get_or_compile(
+        create_medical_workflow,
+        extract_fn=extract_fn,
+        recommend_fn=recommend_fn,
+        missing_symptoms_fn=missing_symptoms_fn,
+        llm_client=llm_client,
+        stream_fn=stream_fn,
+        checkpointer=checkpointer
+    )
+
+
+def get_async_medical_workflow(
+    extract_fn: Callable[[str, Any], Any],
+    recommend_fn: Callable[[List[str], Dict, Any], Any],
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    llm_client: Any,
+    checkpointer: Optional[Any] = None
+):
+    """Async counterpart of get_medical_workflow"""
+    return _get_or_compile(
+        create_async_medical_workflow,
+        extract_fn=extract_fn,
+        recommend_fn=recommend_fn,
+        missing_symptoms_fn=missing_symptoms_fn,
+        llm_client=llm_client,
+        checkpointer=checkpointer
+    )
+
+
+# Conversations the in-memory checkpointer keeps, and how long an idle one
+# is kept
+MAX_MEMORY_THREADS = 10000
+MEMORY_THREAD_TTL = 12 * 3600
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """In-memory checkpointer that keeps only the latest checkpoint of each
+    thread and forgets threads idle for ``thread_ttl`` seconds, or the
+    least recently used ones beyond ``max_threads``. Earlier checkpoints
+    are only needed for time travel, which the workflow never does. The
+    async methods of InMemorySaver call the sync ones, so they are bounded
+    too."""
+
+    def __init__(self, max_threads: int = MAX_MEMORY_THREADS,
+                 thread_ttl: float = MEMORY_THREAD_TTL, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.thread_ttl = thread_ttl
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _checkpoint_versions(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Dict:
+        saved = self.storage[thread_id][checkpoint_ns].get(checkpoint_id)
+        if saved is None:
+            return {}
+        return self.serde.loads_typed(saved[0]).get("channel_versions", {})
+
+    def _drop_checkpoint(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str,
+                         keep: Dict) -> None:
+        """Forget a checkpoint, its pending writes and the channel values
+        no longer referenced by ``keep`` (the surviving channel versions)"""
+        for channel, version in self._checkpoint_versions(
+                thread_id, checkpoint_ns, checkpoint_id).items():
+            if keep.get(channel) != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+        self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        self.storage[thread_id][checkpoint_ns].pop(checkpoint_id, None)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = saved["configurable"]["thread_id"]
+            checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+            keep = checkpoint.get("channel_versions", {})
+            for checkpoint_id in list(self.storage[thread_id][checkpoint_ns]):
+                if checkpoint_id != checkpoint["id"]:
+                    self._drop_checkpoint(thread_id, checkpoint_ns, checkpoint_id, keep)
+            self._touch(thread_id)
+            return saved
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+    def _touch(self, thread_id: str) -> None:
+        now = time.monotonic()
+        self._last_used[thread_id] = now
+        self._last_used.move_to_end(thread_id)
+        while self._last_used:
+            oldest, used = next(iter(self._last_used.items()))
+            if len(self._last_used) <= self.max_threads and now - used <= self.thread_ttl:
+                break
+            self.delete_thread(oldest)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._last_used.pop(thread_id, None)
+            for checkpoint_ns, checkpoints in list(self.storage.get(thread_id, {}).items()):
+                for checkpoint_id in list(checkpoints):
+                    self._drop_checkpoint(thread_id, checkpoint_ns, checkpoint_id, {})
+            self.storage.pop(thread_id, None)
+
+
+_checkpointers: Dict[Tuple[str, bool], Any] = {}
+_checkpointers_lock = threading.Lock()
+
+
+def create_checkpointer(backend: str = "memory", path: str = "medical_conversations.sqlite3",
+                        asynchronous: bool = False):
+    """Conversation store for checkpointed workflows: "memory" keeps the
+    latest state of each thread in process (BoundedMemorySaver), "sqlite"
+    persists the threads to ``path`` (requires the
+    langgraph-checkpoint-sqlite package, and aiosqlite when
+    ``asynchronous``). The in-memory saver serves sync and async workflows
+    alike; the async SQLite saver must be created inside the event loop
+    that uses it."""
+    if backend == "memory":
+        return BoundedMemorySaver()
+    if backend == "sqlite":
+        if asynchronous:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+            conn = aiosqlite.connect(path)
+            # Its worker thread must not keep the process alive at exit
+            # (older aiosqlite connections are the thread themselves)
+            getattr(conn, "_thread", conn).daemon = True
+            # Switched to WAL by the saver's own setup
+            return AsyncSqliteSaver(conn)
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return SqliteSaver(conn)
+    raise ValueError(f"Unknown checkpoint backend: {backend}")
+
+
+def get_checkpointer(asynchronous: bool = False):
+    """Process-wide conversation store, chosen with MEDICAL_CHECKPOINT_BACKEND
+    ("memory" by default, or "sqlite" at MEDICAL_CHECKPOINT_PATH). Sync and
+    async workflows see the same conversations: they share the in-memory
+    saver, and SqliteSaver and AsyncSqliteSaver share the database file.
+    The async SQLite saver is bound to the running event loop, so it is
+    only shared within one loop."""
+    backend = os.getenv("MEDICAL_CHECKPOINT_BACKEND", "memory")
+    key = (backend, asynchronous and backend != "memory")
+    checkpointer = _checkpointers.get(key)
+    if checkpointer is None or not _usable(checkpointer):
+        with _checkpointers_lock:
+            checkpointer = _checkpointers.get(key)
+            if checkpointer is None or not _usable(checkpointer):
+                if checkpointer is not None:
+                    # Left behind by an event loop that has finished
+                    checkpointer.conn.stop()
+                checkpointer = create_checkpointer(
+                    backend, os.getenv("MEDICAL_CHECKPOINT_PATH", "medical_conversations.sqlite3"),
+                    asynchronous)
+                _checkpointers[key] = checkpointer
+    return checkpointer
+
+
+def _usable(checkpointer: Any) -> bool:
+    # Async savers hold on to the loop they were created in
+    loop = getattr(checkpointer, "loop", None)
+    if loop is None:
+        return True
+    try:
+        return loop is asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+
+
+def thread_config(thread_id: str) -> Dict[str, Any]:
+    """Invoke config selecting the conversation ``thread_id``"""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def warm_up_workflow(
+    extract_fn: Callable[[str, Any], List[str]],
+    recommend_fn: Callable[[List[str], Dict, Any], str],
+    missing_symptoms_fn: Callable[[List[str]], Optional[List[str]]],
+    llm_client: Any,
+    stream_fn: Optional[Callable[[List[str], Dict, Any], Iterator[str]]] = None,
+    checkpointer: Optional[Any] = None
+) -> None:
+    """Compile the workflow ahead of the first request (call at startup)"""
+    # Also compiles the red-flag matcher, which is built on first use
+    screen_emergency("")
+    get_medical_workflow(
+        extract_fn=extract_fn,
+        recommend_fn=recommend_fn,
+        missing_symptoms_fn=missing_symptoms_fn,
+        llm_client=llm_client,
+        stream_fn=stream_fn,
+        checkpointer=checkpointer
+    )
+
+
+def clear_workflow_cache() -> None:
+    """Drop every compiled workflow, e.g. after swapping the LLM client"""
+    with _compiled_workflows_lock:
+        _compiled_workflows.clear()
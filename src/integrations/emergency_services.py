@@ -1,6 +1,75 @@
-def find_nearest_hospital():
-    return {
-        "name": "City General Hospital",
-        "address": "123 Main Street",
-        "distance": "2.5 miles"
-    }
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+import threading
+from src.integrations.facilities import KM_PER_MILE, FacilityIndex, load_facilities
+
+logger = logging.getLogger(__name__)
+
+# Placeholder answer when no location or facility dataset is available
+DEFAULT_HOSPITAL = {
+    "name": "City General Hospital",
+    "address": "123 Main Street",
+    "distance": "2.5 miles"
+}
+
+_index: Optional[FacilityIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_facility_index() -> Optional[FacilityIndex]:
+    """Facility index built from MEDICAL_FACILITIES_PATH (CSV or Parquet)
+    on first use, or None when no dataset is configured"""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                path = os.getenv("MEDICAL_FACILITIES_PATH")
+                try:
+                    _index = load_facilities(path) if path else None
+                except Exception as e:
+                    logger.error(f"Failed to load facilities from {path}: {str(e)}")
+                    _index = None
+                _index_loaded = True
+    return _index
+
+
+def set_facility_index(index: Optional[FacilityIndex]) -> None:
+    """Replace the facility index (None falls back to the placeholder)"""
+    global _index, _index_loaded
+    with _index_lock:
+        _index = index
+        _index_loaded = True
+
+
+def find_nearest_facilities(location: Tuple[float, float], k: int = 3,
+                            capabilities: Iterable[str] = ("emergency",)) -> List[Dict]:
+    """The ``k`` closest facilities to a (latitude, longitude) having every
+    one of ``capabilities``, nearest first"""
+    index = get_facility_index()
+    if index is None:
+        return []
+    return [{
+        "name": facility.name,
+        "address": facility.address,
+        "distance": f"{facility.distance_km / KM_PER_MILE:.1f} miles",
+        "distance_km": facility.distance_km,
+        "latitude": facility.latitude,
+        "longitude": facility.longitude,
+        "capabilities": list(facility.capabilities)
+    } for facility in index.nearest(location[0], location[1], k, capabilities)]
+
+
+def find_nearest_hospital(location: Optional[Tuple[float, float]] = None,
+                          capabilities: Iterable[str] = ("emergency",)) -> Dict:
+    """Closest facility with an emergency department to ``location``"""
+    if location is not None:
+        try:
+            found = find_nearest_facilities(location, 1, capabilities)
+            if found:
+                return found[0]
+        except Exception as e:
+            # The emergency answer must go out even if the lookup fails
+            logger.error(f"Nearest facility lookup failed: {str(e)}")
+    return dict(DEFAULT_HOSPITAL)
@@ -0,0 +1,260 @@
+"""Nearest-facility lookup over a national facility dataset.
+
+Facilities are loaded once from a CSV or Parquet file with the columns
+
+    name, address, latitude, longitude[, capabilities][, trauma_level]
+
+where ``capabilities`` lists tags separated by ``;`` or ``|`` (e.g.
+``emergency;pediatric``) and a ``trauma_level`` of 1-5 adds the tag
+``trauma_<level>``.
+
+Every capability gets its own uniform latitude/longitude grid, so a query
+only visits facilities that qualify. A query searches rings of cells
+outward from the caller's cell and computes haversine distances for all
+candidates of a ring at once with NumPy. It stops as soon as no unvisited
+cell can hold anything closer than the k-th best found so far.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import csv
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_MILE = 1.609344
+# Grid cell edge in degrees; about 55 km north-south
+DEFAULT_CELL_DEGREES = 0.5
+
+_LATITUDE_COLUMNS = ("latitude", "lat")
+_LONGITUDE_COLUMNS = ("longitude", "lon", "lng", "long")
+
+
+class Facility(NamedTuple):
+    name: str
+    address: str
+    latitude: float
+    longitude: float
+    capabilities: Tuple[str, ...]
+    distance_km: float
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances from one point to arrays of points, all in degrees"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _parse_capabilities(raw: Optional[str], trauma_level: Optional[str]) -> List[str]:
+    tags = [tag.strip().lower() for tag in str(raw or "").replace("|", ";").split(";")]
+    tags = [tag for tag in tags if tag]
+    if trauma_level not in (None, ""):
+        tags.append(f"trauma_{int(float(trauma_level))}")
+    return tags
+
+
+class _Grid:
+    """Facility ids bucketed by grid cell, stored as one sorted array plus
+    the slice of each occupied cell"""
+
+    def __init__(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray, cell: float):
+        self.columns = int(math.ceil(360.0 / cell))
+        self.rows = int(math.ceil(180.0 / cell)) + 1
+        rows = np.floor((lats[ids] + 90.0) / cell).astype(np.int64)
+        cols = np.floor((lons[ids] + 180.0) / cell).astype(np.int64) % self.columns
+        keys = rows * self.columns + cols
+        order = np.argsort(keys, kind="stable")
+        self.ids = ids[order]
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(ids) else []
+        ends = np.r_[starts[1:], len(sorted_keys)] if len(ids) else []
+        self.cells: Dict[int, Tuple[int, int]] = {
+            int(sorted_keys[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+    def ring(self, row: int, col: int, radius: int, seen: set) -> List[np.ndarray]:
+        """Id slices of the occupied cells ``radius`` cells away, skipping
+        cells already in ``seen`` (columns wrap around the antimeridian)"""
+        found = []
+        for r in range(max(0, row - radius), min(self.rows - 1, row + radius) + 1):
+            edge = r in (row - radius, row + radius)
+            step = 1 if edge else 2 * radius
+            for c in range(col - radius, col + radius + 1, step):
+                key = r * self.columns + c % self.columns
+                span = self.cells.get(key)
+                if span is not None and key not in seen:
+                    seen.add(key)
+                    found.append(self.ids[span[0]:span[1]])
+        return found
+
+
+class FacilityIndex:
+    """k-nearest facility queries, optionally restricted to capabilities"""
+
+    def __init__(self, names: Sequence[str], addresses: Sequence[str],
+                 latitudes: Sequence[float], longitudes: Sequence[float],
+                 capabilities: Sequence[Iterable[str]], cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.names = list(names)
+        self.addresses = list(addresses)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.capabilities = [tuple(tags) for tags in capabilities]
+        self.cell = cell_degrees
+        # Haversine terms that only depend on the facility
+        self._lat_radians = np.radians(self.latitudes)
+        self._lon_radians = np.radians(self.longitudes)
+        self._cos_lat = np.cos(self._lat_radians)
+
+        tags = sorted({tag for facility_tags in self.capabilities for tag in facility_tags})
+        if len(tags) > 64:
+            raise ValueError(f"At most 64 capabilities are supported, got {len(tags)}")
+        self._bits = {tag: np.uint64(1 << i) for i, tag in enumerate(tags)}
+        self._masks = np.zeros(len(self.names), dtype=np.uint64)
+        for i, facility_tags in enumerate(self.capabilities):
+            for tag in facility_tags:
+                self._masks[i] |= self._bits[tag]
+
+        everything = np.arange(len(self.names))
+        self._grids: Dict[Optional[str], _Grid] = {
+            None: _Grid(everything, self.latitudes, self.longitudes, self.cell)}
+        for tag, bit in self._bits.items():
+            ids = np.flatnonzero(self._masks & bit)
+            self._grids[tag] = _Grid(ids, self.latitudes, self.longitudes, self.cell)
+        self._counts = {tag: len(grid.ids) for tag, grid in self._grids.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1,
+                capabilities: Iterable[str] = ()) -> List[Facility]:
+        """The ``k`` closest facilities having every one of ``capabilities``"""
+        required = [tag.lower() for tag in capabilities]
+        if k < 1 or any(tag not in self._bits for tag in required):
+            return []
+        # Walk the grid of the rarest capability and check the others per facility
+        grid = self._grids[min(required, key=self._counts.get) if required else None]
+        if not len(grid.ids):
+            return []
+        mask = np.uint64(0)
+        for tag in required:
+            mask |= self._bits[tag]
+        check_mask = len(required) > 1
+
+        row = int((latitude + 90.0) // self.cell)
+        col = int((longitude + 180.0) // self.cell)
+        best_ids = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0)
+        seen: set = set()
+        radius = 0
+        while True:
+            if (2 * radius + 1) ** 2 > 4 * len(grid.cells):
+                # The rings now cost more than scanning every candidate
+                return self._scan(grid.ids, latitude, longitude, k, mask, check_mask)
+            found = grid.ring(row, col, radius, seen)
+            if found:
+                ids = np.concatenate(found)
+                if check_mask:
+                    ids = ids[(self._masks[ids] & mask) == mask]
+                distances = self._distances(ids, latitude, longitude)
+                best_ids = np.concatenate([best_ids, ids])
+                best_distances = np.concatenate([best_distances, distances])
+                if len(best_ids) > k:
+                    keep = np.argpartition(best_distances, k - 1)[:k]
+                    best_ids, best_distances = best_ids[keep], best_distances[keep]
+            if (len(best_ids) >= k
+                    and best_distances.max() <= self._reach_km(latitude, longitude, row, col, radius)):
+                return self._ranked(best_ids, best_distances)
+            radius += 1
+
+    def _distances(self, ids: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        a = (np.sin((self._lat_radians[ids] - lat) / 2) ** 2
+             + math.cos(lat) * self._cos_lat[ids] * np.sin((self._lon_radians[ids] - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _reach_km(self, latitude: float, longitude: float, row: int, col: int, radius: int) -> float:
+        """Lower bound on the distance from the caller to any cell beyond
+        the ``radius`` rings searched so far"""
+        south = (row - radius) * self.cell - 90.0
+        north = (row + radius + 1) * self.cell - 90.0
+        west = (col - radius) * self.cell - 180.0
+        east = (col + radius + 1) * self.cell - 180.0
+        north_south = math.radians(min(latitude - south, north - latitude)) * EARTH_RADIUS_KM
+        # East-west cells narrow towards the poles: bound with the great
+        # circle along the parallel nearest one
+        widest = math.radians(min(90.0, max(abs(south), abs(north))))
+        span = math.radians(min(longitude - west, east - longitude, 180.0))
+        east_west = 2 * EARTH_RADIUS_KM * math.asin(math.cos(widest) * math.sin(span / 2))
+        return min(north_south, east_west)
+
+    def _scan(self, ids: np.ndarray, latitude: float, longitude: float, k: int,
+              mask: np.uint64, check_mask: bool) -> List[Facility]:
+        if check_mask:
+            ids = ids[(self._masks[ids] & mask) == mask]
+        distances = self._distances(ids, latitude, longitude)
+        if len(ids) > k:
+            keep = np.argpartition(distances, k - 1)[:k]
+            ids, distances = ids[keep], distances[keep]
+        return self._ranked(ids, distances)
+
+    def _ranked(self, ids: np.ndarray, distances: np.ndarray) -> List[Facility]:
+        order = np.argsort(distances)
+        return [self._facility(int(ids[i]), float(distances[i])) for i in order]
+
+    def _facility(self, i: int, distance: float) -> Facility:
+        return Facility(self.names[i], self.addresses[i], float(self.latitudes[i]),
+                        float(self.longitudes[i]), self.capabilities[i], round(distance, 3))
+
+
+def _column(header: Sequence[str], candidates: Sequence[str]) -> str:
+    lowered = {name.lower(): name for name in header}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    raise ValueError(f"Facility data needs one of the columns {', '.join(candidates)}")
+
+
+def _rows(path: str) -> Tuple[List[str], List[Dict]]:
+    if path.endswith(".parquet"):
+        # Optional dependency, only needed for Parquet datasets
+        import pandas as pd
+
+        frame = pd.read_parquet(path)
+        frame = frame.astype(object).where(frame.notna(), None)
+        return [str(c) for c in frame.columns], frame.to_dict("records")
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return list(reader.fieldnames or []), list(reader)
+
+
+def load_facilities(path: str, cell_degrees: float = DEFAULT_CELL_DEGREES) -> FacilityIndex:
+    """Build a FacilityIndex from a CSV or Parquet file. Rows without valid
+    coordinates are skipped."""
+    header, rows = _rows(path)
+    lat_column = _column(header, _LATITUDE_COLUMNS)
+    lon_column = _column(header, _LONGITUDE_COLUMNS)
+    lowered = {name.lower(): name for name in header}
+    names, addresses, lats, lons, tags = [], [], [], [], []
+    skipped = 0
+    for row in rows:
+        try:
+            lat, lon = float(row[lat_column]), float(row[lon_column])
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                raise ValueError("coordinates out of range")
+            capabilities = _parse_capabilities(
+                row.get(lowered.get("capabilities")), row.get(lowered.get("trauma_level")))
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        names.append(str(row.get(lowered.get("name")) or "Unnamed facility"))
+        addresses.append(str(row.get(lowered.get("address")) or ""))
+        lats.append(lat)
+        lons.append(lon)
+        tags.append(capabilities)
+    if skipped:
+        logger.warning(f"Skipped {skipped} facilities without valid coordinates in {path}")
+    logger.info(f"Loaded {len(names)} facilities from {path}")
+    return FacilityIndex(names, addresses, lats, lons, tags, cell_degrees)
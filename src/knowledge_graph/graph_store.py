@@ -0,0 +1,215 @@
+"""SQLite-backed symptom/condition knowledge graph.
+
+The graph is built once into a compact file with
+``python -m src.knowledge_graph.graph_store <knowledge.json> <graph.sqlite3>``
+and opened read-only and memory-mapped by every worker, so the pages are
+shared through the OS page cache instead of being copied per process.
+"""
+from typing import Dict, List, Optional
+import json
+import os
+import sqlite3
+import sys
+import threading
+from src.knowledge_graph.medical_knowledge import medical_knowledge
+
+URGENCY_LEVELS = ("low", "medium", "high")
+DEFAULT_URGENCY = "medium"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS symptoms (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    urgency TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conditions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS symptom_conditions (
+    symptom_id INTEGER NOT NULL,
+    condition_id INTEGER NOT NULL,
+    PRIMARY KEY (symptom_id, condition_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS condition_symptoms
+    ON symptom_conditions (condition_id, symptom_id);
+CREATE TABLE IF NOT EXISTS symptom_questions (
+    symptom_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    PRIMARY KEY (symptom_id, position)
+) WITHOUT ROWID;
+"""
+
+# SQLite caps bound parameters per statement; batch lookups are chunked
+_MAX_VARIABLES = 900
+
+
+def _write_knowledge(conn: sqlite3.Connection, knowledge: Dict[str, Dict]) -> None:
+    conn.executescript(_SCHEMA)
+    condition_ids: Dict[str, int] = {}
+    for symptom, info in knowledge.items():
+        cursor = conn.execute(
+            "INSERT INTO symptoms (name, urgency) VALUES (?, ?)",
+            (symptom, info.get("urgency", DEFAULT_URGENCY))
+        )
+        symptom_id = cursor.lastrowid
+        for condition in info.get("related_conditions", []):
+            if condition not in condition_ids:
+                condition_ids[condition] = conn.execute(
+                    "INSERT INTO conditions (name) VALUES (?)", (condition,)
+                ).lastrowid
+            conn.execute(
+                "INSERT OR IGNORE INTO symptom_conditions VALUES (?, ?)",
+                (symptom_id, condition_ids[condition])
+            )
+        conn.executemany(
+            "INSERT INTO symptom_questions VALUES (?, ?, ?)",
+            [(symptom_id, position, question)
+             for position, question in enumerate(info.get("questions", []))]
+        )
+    conn.commit()
+
+
+def build_knowledge_graph(path: str, knowledge: Dict[str, Dict]) -> None:
+    """Write ``knowledge`` (same shape as medical_knowledge) to a new graph
+    file at ``path``"""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        _write_knowledge(conn, knowledge)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    # Readers never see a half-written file
+    os.replace(tmp_path, path)
+
+
+class KnowledgeGraphStore:
+    """Read-only view of a knowledge graph with per-symptom lookups and
+    batched multi-symptom queries"""
+
+    def __init__(self, path: Optional[str] = None, knowledge: Optional[Dict[str, Dict]] = None,
+                 mmap_size: int = 256 * 1024 * 1024, cache_size: int = 10000):
+        self._lock = threading.Lock()
+        if path is None:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            _write_knowledge(
+                self._conn, medical_knowledge if knowledge is None else knowledge)
+        else:
+            self._conn = sqlite3.connect(
+                f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        # Hot symptoms are answered from memory after their first lookup
+        self._entries: Dict[str, Optional[Dict]] = {}
+        self._cache_size = cache_size
+
+    def _fetch(self, symptoms: List[str]) -> Dict[str, Dict]:
+        found: Dict[str, Dict] = {}
+        with self._lock:
+            for start in range(0, len(symptoms), _MAX_VARIABLES):
+                chunk = symptoms[start:start + _MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                for name, urgency in self._conn.execute(
+                        f"SELECT name, urgency FROM symptoms WHERE name IN ({placeholders})", chunk):
+                    found[name] = {"urgency": urgency,
+                                   "related_conditions": [], "questions": []}
+                for name, condition in self._conn.execute(
+                        "SELECT s.name, c.name FROM symptoms s "
+                        "JOIN symptom_conditions sc ON sc.symptom_id = s.id "
+                        "JOIN conditions c ON c.id = sc.condition_id "
+                        f"WHERE s.name IN ({placeholders}) ORDER BY c.id", chunk):
+                    found[name]["related_conditions"].append(condition)
+                for name, question in self._conn.execute(
+                        "SELECT s.name, q.question FROM symptoms s "
+                        "JOIN symptom_questions q ON q.symptom_id = s.id "
+                        f"WHERE s.name IN ({placeholders}) ORDER BY q.position", chunk):
+                    found[name]["questions"].append(question)
+        return found
+
+    def lookup(self, symptoms: List[str]) -> Dict[str, Dict]:
+        """Entries for every known symptom in ``symptoms``, fetched in one
+        batch for those not seen before"""
+        names = [s for s in dict.fromkeys(symptoms) if isinstance(s, str)]
+        entries = {s: self._entries[s] for s in names if s in self._entries}
+        unseen = [s for s in names if s not in entries]
+        if unseen:
+            found = self._fetch(unseen)
+            for symptom in unseen:
+                entries[symptom] = found.get(symptom)
+                if len(self._entries) < self._cache_size:
+                    self._entries[symptom] = entries[symptom]
+        return {s: entries[s] for s in names if entries[s] is not None}
+
+    def get(self, symptom: str) -> Optional[Dict]:
+        return self.lookup([symptom]).get(symptom)
+
+    def urgency(self, symptom: str) -> Optional[str]:
+        entry = self.get(symptom)
+        return entry["urgency"] if entry else None
+
+    def related_conditions(self, symptom: str) -> List[str]:
+        entry = self.get(symptom)
+        return list(entry["related_conditions"]) if entry else []
+
+    def symptoms_with_urgency(self, urgency: str) -> List[str]:
+        with self._lock:
+            return [name for (name,) in self._conn.execute(
+                "SELECT name FROM symptoms WHERE urgency = ? ORDER BY id", (urgency,))]
+
+    def symptom_questions(self) -> Dict[str, tuple]:
+        """Follow-up questions of every symptom that has any, in order"""
+        questions: Dict[str, List[str]] = {}
+        with self._lock:
+            for name, question in self._conn.execute(
+                    "SELECT s.name, q.question FROM symptoms s "
+                    "JOIN symptom_questions q ON q.symptom_id = s.id "
+                    "ORDER BY s.id, q.position"):
+                questions.setdefault(name, []).append(question)
+        return {name: tuple(items) for name, items in questions.items()}
+
+    def max_urgency(self, symptoms: List[str]) -> Optional[str]:
+        """Highest urgency among the known symptoms, None if none is known"""
+        levels = [URGENCY_LEVELS.index(entry["urgency"])
+                  for entry in self.lookup(symptoms).values()
+                  if entry["urgency"] in URGENCY_LEVELS]
+        return URGENCY_LEVELS[max(levels)] if levels else None
+
+    def related_conditions_for(self, symptoms: List[str]) -> Dict[str, int]:
+        """Conditions linked to any of the symptoms, with how many of the
+        symptoms point at each, most supported first"""
+        counts: Dict[str, int] = {}
+        for entry in self.lookup(symptoms).values():
+            for condition in entry["related_conditions"]:
+                counts[condition] = counts.get(condition, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[KnowledgeGraphStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_knowledge_graph() -> KnowledgeGraphStore:
+    """Process-wide store: the file named by MEDICAL_KG_PATH when set,
+    otherwise the built-in medical_knowledge"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = KnowledgeGraphStore(
+                    os.getenv("MEDICAL_KG_PATH") or None)
+    return _default_store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m src.knowledge_graph.graph_store <knowledge.json> <graph.sqlite3>")
+        sys.exit(2)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        build_knowledge_graph(sys.argv[2], json.load(f))
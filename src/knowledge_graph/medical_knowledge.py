@@ -7,17 +7,25 @@ medical_knowledge = {
     "shortness_of_breath": {
         "related_conditions": ["asthma", "copd", "pulmonary_embolism"],
         "urgency": "high"
+    },
+    "headache": {
+        "related_conditions": ["tension_headache", "migraine", "sinusitis"],
+        "urgency": "medium",
+        "questions": ["onset", "frequency", "associated_nausea"]
+    },
+    "fever": {
+        "related_conditions": ["viral_infection", "influenza", "bacterial_infection"],
+        "urgency": "medium",
+        "questions": ["duration", "max_temperature", "response_to_medication"]
     }
 }
 
 
-def query_knowledge_graph(symptoms: list[str]):
-    urgency_levels = []
-    for symptom in symptoms:
-        if symptom in medical_knowledge:
-            urgency = medical_knowledge[symptom].get("urgency", "medium")
-            urgency_levels.append(urgency)
+def query_knowledge_graph(symptoms: list[str], store=None):
+    # Imported here because the store builds its default graph from this module
+    from src.knowledge_graph.graph_store import get_knowledge_graph
 
-    if "high" in urgency_levels:
+    store = store or get_knowledge_graph()
+    if store.max_urgency(symptoms) == "high":
         return "emergency"
     return "non_emergency"
@@ -0,0 +1,101 @@
+from typing import List, Optional, Pattern
+import re
+import threading
+from src.knowledge_graph.graph_store import get_knowledge_graph
+from src.knowledge_graph.symptom_lexicon import NEGATION_WORDS, SYMPTOM_SYNONYMS
+
+# Phrases that warrant emergency care whatever else the message says
+RED_FLAG_PHRASES: List[str] = [
+    "crushing chest pain", "chest pain radiating", "pain radiating to my arm",
+    "pain radiates to my left arm", "radiates to my left arm", "heart attack",
+    "can't breathe", "cannot breathe", "can not breathe", "not breathing",
+    "struggling to breathe", "gasping for air", "choking", "blue lips",
+    "throat closing", "throat is closing", "anaphylaxis", "anaphylactic",
+    "unconscious", "unresponsive", "passed out", "fainted", "seizure", "seizures",
+    "stroke", "face drooping", "slurred speech", "sudden numbness",
+    "worst headache of my life", "sudden severe headache",
+    "severe bleeding", "bleeding heavily", "won't stop bleeding",
+    "coughing up blood", "vomiting blood", "blood in vomit",
+    "suicidal", "kill myself", "end my life", "overdose", "overdosed",
+]
+
+# A red flag preceded by a negation word (NEGATION_WORDS) within the same
+# few words of the same clause is treated as denied ("no chest pain", but
+# not "no fever, but chest pain")
+NEGATION_WINDOW = 3
+CLAUSE_BOUNDARY = re.compile(r"[,;.!?]|\b(?:but|and)\b", re.IGNORECASE)
+
+# Red flags that are often past medical history rather than the current
+# complaint ("my dad had a stroke years ago", "history of heart attack")
+HISTORY_PHRASES = {"stroke", "heart attack"}
+HISTORY_WORDS = {"previous", "prior", "past", "old", "earlier", "former"}
+# ...unless the same clause places them now ("had a stroke this morning")
+RECENT_WORDS = {"now", "today", "tonight", "morning", "just", "minutes", "minute",
+                "hour", "hours", "currently", "happening", "having"}
+
+_matcher: Optional[Pattern] = None
+_matcher_lock = threading.Lock()
+
+
+def _phrase_pattern(phrase: str) -> str:
+    # Any run of spaces, hyphens or underscores separates words
+    words = re.split(r"[\s_\-]+", phrase.strip().lower())
+    return r"[\s\-]+".join(re.escape(word) for word in words if word)
+
+
+def build_red_flag_matcher(store=None) -> Pattern:
+    """One compiled alternation over the red-flag phrases and every
+    synonym of a high-urgency symptom in the knowledge graph"""
+    store = store or get_knowledge_graph()
+    phrases = set(RED_FLAG_PHRASES)
+    for symptom in store.symptoms_with_urgency("high"):
+        phrases.add(symptom.replace("_", " "))
+        phrases.update(SYMPTOM_SYNONYMS.get(symptom, []))
+    # Longest first so the reported reason is the most specific phrase
+    alternation = "|".join(_phrase_pattern(p)
+                           for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<![\w'])(?:{alternation})(?![\w'])", re.IGNORECASE)
+
+
+def _get_matcher() -> Pattern:
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = build_red_flag_matcher()
+    return _matcher
+
+
+def _clause_words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+
+def _negated(text: str, start: int) -> bool:
+    clause = CLAUSE_BOUNDARY.split(text[max(0, start - 80):start])[-1]
+    return any(word in NEGATION_WORDS for word in _clause_words(clause)[-NEGATION_WINDOW:])
+
+
+def _past_history(text: str, match) -> bool:
+    """Whether a stroke or heart attack is mentioned as an earlier event
+    rather than one happening now"""
+    if " ".join(_clause_words(match.group(0))) not in HISTORY_PHRASES:
+        return False
+    before = _clause_words(CLAUSE_BOUNDARY.split(text[max(0, match.start() - 80):match.start()])[-1])
+    after = _clause_words(CLAUSE_BOUNDARY.split(text[match.end():match.end() + 80])[0])
+    if RECENT_WORDS.intersection(before[-4:] + after):
+        return False
+    if before[-2:] == ["history", "of"] or before[-1:] and before[-1] in HISTORY_WORDS:
+        return True
+    return len(before) >= 2 and before[-2] == "had" and before[-1] in ("a", "an")
+
+
+def screen_emergency(user_input: str) -> Optional[str]:
+    """The red-flag phrase found in the message, or None when nothing in
+    it calls for emergency care"""
+    if not isinstance(user_input, str):
+        return None
+    text = user_input.replace("’", "'")
+    for match in _get_matcher().finditer(text):
+        if not _negated(text, match.start()) and not _past_history(text, match):
+            return match.group(0).lower()
+    return None
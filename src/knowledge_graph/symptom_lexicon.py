@@ -0,0 +1,141 @@
+from typing import Dict, List, NamedTuple, Optional
+import re
+from src.knowledge_graph.medical_knowledge import medical_knowledge
+
+# Canonical symptom -> the phrases patients use for it. Canonical names use
+# the same snake_case keys as medical_knowledge.
+SYMPTOM_SYNONYMS: Dict[str, List[str]] = {
+    "chest_pain": ["chest pain", "chest pains", "pain in my chest", "chest tightness", "tight chest"],
+    "shortness_of_breath": ["shortness of breath", "short of breath", "breathlessness",
+                            "trouble breathing", "difficulty breathing", "breathing difficulty"],
+    "headache": ["headache", "headaches", "head ache", "head pain", "migraine"],
+    "fever": ["fever", "fevers", "high temperature", "temperature", "feverish"],
+    "cough": ["cough", "coughing", "dry cough", "wet cough"],
+    "sore_throat": ["sore throat", "throat pain", "scratchy throat"],
+    "runny_nose": ["runny nose", "running nose", "stuffy nose", "blocked nose", "congestion"],
+    "nausea": ["nausea", "nauseous", "nauseated", "queasy"],
+    "vomiting": ["vomiting", "throwing up", "vomit"],
+    "diarrhea": ["diarrhea", "diarrhoea"],
+    "abdominal_pain": ["abdominal pain", "stomach ache", "stomachache", "stomach pain", "belly pain"],
+    "dizziness": ["dizziness", "dizzy", "lightheaded", "light headed", "vertigo"],
+    "fatigue": ["fatigue", "tired", "tiredness", "exhausted", "exhaustion"],
+    "back_pain": ["back pain", "backache", "lower back pain"],
+    "rash": ["rash", "skin rash", "hives"],
+    "chills": ["chills", "shivering"],
+    "muscle_aches": ["muscle aches", "muscle ache", "body aches", "body ache", "muscle pain"],
+    "joint_pain": ["joint pain", "joint pains", "aching joints"],
+    "earache": ["earache", "ear ache", "ear pain"],
+    "toothache": ["toothache", "tooth ache", "tooth pain"],
+    "insomnia": ["insomnia", "can't sleep", "cannot sleep", "trouble sleeping"],
+}
+
+# Words that carry no clinical information; they neither lower nor raise
+# the confidence of a local match. Intensity and timing words are left out
+# on purpose so that "severe headache for two days" still reaches the LLM,
+# which can capture those details.
+FILLER_WORDS = frozenset("""
+a an and the i i'm im i've ive me my have has had having got get getting
+been be am is are was were feel feeling feels also too with of just
+""".split())
+
+# Words denying a symptom ("no fever", "I haven't had chest pain"). Any of
+# them makes a local match unreliable, so the LLM decides instead; the
+# red-flag screen ignores a phrase they precede.
+NEGATION_WORDS = frozenset("""
+no not without never denies deny don't dont doesn't doesnt didn't didnt
+isn't isnt wasn't wasnt aren't arent weren't werent haven't havent
+hasn't hasnt hadn't hadnt
+""".split())
+
+# Share of non-filler words that must belong to a known symptom phrase
+# before the LLM is skipped
+LOCAL_MATCH_THRESHOLD = 1.0
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_END = "$"
+
+
+class SymptomMatch(NamedTuple):
+    symptoms: List[str]
+    confidence: float
+    # Whether the text also held a negation, so some symptoms may be denied
+    negated: bool = False
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("’", "'"))
+
+
+def _build_trie(synonyms: Dict[str, List[str]]) -> Dict:
+    trie: Dict = {}
+    for canonical, phrases in synonyms.items():
+        for phrase in phrases + [canonical.replace("_", " ")]:
+            node = trie
+            for token in _tokenize(phrase):
+                node = node.setdefault(token, {})
+            node[_END] = canonical
+    return trie
+
+
+def _lexicon() -> Dict[str, List[str]]:
+    synonyms = {canonical: list(phrases)
+                for canonical, phrases in SYMPTOM_SYNONYMS.items()}
+    for symptom in medical_knowledge:
+        synonyms.setdefault(symptom, [])
+    return synonyms
+
+
+_TRIE = _build_trie(_lexicon())
+
+
+def match_symptoms(text: str) -> SymptomMatch:
+    """Extract canonical symptoms with a longest-match walk over the
+    synonym trie. Confidence is the share of non-filler words covered by a
+    symptom phrase (0.0 when a negation is present)."""
+    tokens = _tokenize(text)
+    symptoms: List[str] = []
+    covered = 0
+    content = 0
+    negated = False
+
+    i = 0
+    while i < len(tokens):
+        node = _TRIE
+        match_end, match = i, None
+        j = i
+        while j < len(tokens) and tokens[j] in node:
+            node = node[tokens[j]]
+            j += 1
+            if _END in node:
+                match_end, match = j, node[_END]
+
+        if match is not None:
+            if match not in symptoms:
+                symptoms.append(match)
+            covered += match_end - i
+            content += match_end - i
+            i = match_end
+            continue
+
+        token = tokens[i]
+        if token in NEGATION_WORDS:
+            negated = True
+        elif token not in FILLER_WORDS:
+            content += 1
+        i += 1
+
+    if negated:
+        return SymptomMatch(symptoms, 0.0, True)
+    if not content:
+        return SymptomMatch(symptoms, 0.0)
+    return SymptomMatch(symptoms, covered / content)
+
+
+def canonical_symptom(phrase: str) -> Optional[str]:
+    """Canonical name when the whole phrase is a known symptom synonym"""
+    node = _TRIE
+    for token in _tokenize(phrase):
+        node = node.get(token)
+        if node is None:
+            return None
+    return node.get(_END)
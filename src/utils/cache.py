@@ -0,0 +1,184 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def make_cache_key(kind: str, payload: Any, **params) -> str:
+    """Content-addressed key: a hash of the call kind, its normalized payload
+    and every parameter that changes the LLM output (model, temperature,
+    prompt version)"""
+    material = json.dumps(
+        {"kind": kind, "payload": payload, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Base class for response cache backends. Values must be JSON
+    serializable; backends only implement _get/_set/_clear."""
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.semantic_hits = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str, semantic: bool = False) -> Optional[Any]:
+        """Cached value for ``key``, or None. ``semantic`` marks the lookup
+        of a key found through the semantic index: its request already
+        counted an exact miss, so only a hit is counted, in semantic_hits."""
+        value = self._get(key)
+        with self._stats_lock:
+            if semantic:
+                if value is not None:
+                    self.semantic_hits += 1
+            elif value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._set(key, value, expires_at)
+
+    def clear(self) -> None:
+        self._clear()
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+            self.semantic_hits = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "semantic_hits": self.semantic_hits
+            }
+
+    def _get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with an optional TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache shared by every process that opens the same file"""
+
+    def __init__(self, path: str = "medical_cache.sqlite3", ttl: Optional[float] = 86400):
+        super().__init__(ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(value)
+
+    def _set(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._conn.commit()
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RequestCoalescer:
+    """Collapses identical concurrent async calls: while one call for a key
+    is in flight, later callers with the same key await its result instead
+    of starting their own"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A caller that goes away must not cancel the call for the others
+        return await asyncio.shield(future)
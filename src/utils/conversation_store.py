@@ -0,0 +1,189 @@
+"""Bounded per-session conversation history for the Streamlit app.
+
+Each browser session keeps only its last WINDOW_MESSAGES messages in
+memory. Every message is also written to a local SQLite file, from which
+older pages are read back on request. Sessions idle for longer than
+SESSION_TTL lose their stored messages, so neither the worker's memory nor
+the file grows with the length of a shift.
+"""
+from typing import Dict, List, Optional
+from collections import deque
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Messages a session keeps in memory (and renders by default)
+WINDOW_MESSAGES = 20
+# Messages per "show earlier" page
+PAGE_MESSAGES = 20
+# Older messages shown above the window at most; paging further back
+# drops the newest of them
+MAX_EARLIER_MESSAGES = 5 * PAGE_MESSAGES
+# Idle time after which a session's stored messages are dropped
+SESSION_TTL = 12 * 3600
+# Minimum time between two sweeps for stale sessions
+EVICTION_INTERVAL = 300
+
+
+class ConversationStore:
+    """Message log shared by every session of the process"""
+
+    def __init__(self, path: str = "medical_ui_history.sqlite3",
+                 session_ttl: float = SESSION_TTL):
+        self.path = path
+        self.session_ttl = session_ttl
+        self._last_eviction = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (session, seq))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session TEXT PRIMARY KEY, last_active REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            self._conn.commit()
+
+    def append(self, session: str, seq: int, role: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO messages (session, seq, role, content, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", (session, seq, role, content, now))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session, last_active) VALUES (?, ?)",
+                (session, now))
+            self._conn.commit()
+        if now - self._last_eviction > EVICTION_INTERVAL:
+            self.evict_stale()
+
+    def page(self, session: str, before: int, limit: int) -> List[Dict[str, str]]:
+        """Up to ``limit`` messages with a sequence number below ``before``,
+        oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?", (session, before, limit)).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def delete(self, session: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session = ?", (session,))
+            self._conn.execute("DELETE FROM sessions WHERE session = ?", (session,))
+            self._conn.commit()
+
+    def evict_stale(self) -> int:
+        """Drop the messages of sessions idle for longer than session_ttl"""
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            self._last_eviction = time.time()
+            stale = [row[0] for row in self._conn.execute(
+                "SELECT session FROM sessions WHERE last_active < ?", (cutoff,))]
+            self._conn.executemany(
+                "DELETE FROM messages WHERE session = ?", [(s,) for s in stale])
+            self._conn.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+            self._conn.commit()
+        return len(stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SessionConversation:
+    """One session's conversation: a window of recent messages in memory,
+    the whole conversation in the store"""
+
+    def __init__(self, store: ConversationStore, session: str,
+                 window: int = WINDOW_MESSAGES, max_earlier: int = MAX_EARLIER_MESSAGES):
+        self.store = store
+        self.session = session
+        self.recent: deque = deque(maxlen=window)
+        self.max_earlier = max_earlier
+        self.count = 0
+        # Older messages currently shown above the window, and the
+        # sequence number of the first of them
+        self.earlier: List[Dict[str, str]] = []
+        self.earlier_start = 0
+        # Messages below this sequence number were evicted from the store
+        self.oldest_stored = 0
+
+    def append(self, role: str, content: str) -> None:
+        try:
+            self.store.append(self.session, self.count, role, content)
+        except Exception as e:
+            # The conversation goes on; only paging back past the window suffers
+            logger.error(f"Conversation store write failed: {str(e)}")
+        self.recent.append({"role": role, "content": content})
+        self.count += 1
+
+    def _window_start(self) -> int:
+        return self.count - len(self.recent)
+
+    def _shown_start(self) -> int:
+        return self.earlier_start if self.earlier else self._window_start()
+
+    def hidden_count(self) -> int:
+        """Stored messages older than any shown"""
+        return max(0, self._shown_start() - self.oldest_stored)
+
+    def gap_count(self) -> int:
+        """Messages between the earlier ones shown and the window, left
+        out to keep ``earlier`` bounded or passed by the window since"""
+        if not self.earlier:
+            return 0
+        return self._window_start() - self.earlier_start - len(self.earlier)
+
+    def load_earlier(self, limit: int = PAGE_MESSAGES) -> None:
+        """Prepend the previous page of stored messages"""
+        before = self._shown_start()
+        expected = min(limit, self.hidden_count())
+        page = self.store.page(self.session, before, limit)
+        if len(page) < expected:
+            # Short page: the session sat idle long enough to be evicted
+            self.oldest_stored = before - len(page)
+        if page:
+            self.earlier_start = before - len(page)
+            self.earlier = (page + self.earlier)[:self.max_earlier]
+
+    def hide_earlier(self) -> None:
+        self.earlier = []
+
+    def visible(self) -> List[Dict[str, str]]:
+        return self.earlier + list(self.recent)
+
+    def clear(self, session: Optional[str] = None) -> None:
+        """Forget the conversation; continue under ``session`` if given"""
+        self.store.delete(self.session)
+        self.session = session or self.session
+        self.recent.clear()
+        self.earlier = []
+        self.earlier_start = 0
+        self.count = 0
+        self.oldest_stored = 0
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide store at MEDICAL_UI_STORE_PATH"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConversationStore(
+                    os.getenv("MEDICAL_UI_STORE_PATH", "medical_ui_history.sqlite3"))
+    return _store
@@ -0,0 +1,329 @@
+"""Rate-limited, retrying front for Groq-compatible chat clients.
+
+A gateway exposes the same ``chat.completions.create(...)`` surface as the
+client it wraps, so it can be passed anywhere an ``llm_client`` is
+expected, including create_medical_workflow. Each call goes through:
+
+- a token bucket for requests per minute and one for tokens per minute,
+- a circuit breaker that fails fast while the API keeps erroring,
+- a per-call deadline shared by all retries of that call,
+- retries with jittered exponential backoff (honouring Retry-After).
+"""
+from typing import Any, Dict, Optional
+import asyncio
+import os
+import random
+import threading
+import time
+import httpx
+from groq import (
+    Groq,
+    AsyncGroq,
+    APIConnectionError,
+    APITimeoutError,
+    RateLimitError,
+    InternalServerError
+)
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError,
+                    RateLimitError, InternalServerError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit is open"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call could not complete within its deadline"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``per_minute``"""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1.0, per_minute / 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds`` (e.g. after a 429)"""
+        with self._lock:
+            self.paused_until = max(
+                self.paused_until, time.monotonic() + seconds)
+
+    def _reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens if available; otherwise return how long
+        to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            # A request larger than the bucket waits for a full bucket
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def acquire(self, amount: float = 1.0, deadline: Optional[float] = None) -> None:
+        while True:
+            wait = self._reserve(amount)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise DeadlineExceededError(
+                    "Rate limit wait would exceed the call deadline")
+            time.sleep(wait)
+
+
+class AsyncTokenBucket(TokenBucket):
+    """Token bucket whose waits yield to the event loop"""
+
+    async def acquire(self, amount: float = 1.0, deadline: Optional[float] = None) -> None:
+        while True:
+            wait = self._reserve(amount)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise DeadlineExceededError(
+                    "Rate limit wait would exceed the call deadline")
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets a
+    single trial call through once ``reset_timeout`` has passed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_neutral(self) -> None:
+        """The call ended without telling us anything about API health
+        (e.g. a 400 for a bad request); only frees the trial slot"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Rough token cost of a chat request for the tokens-per-minute bucket:
+    ~4 characters per prompt token plus the completion budget"""
+    prompt_chars = sum(len(str(m.get("content", "")))
+                       for m in request.get("messages", []))
+    return prompt_chars // 4 + int(request.get("max_tokens") or 0)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _GatewayBase:
+    def __init__(
+        self,
+        client: Any,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        deadline: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        bucket_cls=TokenBucket
+    ):
+        self.client = client
+        self.request_bucket = bucket_cls(
+            requests_per_minute) if requests_per_minute else None
+        self.token_bucket = bucket_cls(
+            tokens_per_minute) if tokens_per_minute else None
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        # Mirrors client.chat.completions so the gateway is a drop-in client
+        self.chat = self
+        self.completions = self
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps concurrent retries from arriving in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _on_retryable(self, attempt: int, error: Exception, deadline: float) -> float:
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff(attempt, error)
+        if isinstance(error, RateLimitError):
+            for bucket in (self.request_bucket, self.token_bucket):
+                if bucket is not None:
+                    bucket.pause(delay)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        return delay
+
+
+class LLMGateway(_GatewayBase):
+    """Gateway for a synchronous Groq-compatible client"""
+
+    def create(self, **request):
+        deadline = time.monotonic() + request.pop("deadline", self.deadline)
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            # Every way out of an attempt settles the breaker, so a
+            # half-open trial slot cannot be left taken
+            try:
+                if self.request_bucket is not None:
+                    self.request_bucket.acquire(1, deadline)
+                if self.token_bucket is not None:
+                    self.token_bucket.acquire(tokens, deadline)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError("LLM call deadline exceeded")
+                response = self.client.chat.completions.create(
+                    timeout=remaining, **request)
+            except RETRYABLE_ERRORS as e:
+                delay = self._on_retryable(attempt, e, deadline)
+            except BaseException:
+                # Includes deadline, cancellation and non-retryable errors
+                self.breaker.record_neutral()
+                raise
+            else:
+                self.breaker.record_success()
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncLLMGateway(_GatewayBase):
+    """Gateway for an AsyncGroq-compatible client"""
+
+    def __init__(self, client: Any, **options):
+        super().__init__(client, bucket_cls=AsyncTokenBucket, **options)
+
+    async def create(self, **request):
+        deadline = time.monotonic() + request.pop("deadline", self.deadline)
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            # Every way out of an attempt settles the breaker, so a
+            # half-open trial slot cannot be left taken
+            try:
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire(1, deadline)
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(tokens, deadline)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError("LLM call deadline exceeded")
+                response = await self.client.chat.completions.create(
+                    timeout=remaining, **request)
+            except RETRYABLE_ERRORS as e:
+                delay = self._on_retryable(attempt, e, deadline)
+            except BaseException:
+                # Includes deadline, cancellation and non-retryable errors
+                self.breaker.record_neutral()
+                raise
+            else:
+                self.breaker.record_success()
+                return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _gateway_options() -> Dict[str, Any]:
+    """Deployment settings, read from the environment"""
+    def number(name: str, default: Optional[float]) -> Optional[float]:
+        value = os.getenv(name)
+        return float(value) if value else default
+
+    return {
+        "requests_per_minute": number("LLM_REQUESTS_PER_MINUTE", None),
+        "tokens_per_minute": number("LLM_TOKENS_PER_MINUTE", None),
+        "deadline": number("LLM_DEADLINE_SECONDS", 30.0),
+        "max_retries": int(number("LLM_MAX_RETRIES", 3))
+    }
+
+
+def _pool_limits(max_connections: Optional[int]) -> httpx.Limits:
+    max_connections = max_connections or int(
+        os.getenv("LLM_MAX_CONNECTIONS", "64"))
+    return httpx.Limits(max_connections=max_connections,
+                        max_keepalive_connections=max_connections)
+
+
+def create_groq_gateway(api_key: str, max_connections: Optional[int] = None,
+                        base_url: Optional[str] = None, **options) -> LLMGateway:
+    """Groq client on a connection pool sized for ``max_connections``
+    concurrent calls, wrapped in an LLMGateway. SDK retries are disabled
+    because the gateway does its own."""
+    client = Groq(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        http_client=httpx.Client(limits=_pool_limits(max_connections))
+    )
+    return LLMGateway(client, **{**_gateway_options(), **options})
+
+
+def create_async_groq_gateway(api_key: str, max_connections: Optional[int] = None,
+                              base_url: Optional[str] = None, **options) -> AsyncLLMGateway:
+    """Async counterpart of create_groq_gateway"""
+    client = AsyncGroq(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        http_client=httpx.AsyncClient(limits=_pool_limits(max_connections))
+    )
+    return AsyncLLMGateway(client, **{**_gateway_options(), **options})
@@ -0,0 +1,93 @@
+"""Per-node model routing.
+
+Each LLM-backed workflow step has an ordered list of model tiers. A call
+starts on the first, cheapest tier and only moves to the next one when
+the caller judges the answer unusable (see safety.extract_symptom_records,
+which escalates on unparseable output or low confidence).
+
+The table can be overridden per deployment with MEDICAL_MODEL_ROUTES,
+either inline JSON or the path of a JSON file, shaped like:
+
+    {"extract_symptoms": [{"model": "llama-3.1-8b-instant", "max_tokens": 150},
+                          {"model": "llama-3.3-70b-versatile"}]}
+
+Steps missing from the override keep their defaults, and fields missing
+from a tier default to the step's first default tier.
+"""
+from typing import Dict, List, NamedTuple, Optional
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRoute(NamedTuple):
+    model: str
+    max_tokens: int
+    temperature: float
+
+
+DEFAULT_ROUTES: Dict[str, List[ModelRoute]] = {
+    # Short structured classification: a small instant model, with a larger
+    # one behind it for the answers the small one gets wrong
+    "extract_symptoms": [
+        ModelRoute("llama-3.1-8b-instant", 200, 0.0),
+        ModelRoute("llama-3.3-70b-versatile", 200, 0.0)
+    ],
+    "generate_recommendations": [
+        ModelRoute("gemma2-9b-it", 400, 0.3),
+        ModelRoute("llama-3.3-70b-versatile", 400, 0.3)
+    ]
+}
+
+_routes: Optional[Dict[str, List[ModelRoute]]] = None
+_routes_lock = threading.Lock()
+
+
+def parse_routes(config: Dict[str, List[Dict]]) -> Dict[str, List[ModelRoute]]:
+    """Route table from its JSON form, on top of DEFAULT_ROUTES"""
+    routes = {node: list(tiers) for node, tiers in DEFAULT_ROUTES.items()}
+    for node, tiers in config.items():
+        if not isinstance(tiers, list) or not tiers:
+            raise ValueError(f"Routes for {node} must be a non-empty list")
+        base = DEFAULT_ROUTES.get(node, [ModelRoute("gemma2-9b-it", 400, 0.3)])[0]
+        routes[node] = [
+            ModelRoute(
+                model=str(tier.get("model", base.model)),
+                max_tokens=int(tier.get("max_tokens", base.max_tokens)),
+                temperature=float(tier.get("temperature", base.temperature))
+            )
+            for tier in tiers
+        ]
+    return routes
+
+
+def _load_routes() -> Dict[str, List[ModelRoute]]:
+    raw = os.getenv("MEDICAL_MODEL_ROUTES")
+    if not raw:
+        return parse_routes({})
+    if not raw.lstrip().startswith("{"):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    routes = parse_routes(json.loads(raw))
+    logger.info(f"Model routes loaded for {', '.join(sorted(routes))}")
+    return routes
+
+
+def get_routes(node: str) -> List[ModelRoute]:
+    """Model tiers for ``node``, cheapest first"""
+    global _routes
+    if _routes is None:
+        with _routes_lock:
+            if _routes is None:
+                _routes = _load_routes()
+    return _routes[node]
+
+
+def set_routes(config: Optional[Dict[str, List[Dict]]]) -> None:
+    """Replace the route table (None reloads it from the environment)"""
+    global _routes
+    with _routes_lock:
+        _routes = None if config is None else parse_routes(config)
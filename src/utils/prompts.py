@@ -0,0 +1,150 @@
+"""Compact, budgeted prompts for the recommendation call.
+
+The instructions live in one static system message, identical on every
+call, so providers that cache prompt prefixes can reuse it. The per-call
+user message only carries the patient data. That data is deduplicated,
+canonicalized and trimmed to a token budget measured with a local
+estimate, so a degenerate extraction cannot inflate the prompt.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import re
+from src.knowledge_graph.symptom_lexicon import canonical_symptom
+
+RECOMMENDATION_SYSTEM_PROMPT = (
+    "You are a cautious medical assistant. Given a patient's symptoms and "
+    "medical history, provide 3-5 general recommendations as markdown "
+    "bullets with emojis. Rules:\n"
+    "1. 'Consult a healthcare professional' is the first point\n"
+    "2. Never diagnose conditions\n"
+    "3. Suggest only OTC medications, as examples\n"
+    "4. Prioritize safety over specificity; only WHO/CDC-approved recommendations\n"
+    "5. Include first aid measures if relevant\n"
+    "6. State clearly that this is not medical advice"
+)
+
+# Tokens allowed for the patient data of one recommendation prompt
+RECOMMENDATION_PROMPT_BUDGET = 300
+# Share of the budget the medical history may use
+HISTORY_BUDGET_SHARE = 0.3
+MAX_ITEM_CHARS = 80
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the tokens ``text`` costs: one per punctuation
+    mark and one per four characters of each word, which tracks BPE
+    tokenizers on English closely enough for budgeting"""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def _clean(text: Any) -> Optional[str]:
+    if not isinstance(text, str):
+        return None
+    text = " ".join(text.split())
+    return text[:MAX_ITEM_CHARS] or None
+
+
+def _display_name(symptom: str) -> str:
+    return (canonical_symptom(symptom) or symptom).replace("_", " ")
+
+
+def group_symptoms(symptoms: List[str]) -> List[Tuple[str, List[str]]]:
+    """(symptom, attributes) pairs in first-mention order. Synonyms and
+    case variants collapse into one symptom, and ``<name>_<attribute>:
+    <value>`` entries attach to their symptom."""
+    names: List[str] = []
+    seen_names = set()
+    attribute_entries: List[Tuple[str, str]] = []
+    for entry in symptoms:
+        text = _clean(entry)
+        if text is None:
+            continue
+        key, sep, value = text.partition(": ")
+        if sep and "_" in key:
+            attribute_entries.append((key, value))
+            continue
+        name = _display_name(text)
+        if name.lower() not in seen_names:
+            seen_names.add(name.lower())
+            names.append(name)
+
+    attributes: Dict[str, List[str]] = {name: [] for name in names}
+    seen_attributes = set()
+    # Longest names first so "chest_pain_duration" attaches to chest pain, not chest
+    prefixes = sorted(((name.lower().replace(" ", "_") + "_", name) for name in names),
+                      key=lambda item: -len(item[0]))
+    for key, value in attribute_entries:
+        owner = next((name for prefix, name in prefixes
+                      if key.lower().startswith(prefix)), None)
+        if owner is None:
+            # Its symptom is not named on its own; keep it as a symptom
+            owner, attribute = key.replace("_", " "), None
+            if owner.lower() not in seen_names:
+                seen_names.add(owner.lower())
+                names.append(owner)
+                attributes[owner] = []
+        else:
+            attribute = key[len(owner) + 1:].replace("_", " ")
+        rendered = f"{attribute}: {value}" if attribute else value
+        if (owner, rendered.lower()) not in seen_attributes:
+            seen_attributes.add((owner, rendered.lower()))
+            attributes[owner].append(rendered)
+    return [(name, attributes[name]) for name in names]
+
+
+def render_symptoms(symptoms: List[str], budget: int) -> str:
+    """One line per symptom, stopping once ``budget`` tokens are used"""
+    lines: List[str] = []
+    used = 0
+    groups = group_symptoms(symptoms)
+    for index, (name, attributes) in enumerate(groups):
+        line = f"- {name}" + (f" ({'; '.join(attributes)})" if attributes else "")
+        cost = count_tokens(line)
+        if lines and used + cost > budget:
+            lines.append(f"- (+{len(groups) - index} more omitted)")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines) or "- none reported"
+
+
+def render_history(medical_history: Dict, budget: int) -> str:
+    """``Field: item, item`` lines for the non-empty history fields,
+    deduplicated and cut to ``budget`` tokens"""
+    lines: List[str] = []
+    used = 0
+    for field, items in medical_history.items():
+        values = items if isinstance(items, list) else [items]
+        unique: List[str] = []
+        for value in values:
+            text = _clean(value)
+            if text and text.lower() not in (u.lower() for u in unique):
+                unique.append(text)
+        if not unique:
+            continue
+        line = f"{str(field).replace('_', ' ').capitalize()}: "
+        used += count_tokens(line)
+        kept: List[str] = []
+        for value in unique:
+            cost = count_tokens(value) + 1
+            if kept and used + cost > budget:
+                kept.append(f"+{len(unique) - len(kept)} more")
+                break
+            kept.append(value)
+            used += cost
+        lines.append(line + ", ".join(kept))
+    return "\n".join(lines) or "None reported"
+
+
+def build_recommendation_messages(symptoms: List[str], medical_history: Dict,
+                                  budget: int = RECOMMENDATION_PROMPT_BUDGET) -> List[Dict]:
+    """Static system prompt plus the patient data within ``budget`` tokens"""
+    history_budget = int(budget * HISTORY_BUDGET_SHARE)
+    history = render_history(medical_history, history_budget)
+    symptom_budget = budget - min(history_budget, count_tokens(history))
+    return [
+        {"role": "system", "content": RECOMMENDATION_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Symptoms:\n{render_symptoms(symptoms, symptom_budget)}\n\n"
+                                    f"Medical history:\n{history}"}
+    ]
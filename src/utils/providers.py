@@ -0,0 +1,375 @@
+"""Provider abstraction with hedged requests and fallback.
+
+A HedgedClient exposes the same ``chat.completions.create(...)`` surface as
+a Groq client, so it can be passed anywhere an ``llm_client`` is expected
+(including create_medical_workflow). Behind it sits an ordered list of
+providers, the first being the primary:
+
+- each call goes to the primary first;
+- if it has not answered once its usual latency (a percentile of its
+  recent calls) has passed, the same request is hedged to the next
+  healthy provider, and the first valid answer wins;
+- a provider that fails, or whose circuit is open, hands over at once;
+- the loser is cancelled (async) or abandoned (sync, as a thread cannot
+  be interrupted mid-request).
+
+Providers are any Groq-compatible client or gateway, ModelOverride (same
+client, another model) or the Anthropic adapters below. Streaming calls
+are not hedged; they go to the first healthy provider.
+
+Deployments enable a fallback with LLM_FALLBACK, either ``anthropic``
+(model from ANTHROPIC_MODEL) or ``groq:<model>``.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from types import SimpleNamespace
+import asyncio
+import logging
+import os
+import threading
+import time
+from src.utils.llm_gateway import CircuitBreaker, CircuitOpenError
+from src.utils.structured_logging import log_event
+from src.utils.telemetry import inc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANTHROPIC_MODEL = "claude-3-5-haiku-latest"
+
+
+class ModelOverride:
+    """A client whose requests always use ``model``, e.g. a smaller Groq
+    model as the hedge for a larger one"""
+
+    def __init__(self, client: Any, model: str):
+        self.client = client
+        self.model = model
+        self.chat = self
+        self.completions = self
+
+    def create(self, **request):
+        return self.client.chat.completions.create(**{**request, "model": self.model})
+
+
+def _anthropic_request(request: Dict[str, Any], model: str) -> Dict[str, Any]:
+    system = [m["content"] for m in request["messages"] if m["role"] == "system"]
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        system.append("Respond with a single JSON object and nothing else.")
+    params = {
+        "model": model,
+        "max_tokens": request.get("max_tokens") or 400,
+        "messages": [{"role": m["role"], "content": m["content"]}
+                     for m in request["messages"] if m["role"] != "system"]
+    }
+    if system:
+        params["system"] = "\n\n".join(system)
+    if request.get("temperature") is not None:
+        params["temperature"] = request["temperature"]
+    if request.get("timeout") is not None:
+        params["timeout"] = request["timeout"]
+    return params
+
+
+def _openai_shaped(message: Any) -> SimpleNamespace:
+    """An Anthropic message in the shape the workflow reads from Groq"""
+    text = "".join(getattr(block, "text", "") for block in message.content)
+    usage = getattr(message, "usage", None)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=text))],
+        usage=SimpleNamespace(
+            prompt_tokens=getattr(usage, "input_tokens", None),
+            completion_tokens=getattr(usage, "output_tokens", None)
+        ) if usage is not None else None
+    )
+
+
+def _single_chunk(response: SimpleNamespace) -> List[SimpleNamespace]:
+    content = response.choices[0].message.content
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))],
+                            usage=response.usage, x_groq=None)]
+
+
+class AnthropicProvider:
+    """Groq-shaped adapter over the Anthropic Messages API. Streams are
+    answered as one chunk."""
+
+    def __init__(self, client: Any, model: str = DEFAULT_ANTHROPIC_MODEL):
+        self.client = client
+        self.model = model
+        self.chat = self
+        self.completions = self
+
+    def create(self, **request):
+        response = _openai_shaped(
+            self.client.messages.create(**_anthropic_request(request, self.model)))
+        return iter(_single_chunk(response)) if request.get("stream") else response
+
+
+class AsyncAnthropicProvider(AnthropicProvider):
+    async def create(self, **request):
+        response = _openai_shaped(
+            await self.client.messages.create(**_anthropic_request(request, self.model)))
+        return iter(_single_chunk(response)) if request.get("stream") else response
+
+
+class ProviderHealth:
+    """Recent latencies and a circuit breaker for one provider"""
+
+    def __init__(self, window: int = 200, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.latencies: deque = deque(maxlen=window)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.successes = 0
+        self.failures = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.latencies.append(latency)
+            else:
+                self.failures += 1
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.wins += 1
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.percentile(50, 1)
+        p95 = self.percentile(95, 1)
+        with self._lock:
+            successes, failures, wins = self.successes, self.failures, self.wins
+        return {
+            "state": self.breaker.state,
+            "successes": successes,
+            "failures": failures,
+            "hedge_wins": wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+def _valid(response: Any) -> bool:
+    try:
+        content = response.choices[0].message.content
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return isinstance(content, str) and bool(content.strip())
+
+
+class _HedgedBase:
+    def __init__(
+        self,
+        providers: List[Tuple[str, Any]],
+        hedge_percentile: float = 95.0,
+        min_samples: int = 20,
+        default_hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05
+    ):
+        if not providers:
+            raise ValueError("HedgedClient needs at least one provider")
+        self.providers = providers
+        self.health = {name: ProviderHealth() for name, _ in providers}
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.chat = self
+        self.completions = self
+
+    def hedge_delay(self, name: str) -> float:
+        """How long ``name`` may take before the request is hedged"""
+        observed = self.health[name].percentile(self.hedge_percentile, self.min_samples)
+        if observed is None:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, observed)
+
+    def health_report(self) -> Dict[str, Dict[str, Any]]:
+        return {name: health.snapshot() for name, health in self.health.items()}
+
+    def _record_win(self, name: str, hedged: bool) -> None:
+        if hedged:
+            self.health[name].record_win()
+            inc("medical_llm_hedges_total", provider=name,
+                outcome="primary" if name == self.providers[0][0] else "hedge")
+
+    def _streaming_provider(self) -> Tuple[str, Any]:
+        for name, client in self.providers:
+            if self.health[name].breaker.state != "open":
+                return name, client
+        return self.providers[0]
+
+
+class HedgedClient(_HedgedBase):
+    """Hedging front for synchronous providers"""
+
+    def __init__(self, providers: List[Tuple[str, Any]], max_workers: int = 32, **options):
+        super().__init__(providers, **options)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="llm-hedge")
+
+    def _call(self, name: str, client: Any, request: Dict[str, Any],
+              started: Optional[threading.Event] = None):
+        if started is not None:
+            started.set()
+        health = self.health[name]
+        health.breaker.before_call()
+        start = time.monotonic()
+        try:
+            response = client.chat.completions.create(**request)
+        except Exception:
+            health.record(None, ok=False)
+            raise
+        ok = _valid(response)
+        health.record(time.monotonic() - start, ok)
+        if not ok:
+            raise ValueError(f"Provider {name} returned an empty answer")
+        return response
+
+    def _submit(self, index: int, request: Dict[str, Any],
+                started: Optional[threading.Event] = None) -> Future:
+        name, client = self.providers[index]
+        # Worker threads keep the caller's request id and current span
+        context = copy_context()
+        return self._executor.submit(context.run, self._call, name, client, request, started)
+
+    def create(self, **request):
+        if request.get("stream"):
+            return self._streaming_provider()[1].chat.completions.create(**request)
+
+        started = threading.Event()
+        futures: Dict[Future, int] = {self._submit(0, request, started): 0}
+        # The hedge delay runs from when the primary call starts, not from
+        # when it was queued behind other calls on a busy pool
+        started.wait()
+        launched = 1
+        errors: List[Exception] = []
+        while futures:
+            can_hedge = launched < len(self.providers)
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED,
+                           timeout=self.hedge_delay(self.providers[0][0]) if can_hedge and launched == 1 else None)
+            if not done:
+                log_event(logger, logging.INFO, "llm_hedged",
+                          provider=self.providers[launched][0])
+                futures[self._submit(launched, request)] = launched
+                launched += 1
+                continue
+            for future in done:
+                index = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    if launched < len(self.providers) and not futures:
+                        # Failed outright: hand over without waiting
+                        futures[self._submit(launched, request)] = launched
+                        launched += 1
+                    continue
+                for loser in futures:
+                    loser.cancel()
+                self._record_win(self.providers[index][0], launched > 1)
+                return response
+        raise errors[-1] if errors else CircuitOpenError("No LLM provider available")
+
+
+class AsyncHedgedClient(_HedgedBase):
+    """Hedging front for async providers; losers are cancelled"""
+
+    async def _call(self, name: str, client: Any, request: Dict[str, Any]):
+        health = self.health[name]
+        health.breaker.before_call()
+        start = time.monotonic()
+        try:
+            response = await client.chat.completions.create(**request)
+        except asyncio.CancelledError:
+            # Lost the race; says nothing about the provider's health
+            health.breaker.record_neutral()
+            raise
+        except Exception:
+            health.record(None, ok=False)
+            raise
+        ok = _valid(response)
+        health.record(time.monotonic() - start, ok)
+        if not ok:
+            raise ValueError(f"Provider {name} returned an empty answer")
+        return response
+
+    def _submit(self, index: int, request: Dict[str, Any]) -> asyncio.Task:
+        name, client = self.providers[index]
+        return asyncio.ensure_future(self._call(name, client, request))
+
+    async def create(self, **request):
+        if request.get("stream"):
+            return await self._streaming_provider()[1].chat.completions.create(**request)
+
+        tasks: Dict[asyncio.Task, int] = {self._submit(0, request): 0}
+        launched = 1
+        errors: List[Exception] = []
+        try:
+            while tasks:
+                can_hedge = launched < len(self.providers)
+                done, _ = await asyncio.wait(
+                    list(tasks), return_when=asyncio.FIRST_COMPLETED,
+                    timeout=self.hedge_delay(self.providers[0][0]) if can_hedge and launched == 1 else None)
+                if not done:
+                    log_event(logger, logging.INFO, "llm_hedged",
+                              provider=self.providers[launched][0])
+                    tasks[self._submit(launched, request)] = launched
+                    launched += 1
+                    continue
+                for task in done:
+                    index = tasks.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        if launched < len(self.providers) and not tasks:
+                            tasks[self._submit(launched, request)] = launched
+                            launched += 1
+                        continue
+                    self._record_win(self.providers[index][0], launched > 1)
+                    return response
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise errors[-1] if errors else CircuitOpenError("No LLM provider available")
+
+
+def _fallback_provider(asynchronous: bool, primary: Any) -> Optional[Tuple[str, Any]]:
+    spec = os.getenv("LLM_FALLBACK", "").strip()
+    if not spec:
+        return None
+    if spec == "anthropic":
+        from anthropic import Anthropic, AsyncAnthropic
+
+        model = os.getenv("ANTHROPIC_MODEL", DEFAULT_ANTHROPIC_MODEL)
+        if asynchronous:
+            return "anthropic", AsyncAnthropicProvider(AsyncAnthropic(max_retries=0), model)
+        return "anthropic", AnthropicProvider(Anthropic(max_retries=0), model)
+    if spec.startswith("groq:"):
+        return spec, ModelOverride(primary, spec.split(":", 1)[1])
+    raise ValueError(f"Unknown LLM_FALLBACK: {spec}")
+
+
+def with_fallback(primary: Any, asynchronous: bool = False, primary_name: str = "groq") -> Any:
+    """``primary`` behind a hedging client when LLM_FALLBACK names a
+    fallback provider, otherwise ``primary`` unchanged"""
+    fallback = _fallback_provider(asynchronous, primary)
+    if fallback is None:
+        return primary
+    cls = AsyncHedgedClient if asynchronous else HedgedClient
+    return cls([(primary_name, primary), fallback])
@@ -1,202 +1,890 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, TypedDict, Any
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import re
+import json
 import logging
+import threading
 import traceback
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('medical_system.log'),
-        logging.StreamHandler()
-    ]
+from src.utils.cache import ResponseCache, MemoryCache, make_cache_key
+from src.knowledge_graph.graph_store import get_knowledge_graph
+from src.knowledge_graph.symptom_lexicon import (
+    SymptomMatch,
+    match_symptoms,
+    canonical_symptom,
+    LOCAL_MATCH_THRESHOLD
 )
+from src.utils import structured_logging
+from src.utils.structured_logging import log_event
+from src.utils.telemetry import span, record_cache, record_safety_flags, record_escalation
+from src.utils.safety_scanner import SAFETY_KEYWORD_CATEGORIES, get_safety_scanner
+from src.utils.prompts import build_recommendation_messages
+from src.utils.model_routing import ModelRoute, DEFAULT_ROUTES, get_routes
+
+logger = logging.getLogger(__name__)
+
+# Importing this module has no side effects: logging and the Groq clients
+# are set up on first use (or eagerly through init()), so the pure helpers
+# such as safety_check and identify_missing_symptoms need no credentials.
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def configure_logging() -> None:
+    """Send log records to medical_system.log (rotating JSON lines) and the
+    console through a background writer (idempotent)"""
+    structured_logging.configure_logging('medical_system.log')
+
+
+def _api_key() -> str:
+    # Imported here so that importing this module stays cheap
+    from dotenv import load_dotenv
+
+    # Load environment variables with error handling
+    load_dotenv()
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        logger.error("GROQ_API_KEY not found in environment variables")
+        raise ValueError("GROQ_API_KEY not found in environment variables")
+    return api_key
+
+
+def _create_client(name: str):
+    from groq import Groq, AsyncGroq
+    from src.utils.llm_gateway import create_groq_gateway, create_async_groq_gateway
+    from src.utils.providers import with_fallback
+
+    factories = {
+        "client": Groq,
+        "async_client": AsyncGroq,
+        # Pooled, rate-limited clients for the workflows (see llm_gateway)
+        "gateway": create_groq_gateway,
+        "async_gateway": create_async_groq_gateway
+    }
+    try:
+        api_key = _api_key()
+        instance = factories[name](api_key=api_key)
+        if name.endswith("gateway"):
+            # Hedged against LLM_FALLBACK, when one is configured
+            instance = with_fallback(instance, asynchronous=name == "async_gateway")
+        logger.info(f"Groq {name} initialized successfully")
+        return instance
+    except Exception as e:
+        logger.error(f"Failed to initialize Groq {name}: {str(e)}")
+        raise
 
-# Load environment variables with error handling
-load_dotenv()
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    logging.error("GROQ_API_KEY not found in environment variables")
-    raise ValueError("GROQ_API_KEY not found in environment variables")
 
-# Initialize Groq client
-try:
-    client = Groq(api_key=api_key)
-    logging.info("Groq client initialized successfully")
-except Exception as e:
-    logging.error(f"Failed to initialize Groq client: {str(e)}")
-    raise
+def _get_client(name: str):
+    instance = _clients.get(name)
+    if instance is None:
+        with _clients_lock:
+            instance = _clients.get(name)
+            if instance is None:
+                instance = _create_client(name)
+                _clients[name] = instance
+    return instance
 
-MODEL = "gemma2-9b-it"
 
-SAFETY_KEYWORDS = [
-    "emergency", "urgent", "911", "ER",
-    "hospital", "ambulance", "severe",
-    "dangerous", "life-threatening"
-]
+def get_client():
+    """Shared synchronous Groq client"""
+    return _get_client("client")
 
 
-def safety_check(response: str) -> str:
+def get_async_client():
+    """Shared AsyncGroq client"""
+    return _get_client("async_client")
+
+
+def get_gateway():
+    """Shared LLMGateway used by the synchronous workflow"""
+    return _get_client("gateway")
+
+
+def get_async_gateway():
+    """Shared AsyncLLMGateway used by the async workflow"""
+    return _get_client("async_gateway")
+
+
+def init() -> None:
+    """Configure logging and create every client up front, for processes
+    that prefer to fail at startup rather than on the first request"""
+    configure_logging()
+    for name in ("client", "async_client", "gateway", "async_gateway"):
+        _get_client(name)
+
+
+def __getattr__(name: str):
+    # Keeps `from src.utils.safety import client` working, lazily
+    if name in ("client", "async_client", "gateway", "async_gateway"):
+        return _get_client(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Per-step models, token limits and temperatures come from model_routing;
+# these name the default recommendation tier
+MODEL, MAX_TOKENS, TEMPERATURE = DEFAULT_ROUTES["generate_recommendations"][0]
+
+# Bump whenever a prompt changes so cached answers from the old prompt are
+# never served again
+PROMPT_VERSION = "3"
+
+# Shared by every workflow in the process; swap with set_response_cache
+response_cache: Optional[ResponseCache] = MemoryCache()
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """Install a response cache backend (None disables caching)"""
+    global response_cache
+    response_cache = cache
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _extraction_cache_key(user_input: str) -> str:
+    return make_cache_key(
+        "extract_symptoms",
+        _normalize_text(user_input),
+        routes=[list(route) for route in get_routes("extract_symptoms")],
+        prompt_version=PROMPT_VERSION
+    )
+
+
+def _recommendation_cache_key(symptoms: List[str], medical_history: Dict) -> str:
+    history = {
+        str(field): sorted(_normalize_text(str(item)) for item in items)
+        if isinstance(items, list) else _normalize_text(str(items))
+        for field, items in medical_history.items()
+    }
+    return make_cache_key(
+        "generate_recommendations",
+        {
+            "symptoms": sorted({_normalize_text(s) for s in symptoms if isinstance(s, str)}),
+            "medical_history": history
+        },
+        routes=[list(route) for route in get_routes("generate_recommendations")],
+        prompt_version=PROMPT_VERSION
+    )
+
+
+# Maps reworded requests to an earlier request's cache entry. Created on
+# first use, so importing this module does not load NumPy; swap with
+# set_semantic_index (None disables it)
+semantic_index = None
+_semantic_index_ready = False
+_semantic_index_lock = threading.Lock()
+
+
+def set_semantic_index(index) -> None:
+    global semantic_index, _semantic_index_ready
+    with _semantic_index_lock:
+        semantic_index = index
+        _semantic_index_ready = True
+
+
+def get_semantic_index():
+    """The process-wide SemanticIndex, or None when disabled. It is
+    memory-mapped from MEDICAL_SEMANTIC_INDEX_PATH when that is set, so
+    it survives restarts, and kept in memory otherwise."""
+    global semantic_index, _semantic_index_ready
+    if not _semantic_index_ready:
+        with _semantic_index_lock:
+            if not _semantic_index_ready:
+                from src.utils.semantic_cache import SemanticIndex
+
+                semantic_index = SemanticIndex(os.getenv("MEDICAL_SEMANTIC_INDEX_PATH") or None)
+                _semantic_index_ready = True
+    return semantic_index
+
+
+def _cache_get(key: str, operation: str):
+    if response_cache is None:
+        return None
+    try:
+        value = response_cache.get(key)
+    except Exception as e:
+        # A broken cache must never take a consultation down with it
+        logger.error(f"Response cache lookup failed: {str(e)}")
+        return None
+    record_cache(operation, value is not None)
+    return value
+
+
+def _cache_set(key: str, value) -> None:
+    if response_cache is None:
+        return
+    try:
+        response_cache.set(key, value)
+    except Exception as e:
+        logger.error(f"Response cache store failed: {str(e)}")
+
+
+def _semantic_probe(symptoms: List[str], medical_history: Dict):
+    """(partition, vector) of a recommendation request for the semantic index"""
+    if response_cache is None:
+        return None
+    index = get_semantic_index()
+    if index is None:
+        return None
+    try:
+        from src.utils.semantic_cache import describe, embed
+
+        partition, details = describe(
+            symptoms, medical_history,
+            routes=[list(route) for route in get_routes("generate_recommendations")],
+            prompt_version=PROMPT_VERSION)
+        return partition, embed(details, index.dim)
+    except Exception as e:
+        logger.error(f"Semantic cache probe failed: {str(e)}")
+        return None
+
+
+def _recommendation_cache_lookup(symptoms: List[str], medical_history: Dict):
+    """(cache key, semantic probe, cached text): an exact hit, else the
+    answer to an equivalent earlier request, else None"""
+    cache_key = _recommendation_cache_key(symptoms, medical_history)
+    cached = _cache_get(cache_key, "generate_recommendations")
+    if cached is not None:
+        return cache_key, None, cached
+    probe = _semantic_probe(symptoms, medical_history)
+    if probe is None:
+        return cache_key, None, None
+    try:
+        found = get_semantic_index().search(*probe)
+        if found is not None:
+            cached = response_cache.get(found[0], semantic=True)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup failed: {str(e)}")
+    record_cache("generate_recommendations_semantic", cached is not None)
+    if cached is not None:
+        log_event(logger, logging.INFO, "semantic_cache_hit", similarity=round(found[1], 3))
+    return cache_key, probe, cached
+
+
+def _recommendation_cache_store(cache_key: str, probe, response_text: str) -> None:
+    # An empty answer would be served to every later request
+    if not response_text or not response_text.strip():
+        return
+    _cache_set(cache_key, response_text)
+    if probe is None:
+        return
     try:
-        logging.debug(
-            f"Performing safety check on response: {response[:100]}...")
+        get_semantic_index().add(*probe, cache_key)
+    except Exception as e:
+        logger.error(f"Semantic cache store failed: {str(e)}")
+
+# Flat view of the categorized keyword set (see safety_scanner)
+SAFETY_KEYWORDS = [keyword for keywords in SAFETY_KEYWORD_CATEGORIES.values()
+                   for keyword in keywords]
+
+
+def safety_disclaimer(has_emergency: bool) -> str:
+    disclaimer = (
+        "\n\n🚨 SAFETY WARNING: This is not medical advice. Seek immediate professional care!"
+        if has_emergency else
+        "\n\n🔒 Medical Disclaimer: This is not a substitute for professional medical diagnosis or treatment."
+    )
+    return disclaimer + "\n⚕️ Always consult a qualified healthcare provider."
+
+
+def _record_safety_categories(categories) -> None:
+    if categories:
+        log_event(logger, logging.WARNING, "safety_keywords_detected",
+                  categories=sorted(categories))
+        record_safety_flags(categories)
 
-        has_emergency = any(keyword in response.lower()
-                            for keyword in SAFETY_KEYWORDS)
 
-        if has_emergency:
-            logging.warning(f"Emergency keywords detected in response")
+def scan_safety_categories(response: str):
+    """Keyword categories found in ``response``, in one word-bounded pass"""
+    return get_safety_scanner().scan(response)
 
-        disclaimer = (
-            "\n\n🚨 SAFETY WARNING: This is not medical advice. Seek immediate professional care!"
-            if has_emergency else
-            "\n\n🔒 Medical Disclaimer: This is not a substitute for professional medical diagnosis or treatment."
-        )
-        disclaimer += "\n⚕️ Always consult a qualified healthcare provider."
 
-        return response + disclaimer
+def safety_check(response: str) -> str:
+    try:
+        log_event(logger, logging.DEBUG, "safety_check",
+                  response_chars=len(response))
+
+        categories = scan_safety_categories(response)
+        _record_safety_categories(categories)
+
+        return response + safety_disclaimer(bool(categories))
     except Exception as e:
-        logging.error(
+        logger.error(
             f"Error in safety_check: {str(e)}\n{traceback.format_exc()}")
         raise
 
 
+def stream_safety_check(chunks: Iterable[str]) -> Iterator[str]:
+    """Streaming counterpart of safety_check: chunks are passed through as
+    they arrive and the disclaimer is emitted once the stream ends. The
+    joined output equals safety_check("".join(chunks))."""
+    try:
+        scan = get_safety_scanner().stream()
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            scan.feed(chunk)
+            yield chunk
+
+        categories = scan.finish()
+        _record_safety_categories(categories)
+
+        yield safety_disclaimer(bool(categories))
+    except Exception as e:
+        logger.error(
+            f"Error in stream_safety_check: {str(e)}\n{traceback.format_exc()}")
+        raise
+
+
+# Details we ask about per symptom, read once from the knowledge graph
+# (MEDICAL_KG_PATH) on first use
+_required_details: Optional[Dict[str, tuple]] = None
+_all_details: tuple = ()
+_required_details_lock = threading.Lock()
+
+
+def _get_required_details() -> Dict[str, tuple]:
+    global _required_details, _all_details
+    if _required_details is None:
+        with _required_details_lock:
+            if _required_details is None:
+                details = get_knowledge_graph().symptom_questions()
+                _all_details = tuple(sorted(
+                    {detail for questions in details.values() for detail in questions}))
+                _required_details = details
+    return _required_details
+
+
 def identify_missing_symptoms(state_symptoms: List[str]) -> Optional[List[str]]:
     try:
         if not isinstance(state_symptoms, list):
-            logging.error("state_symptoms must be a list")
+            logger.error("state_symptoms must be a list")
             raise TypeError("state_symptoms must be a list")
 
-        logging.info(f"Analyzing symptoms: {state_symptoms}")
+        log_event(logger, logging.INFO, "missing_details_analysis",
+                  sample=True, symptom_count=len(state_symptoms))
 
-        required_details = {
-            "chest_pain": ["duration", "radiation", "intensity"],
-            "headache": ["onset", "frequency", "associated_nausea"],
-            "fever": ["duration", "max_temperature", "response_to_medication"]
-        }
-
-        missing = []
+        # One pass over the symptoms collects the ones needing details and
+        # the text the details are searched in
+        required_details = _get_required_details()
+        flagged = []
+        texts = []
         for symptom in state_symptoms:
             if not isinstance(symptom, str):
-                logging.warning(f"Non-string symptom found: {symptom}")
+                logger.warning(f"Non-string symptom found: {symptom}")
                 continue
-
+            texts.append(symptom)
             if symptom in required_details:
-                logging.debug(f"Checking details for symptom: {symptom}")
-                for detail in required_details[symptom]:
-                    if not any(detail in s for s in state_symptoms):
-                        missing.append(f"{symptom}_{detail}")
-                        logging.debug(
-                            f"Missing detail found: {symptom}_{detail}")
-
-        logging.info(
-            f"Analysis complete. Missing details: {missing if missing else 'None'}")
+                flagged.append(symptom)
+
+        if not flagged:
+            log_event(logger, logging.INFO, "missing_details_found",
+                      sample=True, missing=None)
+            return None
+
+        # Details never contain a newline, so a substring hit in the joined
+        # text is a hit in one of the symptoms
+        haystack = "\n".join(texts)
+        present = {detail for detail in _all_details if detail in haystack}
+
+        missing = [
+            f"{symptom}_{detail}"
+            for symptom in flagged
+            for detail in required_details[symptom]
+            if detail not in present
+        ]
+
+        log_event(logger, logging.INFO, "missing_details_found",
+                  sample=True, missing=missing or None)
         return missing if missing else None
 
     except Exception as e:
-        logging.error(
+        logger.error(
             f"Error in identify_missing_symptoms: {str(e)}\n{traceback.format_exc()}")
         raise
 
 
-def generate_recommendations(symptoms: List[str], medical_history: Dict) -> str:
+def _validate_recommendation_input(symptoms: List[str], medical_history: Dict) -> None:
+    if not isinstance(symptoms, list) or not isinstance(medical_history, dict):
+        logger.error("Invalid input types")
+        raise TypeError(
+            "symptoms must be a list and medical_history must be a dict")
+
+
+def _recommendation_messages(symptoms: List[str], medical_history: Dict) -> List[Dict]:
+    # Deduplicated, canonicalized and held to a token budget (see prompts)
+    return build_recommendation_messages(symptoms, medical_history)
+
+
+RECOMMENDATION_FOOTER = "\n\n⚠️ Remember: This is not medical advice. Always consult a doctor for proper evaluation."
+
+
+def _format_recommendations(response_text: str) -> str:
+    return f"{response_text}{RECOMMENDATION_FOOTER}"
+
+
+def _record_escalation(operation: str, reason: str, route: ModelRoute) -> None:
+    log_event(logger, logging.INFO, "llm_escalated",
+              operation=operation, reason=reason, from_model=route.model)
+    record_escalation(operation, reason)
+
+
+def generate_recommendations(symptoms: List[str], medical_history: Dict, llm_client=None) -> str:
     try:
-        if not isinstance(symptoms, list) or not isinstance(medical_history, dict):
-            logging.error("Invalid input types")
-            raise TypeError(
-                "symptoms must be a list and medical_history must be a dict")
+        _validate_recommendation_input(symptoms, medical_history)
 
-        logging.info(f"Generating recommendations for symptoms: {symptoms}")
-        logging.debug(f"Medical history: {medical_history}")
+        log_event(logger, logging.INFO, "recommendations_requested",
+                  sample=True, symptom_count=len(symptoms))
 
-        prompt = f"""Given these symptoms: {', '.join(symptoms)} and medical history: {medical_history},
-        provide 3-5 general recommendations. Follow these rules:
-        1. Never diagnose conditions
-        2. Suggest only OTC medications as examples
-        3. Always recommend consulting a doctor
-        4. Prioritize safety over specificity
-        5. Include first aid measures if relevant
-        
-        Format as markdown bullets with emojis:"""
+        cache_key, probe, cached = _recommendation_cache_lookup(symptoms, medical_history)
+        if cached is not None:
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="cache")
+            return _format_recommendations(cached)
 
         try:
-            response = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a cautious medical assistant. Your responses must include:\n"
-                        "- 'Consult a healthcare professional' as first point\n"
-                        "- Clear disclaimer that this is not medical advice\n"
-                        "- Only WHO/CDC-approved recommendations"
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                model=MODEL,
-                temperature=0.3,
-                max_tokens=400
-            )
-
-            logging.info("Successfully generated recommendations")
-            response_text = response.choices[0].message.content
-            return f"{response_text}\n\n⚠️ Remember: This is not medical advice. Always consult a doctor for proper evaluation."
+            llm_client = llm_client or get_client()
+            routes = get_routes("generate_recommendations")
+            for tier, route in enumerate(routes):
+                with span("generate_recommendations", "llm",
+                          **{"llm.model": route.model, "llm.tier": tier}) as call:
+                    response = llm_client.chat.completions.create(
+                        messages=_recommendation_messages(symptoms, medical_history),
+                        model=route.model,
+                        temperature=route.temperature,
+                        max_tokens=route.max_tokens
+                    )
+                    call.record_usage(getattr(response, "usage", None))
+                response_text = response.choices[0].message.content
+                if response_text and response_text.strip() or tier == len(routes) - 1:
+                    break
+                _record_escalation("generate_recommendations", "empty_response", route)
+
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="llm", model=route.model)
+            _recommendation_cache_store(cache_key, probe, response_text)
+            return _format_recommendations(response_text)
 
         except Exception as e:
-            logging.error(f"API call failed: {str(e)}")
+            logger.error(f"API call failed: {str(e)}")
             raise
 
     except Exception as e:
-        logging.error(
+        logger.error(
             f"Error in generate_recommendations: {str(e)}\n{traceback.format_exc()}")
         raise
 
 
-def extract_symptoms(user_input: str, llm_client) -> List[str]:
+def stream_recommendations(symptoms: List[str], medical_history: Dict, llm_client=None) -> Iterator[str]:
+    """Streaming variant of generate_recommendations: yields text chunks as
+    Groq produces them. The joined chunks equal generate_recommendations'
+    return value."""
+    try:
+        _validate_recommendation_input(symptoms, medical_history)
+
+        log_event(logger, logging.INFO, "recommendations_requested",
+                  sample=True, symptom_count=len(symptoms), stream=True)
+
+        cache_key, probe, cached = _recommendation_cache_lookup(symptoms, medical_history)
+        if cached is not None:
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="cache")
+            yield cached
+            yield RECOMMENDATION_FOOTER
+            return
+
+        try:
+            # Tokens are shown as they arrive, so a stream cannot escalate
+            # and always uses the first tier
+            route = get_routes("generate_recommendations")[0]
+            with span("stream_recommendations", "llm", **{"llm.model": route.model}) as call:
+                stream = (llm_client or get_client()).chat.completions.create(
+                    messages=_recommendation_messages(symptoms, medical_history),
+                    model=route.model,
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens,
+                    stream=True
+                )
+
+                parts = []
+                for chunk in stream:
+                    # Groq reports usage on the final chunk
+                    call.record_usage(
+                        getattr(getattr(chunk, "x_groq", None), "usage", None)
+                        or getattr(chunk, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        call.first_token()
+                        parts.append(content)
+                        yield content
+
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="llm", stream=True)
+            _recommendation_cache_store(cache_key, probe, "".join(parts))
+            yield RECOMMENDATION_FOOTER
+
+        except Exception as e:
+            logger.error(f"API call failed: {str(e)}")
+            raise
+
+    except Exception as e:
+        logger.error(
+            f"Error in stream_recommendations: {str(e)}\n{traceback.format_exc()}")
+        raise
+
+
+async def agenerate_recommendations(symptoms: List[str], medical_history: Dict, llm_client=None) -> str:
+    """Async variant of generate_recommendations for an AsyncGroq client"""
+    try:
+        _validate_recommendation_input(symptoms, medical_history)
+
+        log_event(logger, logging.INFO, "recommendations_requested",
+                  sample=True, symptom_count=len(symptoms))
+
+        cache_key, probe, cached = _recommendation_cache_lookup(symptoms, medical_history)
+        if cached is not None:
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="cache")
+            return _format_recommendations(cached)
+
+        try:
+            llm_client = llm_client or get_async_client()
+            routes = get_routes("generate_recommendations")
+            for tier, route in enumerate(routes):
+                with span("generate_recommendations", "llm",
+                          **{"llm.model": route.model, "llm.tier": tier}) as call:
+                    response = await llm_client.chat.completions.create(
+                        messages=_recommendation_messages(symptoms, medical_history),
+                        model=route.model,
+                        temperature=route.temperature,
+                        max_tokens=route.max_tokens
+                    )
+                    call.record_usage(getattr(response, "usage", None))
+                response_text = response.choices[0].message.content
+                if response_text and response_text.strip() or tier == len(routes) - 1:
+                    break
+                _record_escalation("generate_recommendations", "empty_response", route)
+
+            log_event(logger, logging.INFO, "recommendations_generated",
+                      source="llm", model=route.model)
+            _recommendation_cache_store(cache_key, probe, response_text)
+            return _format_recommendations(response_text)
+
+        except Exception as e:
+            logger.error(f"API call failed: {str(e)}")
+            raise
+
+    except Exception as e:
+        logger.error(
+            f"Error in agenerate_recommendations: {str(e)}\n{traceback.format_exc()}")
+        raise
+
+
+class SymptomRecord(TypedDict, total=False):
+    """One extracted symptom. ``name`` is always present; the other
+    attributes only when the patient mentioned them."""
+    name: str
+    duration: str
+    intensity: str
+    onset: str
+    frequency: str
+    location: str
+    radiation: str
+    max_temperature: str
+    response_to_medication: str
+    associated_nausea: str
+
+
+SYMPTOM_ATTRIBUTES = tuple(
+    field for field in SymptomRecord.__annotations__ if field != "name")
+
+# Bounds on what a single extraction may cost downstream
+EXTRACTION_MAX_TOKENS = 200
+MAX_INPUT_CHARS = 2000
+MAX_RESPONSE_CHARS = 4000
+MAX_SYMPTOMS = 10
+MAX_SYMPTOM_CHARS = 60
+MAX_ATTRIBUTE_CHARS = 40
+
+_REASONING_RE = re.compile(r"<think>.*?(</think>|$)", re.DOTALL | re.IGNORECASE)
+_JSON_DEBRIS_RE = re.compile(r'[{}\[\]"]')
+
+
+def _extraction_request(user_input: str, route: ModelRoute) -> Dict:
+    return {
+        "messages": [
+            {
+                "role": "system",
+                "content": "Extract the medical symptoms the patient reports. Respond with JSON only, "
+                'shaped as {"symptoms": [{"name": "...", "duration": "...", "intensity": "..."}]}. '
+                "Use short symptom names, omit attributes that are not mentioned, "
+                f"allowed attributes: {', '.join(SYMPTOM_ATTRIBUTES)}. "
+                'Return {"symptoms": []} when no symptom is described.'
+            },
+            {"role": "user",
+                "content": f"Extract medical symptoms from: {user_input[:MAX_INPUT_CHARS]}"}
+        ],
+        "model": route.model,
+        "temperature": route.temperature,
+        "max_tokens": min(route.max_tokens, EXTRACTION_MAX_TOKENS),
+        "response_format": {"type": "json_object"}
+    }
+
+
+def _clean_value(value, limit: int) -> Optional[str]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    value = " ".join(value.split())
+    if not value or len(value) > limit:
+        return None
+    return value
+
+
+def _symptom_record(name, attributes: Dict) -> Optional[SymptomRecord]:
+    name = _clean_value(name, MAX_SYMPTOM_CHARS) if isinstance(
+        name, str) else None
+    if name is None:
+        return None
+    record: SymptomRecord = {
+        "name": canonical_symptom(name) or name.lower().replace(" ", "_")}
+    for attribute in SYMPTOM_ATTRIBUTES:
+        value = _clean_value(attributes.get(attribute), MAX_ATTRIBUTE_CHARS)
+        if value is not None:
+            record[attribute] = value
+    return record
+
+
+def _extraction_entries(text: str) -> Optional[list]:
+    """The ``symptoms`` list of a JSON extraction response, None when the
+    response is not one"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        payload = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    entries = payload.get("symptoms") if isinstance(payload, dict) else None
+    return entries if isinstance(entries, list) else None
+
+
+def parse_symptom_records(text: str) -> List[SymptomRecord]:
+    """Parse an extraction response into at most MAX_SYMPTOMS records.
+
+    Reasoning blocks are stripped first. JSON output is validated entry by
+    entry; anything else falls back to the comma-separated format, dropping
+    items too long to be a symptom name."""
+    if not isinstance(text, str):
+        return []
+    text = _REASONING_RE.sub("", text[:MAX_RESPONSE_CHARS]).strip()
+    entries = _extraction_entries(text)
+
+    records: List[SymptomRecord] = []
+    seen = set()
+    if isinstance(entries, list):
+        candidates = [
+            (entry.get("name"), entry) if isinstance(entry, dict) else (entry, {})
+            for entry in entries
+        ]
+    else:
+        # Pieces of JSON cut short (at max_tokens) are no symptom names
+        candidates = [(item, {}) for item in text.split(",")
+                      if not _JSON_DEBRIS_RE.search(item)]
+
+    for name, attributes in candidates:
+        record = _symptom_record(name, attributes)
+        if record is None or record["name"] in seen:
+            continue
+        seen.add(record["name"])
+        records.append(record)
+        if len(records) >= MAX_SYMPTOMS:
+            break
+    return records
+
+
+def flatten_symptom_records(records: List[SymptomRecord]) -> List[str]:
+    """Symptom strings for the workflow state: each name followed by one
+    ``<name>_<attribute>: <value>`` entry per known attribute"""
+    symptoms = []
+    for record in records:
+        symptoms.append(record["name"])
+        for attribute in SYMPTOM_ATTRIBUTES:
+            if attribute in record:
+                symptoms.append(
+                    f"{record['name']}_{attribute}: {record[attribute]}")
+    return symptoms
+
+
+def _match_symptoms_locally(match: SymptomMatch) -> Optional[List[SymptomRecord]]:
+    """Symptoms from the local lexicon when it covers the whole input,
+    otherwise None so the caller falls back to the LLM"""
+    if match.symptoms and match.confidence >= LOCAL_MATCH_THRESHOLD:
+        log_event(logger, logging.INFO, "symptoms_extracted",
+                  source="lexicon", symptom_count=len(match.symptoms))
+        return [{"name": symptom} for symptom in match.symptoms]
+    return None
+
+
+def _rate_limited(error: Exception) -> bool:
+    """Whether an LLM call failed on a rate limit (HTTP 429), which must
+    reach the caller instead of reading as no symptoms"""
+    return getattr(error, "status_code", None) == 429
+
+
+def _escalation_reason(text, records: List[SymptomRecord], lexicon_symptoms: List[str]) -> Optional[str]:
+    """Why an extraction answer should be retried on the next model tier:
+    it is not the requested JSON, or it misses every symptom the local
+    lexicon recognised in the message"""
+    if not isinstance(text, str) or _extraction_entries(
+            _REASONING_RE.sub("", text[:MAX_RESPONSE_CHARS])) is None:
+        return "parse_failure"
+    if lexicon_symptoms and not {record["name"] for record in records} & set(lexicon_symptoms):
+        return "low_confidence"
+    return None
+
+
+def extract_symptom_records(user_input: str, llm_client) -> List[SymptomRecord]:
+    try:
+        if not isinstance(user_input, str):
+            logger.error("user_input must be a string")
+            raise TypeError("user_input must be a string")
+
+        log_event(logger, logging.INFO, "extraction_requested",
+                  sample=True, input_chars=len(user_input))
+
+        match = match_symptoms(user_input)
+        local = _match_symptoms_locally(match)
+        if local is not None:
+            return local
+
+        cache_key = _extraction_cache_key(user_input)
+        cached = _cache_get(cache_key, "extract_symptoms")
+        if cached is not None:
+            log_event(logger, logging.INFO, "symptoms_extracted",
+                      source="cache", symptom_count=len(cached))
+            return [dict(record) for record in cached]
+
+        try:
+            # Cheapest model first; larger ones only for unusable answers
+            routes = get_routes("extract_symptoms")
+            for tier, route in enumerate(routes):
+                with span("extract_symptoms", "llm",
+                          **{"llm.model": route.model, "llm.tier": tier}) as call:
+                    response = llm_client.chat.completions.create(
+                        **_extraction_request(user_input, route))
+                    call.record_usage(getattr(response, "usage", None))
+
+                text = response.choices[0].message.content
+                records = parse_symptom_records(text)
+                # A denied symptom ("no fever") is rightly missing from the answer
+                reason = _escalation_reason(
+                    text, records, [] if match.negated else match.symptoms)
+                if reason is None or tier == len(routes) - 1:
+                    break
+                _record_escalation("extract_symptoms", reason, route)
+
+            log_event(logger, logging.INFO, "symptoms_extracted",
+                      source="llm", model=route.model, symptom_count=len(records))
+            if records:
+                _cache_set(cache_key, records)
+            return records
+
+        except Exception as e:
+            logger.error(f"API call failed: {str(e)}")
+            if _rate_limited(e):
+                # Callers such as the batch runner back off and retry these
+                raise
+            return []
+
+    except Exception as e:
+        logger.error(
+            f"Error in extract_symptom_records: {str(e)}\n{traceback.format_exc()}")
+        if _rate_limited(e):
+            raise
+        return []
+
+
+async def aextract_symptom_records(user_input: str, llm_client) -> List[SymptomRecord]:
+    """Async variant of extract_symptom_records for an AsyncGroq client"""
     try:
         if not isinstance(user_input, str):
-            logging.error("user_input must be a string")
+            logger.error("user_input must be a string")
             raise TypeError("user_input must be a string")
 
-        logging.info(f"Extracting symptoms from input: {user_input[:100]}...")
+        log_event(logger, logging.INFO, "extraction_requested",
+                  sample=True, input_chars=len(user_input))
+
+        match = match_symptoms(user_input)
+        local = _match_symptoms_locally(match)
+        if local is not None:
+            return local
+
+        cache_key = _extraction_cache_key(user_input)
+        cached = _cache_get(cache_key, "extract_symptoms")
+        if cached is not None:
+            log_event(logger, logging.INFO, "symptoms_extracted",
+                      source="cache", symptom_count=len(cached))
+            return [dict(record) for record in cached]
 
         try:
-            response = llm_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Extract medical symptoms and return them as a comma-separated list."
-                    },
-                    {"role": "user",
-                        "content": f"Extract medical symptoms from: {user_input}"}
-                ],
-                model=MODEL,
-                temperature=0.3,
-                max_tokens=400
-            )
-
-            symptoms_text = response.choices[0].message.content
-            symptoms = [s.strip()
-                        for s in symptoms_text.split(',') if s.strip()]
-
-            logging.info(f"Successfully extracted symptoms: {symptoms}")
-            return symptoms
+            routes = get_routes("extract_symptoms")
+            for tier, route in enumerate(routes):
+                with span("extract_symptoms", "llm",
+                          **{"llm.model": route.model, "llm.tier": tier}) as call:
+                    response = await llm_client.chat.completions.create(
+                        **_extraction_request(user_input, route))
+                    call.record_usage(getattr(response, "usage", None))
+
+                text = response.choices[0].message.content
+                records = parse_symptom_records(text)
+                # A denied symptom ("no fever") is rightly missing from the answer
+                reason = _escalation_reason(
+                    text, records, [] if match.negated else match.symptoms)
+                if reason is None or tier == len(routes) - 1:
+                    break
+                _record_escalation("extract_symptoms", reason, route)
+
+            log_event(logger, logging.INFO, "symptoms_extracted",
+                      source="llm", model=route.model, symptom_count=len(records))
+            if records:
+                _cache_set(cache_key, records)
+            return records
 
         except Exception as e:
-            logging.error(f"API call failed: {str(e)}")
+            logger.error(f"API call failed: {str(e)}")
+            if _rate_limited(e):
+                # Callers such as the batch runner back off and retry these
+                raise
             return []
 
     except Exception as e:
-        logging.error(
-            f"Error in extract_symptoms: {str(e)}\n{traceback.format_exc()}")
+        logger.error(
+            f"Error in aextract_symptom_records: {str(e)}\n{traceback.format_exc()}")
+        if _rate_limited(e):
+            raise
         return []
 
+
+def extract_symptoms(user_input: str, llm_client) -> List[str]:
+    return flatten_symptom_records(extract_symptom_records(user_input, llm_client))
+
+
+async def aextract_symptoms(user_input: str, llm_client) -> List[str]:
+    """Async variant of extract_symptoms for an AsyncGroq client"""
+    return flatten_symptom_records(await aextract_symptom_records(user_input, llm_client))
+
 # Add basic test function
 
 
 def run_tests():
     try:
+        configure_logging()
         print("\n=== Starting Tests ===\n")
 
         # Test safety_check
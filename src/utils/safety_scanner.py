@@ -0,0 +1,108 @@
+"""Single-pass, word-bounded scan of responses for safety keywords.
+
+All keywords are compiled into one regular expression with a named group
+per category, so a response is scanned once whatever the number of
+keywords. Matches must stand as whole words (a hyphenated compound such as
+"non-emergency" is one word). All-caps abbreviations such
+as "ER" match case-sensitively, so "fever", "after" and "her" no longer
+count as a mention of the emergency room.
+"""
+from typing import Dict, FrozenSet, List, Optional, Pattern, Set
+import re
+
+SAFETY_KEYWORD_CATEGORIES: Dict[str, List[str]] = {
+    "emergency_care": ["emergency", "911", "ER", "hospital", "ambulance"],
+    "urgency": ["urgent", "severe"],
+    "danger": ["dangerous", "life-threatening"]
+}
+
+
+def _keyword_pattern(keyword: str) -> str:
+    pattern = re.escape(keyword)
+    # Abbreviations only count in capitals ("ER", not "er")
+    if keyword.isupper() and len(keyword) <= 4:
+        return f"(?-i:{pattern})"
+    return pattern
+
+
+class SafetyScanner:
+    """Compiled matcher for a ``{category: [keyword, ...]}`` set"""
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = {name: list(keywords)
+                           for name, keywords in categories.items() if keywords}
+        self._group_names = {f"c{i}": name for i, name in enumerate(self.categories)}
+        alternation = "|".join(
+            f"(?P<{group}>" + "|".join(
+                _keyword_pattern(k) for k in sorted(self.categories[name], key=len, reverse=True)) + ")"
+            for group, name in self._group_names.items()
+        )
+        self.pattern: Pattern = re.compile(
+            rf"(?<![\w-])(?:{alternation})(?![\w-])", re.IGNORECASE)
+        self.max_keyword_chars = max(
+            (len(k) for keywords in self.categories.values() for k in keywords), default=0)
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        """Categories with at least one keyword in ``text``"""
+        return frozenset(self._group_names[match.lastgroup]
+                         for match in self.pattern.finditer(text))
+
+    def stream(self) -> "IncrementalScan":
+        return IncrementalScan(self)
+
+
+class IncrementalScan:
+    """Scans a text fed in chunks, with the same result as scanning the
+    joined text. A match touching the end of the data seen so far is held
+    back until the next chunk shows whether the word goes on."""
+
+    def __init__(self, scanner: SafetyScanner):
+        self.scanner = scanner
+        self.categories: Set[str] = set()
+        self._tail = ""
+        # Whether text before the tail was dropped
+        self._truncated = False
+
+    def _scan(self, window: str, final: bool) -> None:
+        for match in self.scanner.pattern.finditer(window):
+            # A match at the very start of a cut tail has lost the character
+            # before it; it was already judged with that context
+            if self._truncated and match.start() == 0:
+                continue
+            if final or match.end() < len(window):
+                self.categories.add(self.scanner._group_names[match.lastgroup])
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        window = self._tail + chunk
+        self._scan(window, final=False)
+        # Room for a whole keyword plus the character before it
+        keep = self.scanner.max_keyword_chars + 1
+        if len(window) > keep:
+            self._tail = window[-keep:]
+            self._truncated = True
+        else:
+            self._tail = window
+
+    def finish(self) -> FrozenSet[str]:
+        """All categories found, once the stream has ended"""
+        self._scan(self._tail, final=True)
+        self._tail = ""
+        return frozenset(self.categories)
+
+
+_default_scanner: Optional[SafetyScanner] = None
+
+
+def get_safety_scanner() -> SafetyScanner:
+    global _default_scanner
+    if _default_scanner is None:
+        _default_scanner = SafetyScanner(SAFETY_KEYWORD_CATEGORIES)
+    return _default_scanner
+
+
+def set_safety_keywords(categories: Dict[str, List[str]]) -> None:
+    """Replace the keyword set used by safety_check"""
+    global _default_scanner
+    _default_scanner = SafetyScanner(categories)
@@ -0,0 +1,215 @@
+"""Near-duplicate lookup for cached recommendations.
+
+Exact cache keys miss rewordings such as "headache, severity: bad, onset:
+since morning" against "headache, severity: severe, onset: since this
+morning", although the recommendations for both are the same. This index
+maps a new request to the cache key of an earlier, equivalent one:
+
+- requests are partitioned on what must match exactly: the canonical
+  symptom names, which details were given, the medical history, and the
+  intensity, numbers and negations of every detail value. Intensity
+  synonyms are folded first, so "bad" and "severe" agree while "mild"
+  against "severe", "39" against "41" or "helps" against "doesn't help"
+  can never share an answer;
+- within a partition the remaining wording of each detail is embedded
+  as a hashed word and character n-gram vector, in a block of its own.
+  Every detail must reach SIMILARITY_THRESHOLD on its own, so "since
+  this morning" matches "since morning" and "at night all the time"
+  matches "all the time at night", but one detail saying "started
+  suddenly" instead of "started gradually" is not outvoted by the
+  details that agree.
+
+The vectors live in a NumPy matrix, optionally memory-mapped from disk so
+the index survives restarts without being loaded into memory. Answers
+themselves stay in the response cache; a hit whose entry has expired there
+is a miss.
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from src.knowledge_graph.symptom_lexicon import FILLER_WORDS, NEGATION_WORDS
+from src.utils.cache import make_cache_key
+from src.utils.prompts import group_symptoms
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DIM = 512
+# Details embedded in blocks of their own; any further ones share the
+# last block
+DETAIL_BLOCKS = 8
+# Cosine similarity every detail needs to reuse an answer; high on
+# purpose, as a changed word can change the advice
+SIMILARITY_THRESHOLD = 0.9
+DEFAULT_CAPACITY = 4096
+
+# Words patients use interchangeably for an intensity
+INTENSITY_WORDS: Dict[str, str] = {
+    **dict.fromkeys(["bad", "severe", "terrible", "awful", "intense", "extreme",
+                     "excruciating", "horrible", "unbearable", "strong"], "severe"),
+    **dict.fromkeys(["moderate", "medium", "noticeable"], "moderate"),
+    **dict.fromkeys(["mild", "slight", "light", "minor", "little", "bit"], "mild")
+}
+STOP_WORDS = FILLER_WORDS | frozenset(
+    "this that since for about around very really quite pretty it its".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+_META_DTYPE = np.dtype([("partition", "<u8"), ("seq", "<u8"), ("key", "S64")])
+
+
+def _words(text: str) -> List[str]:
+    words = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        token = INTENSITY_WORDS.get(token, token)
+        if token not in STOP_WORDS:
+            words.append(token)
+    return words
+
+
+def _embed_block(text: str, block: np.ndarray) -> None:
+    # An empty wording is a wording of its own, equal to itself
+    for word in _words(text) or ["#none#"]:
+        features = [word] + [f"#{word}#"[i:i + 3] for i in range(len(word))]
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            block[digest % len(block)] += 1.0 if digest & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(block))
+    if norm:
+        block /= norm
+
+
+def embed(details: List[str], dim: int = VECTOR_DIM) -> np.ndarray:
+    """Signed hashing vectors of the words and character trigrams of each
+    detail, one unit-length block per detail (DETAIL_BLOCKS of them)"""
+    blocks = np.zeros((DETAIL_BLOCKS, dim // DETAIL_BLOCKS), dtype=np.float32)
+    details = list(details) or [""]
+    if len(details) > DETAIL_BLOCKS:
+        details = details[:DETAIL_BLOCKS - 1] + [" ".join(details[DETAIL_BLOCKS - 1:])]
+    for text, block in zip(details, blocks):
+        _embed_block(text, block)
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[:blocks.size] = blocks.ravel()
+    return vector
+
+
+def _value_signature(value: str) -> List[str]:
+    """What a detail value must share exactly: its intensities, numbers
+    and negations"""
+    lowered = value.lower().replace("’", "'")
+    tokens = _TOKEN_RE.findall(lowered)
+    terms = {INTENSITY_WORDS[token] for token in tokens if token in INTENSITY_WORDS}
+    terms |= {token for token in tokens if token in NEGATION_WORDS}
+    return sorted(terms | set(_NUMBER_RE.findall(lowered)))
+
+
+def describe(symptoms: List[str], medical_history: Dict, **params) -> Tuple[int, List[str]]:
+    """(partition, detail values) for a recommendation request, the values
+    in the same order for every request of the partition. ``params`` are
+    the cache parameters (routes, prompt version) and partition too."""
+    groups = group_symptoms(symptoms)
+    names = sorted(name.lower() for name, _ in groups)
+    attributes = sorted(
+        (f"{name.lower()}.{key.lower()}", value)
+        for name, items in groups for key, _, value in
+        (attribute.partition(": ") for attribute in items))
+    history = {str(field): sorted(" ".join(str(item).lower().split()) for item in
+                                  (items if isinstance(items, list) else [items]))
+               for field, items in medical_history.items()}
+    key = make_cache_key("semantic_partition", {
+        "symptoms": names,
+        "attributes": [(key, _value_signature(value)) for key, value in attributes],
+        "medical_history": history
+    }, **params)
+    # Zero marks an empty slot
+    return int(key[:16], 16) or 1, [value for _, value in attributes]
+
+
+class SemanticIndex:
+    """Fixed-capacity ring of (partition, vector, cache key) entries. With
+    ``path`` the arrays are memory-mapped from ``path``.vectors.npy and
+    ``path``.meta.npy; without it they live in memory. One process should
+    write a given path."""
+
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_CAPACITY,
+                 dim: int = VECTOR_DIM, threshold: float = SIMILARITY_THRESHOLD):
+        self.path = path
+        self.dim = dim
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        if path:
+            self.vectors, self.meta = self._open(path, capacity, dim)
+        else:
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self.meta = np.zeros(capacity, dtype=_META_DTYPE)
+        self.capacity = len(self.meta)
+        self._seq = int(self.meta["seq"].max()) if self.capacity else 0
+
+    @staticmethod
+    def _open(path: str, capacity: int, dim: int):
+        vectors_path, meta_path = f"{path}.vectors.npy", f"{path}.meta.npy"
+        if os.path.exists(vectors_path) and os.path.exists(meta_path):
+            vectors = np.load(vectors_path, mmap_mode="r+")
+            meta = np.load(meta_path, mmap_mode="r+")
+            if vectors.shape[1] == dim and meta.dtype == _META_DTYPE and len(meta) == len(vectors):
+                return vectors, meta
+            logger.warning(f"Semantic index at {path} has another layout; rebuilding it")
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32,
+                                            shape=(capacity, dim))
+        meta = np.lib.format.open_memmap(meta_path, mode="w+", dtype=_META_DTYPE,
+                                         shape=(capacity,))
+        return vectors, meta
+
+    def search(self, partition: int, vector: np.ndarray) -> Optional[Tuple[str, float]]:
+        """(cache key, similarity) of the closest entry in ``partition``
+        at or above the threshold"""
+        with self._lock:
+            rows = np.flatnonzero(self.meta["partition"] == partition)
+            if not rows.size:
+                return None
+            # One batched product scores every detail of every candidate;
+            # a candidate is as similar as its least similar detail
+            width = self.dim // DETAIL_BLOCKS
+            blocks = vector[:width * DETAIL_BLOCKS].reshape(DETAIL_BLOCKS, width)
+            used = np.flatnonzero(blocks.any(axis=1))
+            candidates = self.vectors[rows, :width * DETAIL_BLOCKS].reshape(
+                len(rows), DETAIL_BLOCKS, width)
+            scores = np.einsum("rbd,bd->rb", candidates[:, used], blocks[used]).min(axis=1)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self.meta["key"][rows[best]].decode("ascii"), float(scores[best])
+
+    def add(self, partition: int, vector: np.ndarray, key: str) -> None:
+        with self._lock:
+            same = np.flatnonzero((self.meta["partition"] == partition)
+                                  & (self.meta["key"] == key.encode("ascii")))
+            if same.size:
+                return
+            empty = np.flatnonzero(self.meta["partition"] == 0)
+            # Full: overwrite the oldest entry
+            slot = int(empty[0]) if empty.size else int(np.argmin(self.meta["seq"]))
+            self._seq += 1
+            self.vectors[slot] = vector
+            self.meta[slot] = (partition, self._seq, key.encode("ascii"))
+
+    def flush(self) -> None:
+        if isinstance(self.vectors, np.memmap):
+            with self._lock:
+                self.vectors.flush()
+                self.meta.flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.meta[:] = np.zeros(1, dtype=_META_DTYPE)
+            self._seq = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.meta["partition"]))
+
@@ -0,0 +1,188 @@
+"""Bounded, structured, non-blocking logging.
+
+Records are handed to a QueueHandler on the calling thread and written by a
+QueueListener thread, so no request ever waits on disk I/O. The file
+output is one JSON object per line, rotated by size, carrying the request
+id of the consultation that produced it. Every message and field is
+truncated, and events marked ``sample=True`` are only kept at a fraction
+of their volume.
+"""
+from typing import Any, Dict, Generator, Iterator, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+
+MAX_MESSAGE_CHARS = 500
+MAX_FIELD_CHARS = 200
+MAX_LIST_ITEMS = 10
+
+request_id_var: ContextVar[Optional[str]] = ContextVar(
+    "request_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None) -> Iterator[str]:
+    """Tag every record logged inside the block with one request id. Nested
+    blocks without an explicit id keep the enclosing request's id."""
+    token = request_id_var.set(
+        request_id or request_id_var.get() or new_request_id())
+    try:
+        yield request_id_var.get()
+    finally:
+        request_id_var.reset(token)
+
+
+def run_in_own_context(stream: Generator) -> Iterator:
+    """Advance ``stream`` inside one private copy of the current context.
+    Servers may resume a generator from a different context for every
+    chunk (e.g. one threadpool call per chunk), which would break the
+    context variables it sets across yields."""
+    context = copy_context()
+    try:
+        while True:
+            try:
+                chunk = context.run(next, stream)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        context.run(stream.close)
+
+
+def truncate(value: Any, limit: int = MAX_FIELD_CHARS) -> Any:
+    """JSON-friendly copy of ``value`` with strings cut to ``limit`` chars
+    and lists to MAX_LIST_ITEMS items"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        clipped = [truncate(item, limit) for item in items[:MAX_LIST_ITEMS]]
+        if len(items) > MAX_LIST_ITEMS:
+            clipped.append(f"... {len(items) - MAX_LIST_ITEMS} more")
+        return clipped
+    if isinstance(value, dict):
+        return {str(k): truncate(v, limit) for k, v in list(value.items())[:MAX_LIST_ITEMS]}
+    text = str(value)
+    if len(text) > limit:
+        return f"{text[:limit]}... [{len(text) - limit} chars truncated]"
+    return text
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sample: bool = False, **fields) -> None:
+    """Log ``event`` with structured ``fields``. Sampled events are the
+    verbose ones that may be dropped under SamplingFilter."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields, "sample": sample})
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rate`` share of records logged with ``sample=True``"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sample", False):
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "event": truncate(record.getMessage(), MAX_MESSAGE_CHARS)
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update({k: truncate(v) for k, v in fields.items()})
+        if record.exc_info:
+            entry["exception"] = truncate(
+                self.formatException(record.exc_info), MAX_MESSAGE_CHARS)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={truncate(v)}" for k, v in fields.items())
+        return truncate(line, MAX_MESSAGE_CHARS)
+
+
+def configure_logging(
+    path: str = "medical_system.log",
+    level: int = logging.INFO,
+    max_bytes: int = 5 * 1024 * 1024,
+    backup_count: int = 3,
+    sample_rate: float = 0.1,
+    console: bool = True
+) -> None:
+    """Route the root logger through a queue to a rotating JSON file (and
+    the console). Safe to call more than once; only the first call acts."""
+    global _listener
+    if _listener is not None:
+        return
+
+    handlers: List[logging.Handler] = []
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(ConsoleFormatter())
+        handlers.append(stream_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Filters run on the calling thread, where the request id is known
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,298 @@
+"""Latency, token and cache instrumentation for the workflow.
+
+Every graph node and every LLM call is timed into in-process metrics that
+render in the Prometheus text format (``render_prometheus``). When a span
+log is configured (``configure_span_log`` or the MEDICAL_SPAN_LOG
+environment variable) each of them is also written as one JSON line shaped
+like an OpenTelemetry span, with trace and parent ids, so a consultation
+can be laid out as a waterfall. Like the application log, span lines go
+through a queue to a writer thread, so no request waits on the file.
+
+Metrics:
+
+- ``medical_node_duration_seconds{node}`` / ``medical_node_errors_total{node}``
+- ``medical_llm_duration_seconds{operation}`` / ``medical_llm_errors_total{operation}``
+- ``medical_llm_time_to_first_token_seconds{operation}`` (streaming calls)
+- ``medical_llm_tokens_total{operation,type}`` from ``response.usage``
+- ``medical_cache_requests_total{operation,result}``
+- ``medical_turn_duration_seconds{operation}`` for whole consultations
+- ``medical_safety_flags_total{category}``, responses per keyword category
+- ``medical_llm_escalations_total{operation,reason}``, retries on a larger model
+- ``medical_llm_hedges_total{provider,outcome}``, hedged calls by winner
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import atexit
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from src.utils.structured_logging import request_id_var
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    "medical_node_duration_seconds": "Wall time of each workflow node",
+    "medical_node_errors_total": "Workflow node invocations that raised",
+    "medical_llm_duration_seconds": "Wall time of each LLM call, retries included",
+    "medical_llm_errors_total": "LLM calls that raised",
+    "medical_llm_time_to_first_token_seconds": "Delay before the first streamed chunk",
+    "medical_llm_tokens_total": "Tokens reported by the LLM API",
+    "medical_cache_requests_total": "Response cache lookups by result",
+    "medical_turn_duration_seconds": "Wall time of a whole consultation turn",
+    "medical_safety_flags_total": "Responses flagged by safety_check, per keyword category",
+    "medical_llm_escalations_total": "LLM answers retried on the next model tier",
+    "medical_llm_hedges_total": "Hedged LLM calls, by the provider whose answer won"
+}
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[_Labels, float]] = {}
+_histograms: Dict[str, Dict[_Labels, List[float]]] = {}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar(
+    "current_span", default=None)
+_span_log_path: Optional[str] = os.getenv("MEDICAL_SPAN_LOG") or None
+_span_log_lock = threading.Lock()
+# Started on the first span written, not at import
+_span_listener: Optional[logging.handlers.QueueListener] = None
+_span_logger = logging.getLogger("medical.spans")
+_span_logger.propagate = False
+_span_logger.setLevel(logging.INFO)
+
+
+def _labels(labels: Dict[str, Any]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, amount: float = 1.0, **labels) -> None:
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + amount
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Add ``value`` to histogram ``name``; each series holds one count per
+    bucket followed by the sum and the total count"""
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0.0] * (len(DURATION_BUCKETS) + 2)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                values[i] += 1
+        values[-2] += value
+        values[-1] += 1
+
+
+def _format_labels(labels: _Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, values in sorted(series.items()):
+                for bound, count in zip(DURATION_BUCKETS, values):
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {count:g}")
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {values[-1]:g}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {values[-1]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def configure_span_log(path: Optional[str]) -> None:
+    """Append finished spans to ``path`` as JSON lines (None turns it off)"""
+    global _span_log_path
+    shutdown_span_log()
+    _span_log_path = path
+
+
+def shutdown_span_log() -> None:
+    """Flush queued spans and stop the writer thread"""
+    global _span_listener
+    with _span_log_lock:
+        if _span_listener is not None:
+            _span_listener.stop()
+            for handler in list(_span_logger.handlers):
+                _span_logger.removeHandler(handler)
+                handler.close()
+            for handler in _span_listener.handlers:
+                handler.close()
+            _span_listener = None
+
+
+def _start_span_log(path: str) -> None:
+    global _span_listener
+    with _span_log_lock:
+        if _span_listener is not None:
+            return
+        file_handler = logging.FileHandler(path, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        span_queue: queue.Queue = queue.Queue(-1)
+        _span_logger.addHandler(logging.handlers.QueueHandler(span_queue))
+        _span_listener = logging.handlers.QueueListener(span_queue, file_handler)
+        _span_listener.start()
+    atexit.unregister(shutdown_span_log)
+    atexit.register(shutdown_span_log)
+
+
+def _write_span(entry: Dict[str, Any]) -> None:
+    path = _span_log_path
+    if path is None:
+        return
+    if _span_listener is None:
+        _start_span_log(path)
+    _span_logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class Span:
+    """One timed operation. ``kind`` ("turn", "node" or "llm") selects the
+    metric family the duration is recorded in."""
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        request_id = request_id_var.get()
+        if request_id:
+            self.attributes["request.id"] = request_id
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._first_token_recorded = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def first_token(self) -> None:
+        """Mark the arrival of the first streamed chunk"""
+        if not self._first_token_recorded:
+            self._first_token_recorded = True
+            observe("medical_llm_time_to_first_token_seconds",
+                    time.perf_counter() - self._start, operation=self.name)
+
+    def record_usage(self, usage: Any) -> None:
+        """Count the prompt and completion tokens of a response's usage"""
+        if usage is None:
+            return
+        for kind in ("prompt", "completion"):
+            tokens = getattr(usage, f"{kind}_tokens", None)
+            if isinstance(tokens, (int, float)):
+                inc("medical_llm_tokens_total", tokens,
+                    operation=self.name, type=kind)
+                self.attributes[f"llm.usage.{kind}_tokens"] = tokens
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        duration = time.perf_counter() - self._start
+        label = "node" if self.kind == "node" else "operation"
+        observe(f"medical_{self.kind}_duration_seconds",
+                duration, **{label: self.name})
+        if error is not None:
+            inc(f"medical_{self.kind}_errors_total", **{label: self.name})
+        if _span_log_path is None:
+            return
+        if error is not None:
+            self.attributes["exception.type"] = type(error).__name__
+            self.attributes["exception.message"] = str(error)[:200]
+        _write_span({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + int(duration * 1e9),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR" if error is not None else "OK"}
+        })
+
+
+def start_span(name: str, kind: str = "llm", **attributes) -> Span:
+    """Span under the current one that the caller ends explicitly; for
+    generators, which may resume in a different context"""
+    return Span(name, kind, _current_span.get(), **attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = "node", **attributes) -> Iterator[Span]:
+    current = start_span(name, kind, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.end(e)
+        raise
+    except BaseException:
+        # Cancellation or a consumer closing a stream early is not an error
+        current.end()
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+
+
+def trace_node(name: str, fn: Callable) -> Callable:
+    """Wrap a graph node so each invocation is recorded as a span"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def traced_async(state):
+            with span(name, "node"):
+                return await fn(state)
+        return traced_async
+
+    @functools.wraps(fn)
+    def traced(state):
+        with span(name, "node"):
+            return fn(state)
+    return traced
+
+
+def record_safety_flags(categories) -> None:
+    for category in categories:
+        inc("medical_safety_flags_total", category=category)
+
+
+def record_escalation(operation: str, reason: str) -> None:
+    inc("medical_llm_escalations_total", operation=operation, reason=reason)
+
+
+def record_cache(operation: str, hit: bool) -> None:
+    inc("medical_cache_requests_total", operation=operation,
+        result="hit" if hit else "miss")
@@ -0,0 +1,4 @@
+import os
+
+# The Groq clients are only constructed, never called, by the tests
+os.environ.setdefault("GROQ_API_KEY", "test-key")
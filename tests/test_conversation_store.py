@@ -0,0 +1,91 @@
+"""Session conversations: the in-memory window, paging older messages
+back from the store, the cap on pages shown and eviction of idle sessions."""
+import time
+import pytest
+from src.utils.conversation_store import ConversationStore, SessionConversation
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConversationStore(str(tmp_path / "history.sqlite3"))
+    yield store
+    store.close()
+
+
+def conversation_with(store, count, window=4, max_earlier=6, session="s1"):
+    conversation = SessionConversation(store, session, window=window, max_earlier=max_earlier)
+    for i in range(count):
+        conversation.append("user" if i % 2 == 0 else "assistant", f"m{i}")
+    return conversation
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+def test_only_the_window_stays_in_memory(store):
+    conversation = conversation_with(store, 10)
+    assert contents(conversation.recent) == ["m6", "m7", "m8", "m9"]
+    assert conversation.hidden_count() == 6
+    assert contents(store.page("s1", 10, 100)) == [f"m{i}" for i in range(10)]
+
+
+def test_pages_come_back_oldest_first_until_none_are_hidden(store):
+    conversation = conversation_with(store, 10)
+    conversation.load_earlier(limit=3)
+    assert contents(conversation.visible()) == ["m3", "m4", "m5", "m6", "m7", "m8", "m9"]
+    conversation.load_earlier(limit=3)
+    assert contents(conversation.earlier) == ["m0", "m1", "m2", "m3", "m4", "m5"]
+    assert conversation.hidden_count() == 0
+    assert conversation.gap_count() == 0
+
+
+def test_earlier_messages_are_capped_and_the_window_slides_back(store):
+    conversation = conversation_with(store, 20, max_earlier=6)
+    for _ in range(4):
+        conversation.load_earlier(limit=3)
+    # The oldest pages asked for are shown; the newest loaded are dropped
+    assert contents(conversation.earlier) == [f"m{i}" for i in range(4, 10)]
+    assert conversation.gap_count() == 6
+    assert conversation.hidden_count() == 4
+    conversation.load_earlier(limit=3)
+    assert contents(conversation.earlier) == [f"m{i}" for i in range(1, 7)]
+    assert conversation.hidden_count() == 1
+
+
+def test_new_messages_after_paging_leave_a_gap_not_a_repeat(store):
+    conversation = conversation_with(store, 10)
+    conversation.load_earlier(limit=3)
+    conversation.append("user", "m10")
+    assert contents(conversation.earlier) == ["m3", "m4", "m5"]
+    assert conversation.gap_count() == 1
+    conversation.load_earlier(limit=3)
+    assert contents(conversation.earlier) == ["m0", "m1", "m2", "m3", "m4", "m5"]
+
+
+def test_hide_and_clear(store):
+    conversation = conversation_with(store, 10)
+    conversation.load_earlier(limit=3)
+    conversation.hide_earlier()
+    assert conversation.earlier == [] and conversation.hidden_count() == 6
+    conversation.clear("s2")
+    assert (conversation.session, conversation.count, conversation.hidden_count()) == ("s2", 0, 0)
+    assert store.page("s1", 100, 100) == []
+
+
+def test_idle_sessions_are_evicted(store):
+    store.session_ttl = 0
+    conversation = conversation_with(store, 10)
+    time.sleep(0.01)
+    assert store.evict_stale() == 1
+    # The live session notices the loss and stops offering older pages
+    conversation.load_earlier(limit=3)
+    assert conversation.earlier == []
+    assert conversation.hidden_count() == 0
+
+
+def test_failed_store_write_keeps_the_chat_going(store):
+    conversation = conversation_with(store, 2)
+    store.close()
+    conversation.append("user", "still here")
+    assert contents(conversation.recent)[-1] == "still here"
@@ -0,0 +1,82 @@
+"""Nearest-facility lookup: the grid search must return exactly what a
+brute-force scan over every qualifying facility returns."""
+import numpy as np
+import pytest
+from src.integrations import emergency_services
+from src.integrations.emergency_services import DEFAULT_HOSPITAL, find_nearest_hospital
+from src.integrations.facilities import FacilityIndex, haversine_km, load_facilities
+
+TAGS = ["emergency", "pediatric", "trauma_1", "burns"]
+
+
+def random_index(count=3000, seed=7):
+    rng = np.random.default_rng(seed)
+    # Uniform over the sphere, plus a dense city and sites at the edges
+    lats = list(np.degrees(np.arcsin(rng.uniform(-1, 1, count))))
+    lons = list(rng.uniform(-180, 180, count))
+    lats += list(rng.normal(48.85, 0.05, 300)) + [90.0, -90.0, 89.9, 0.0, 0.0]
+    lons += list(rng.normal(2.35, 0.05, 300)) + [0.0, 45.0, -179.9, 179.99, -180.0]
+    capabilities = [[tag for tag in TAGS if rng.random() < 0.3] for _ in lats]
+    return FacilityIndex([f"F{i}" for i in range(len(lats))], [""] * len(lats),
+                         lats, lons, capabilities)
+
+
+INDEX = random_index()
+
+
+def brute_force(index, lat, lon, k, capabilities):
+    ids = [i for i, tags in enumerate(index.capabilities) if set(capabilities) <= set(tags)]
+    distances = haversine_km(lat, lon, index.latitudes[ids], index.longitudes[ids])
+    return sorted(np.round(distances, 3))[:k]
+
+
+QUERIES = [(48.86, 2.34), (89.95, 120.0), (-89.99, -10.0), (0.0, 179.95),
+           (10.0, -179.99), (-33.9, 151.2), (0.0, 0.0)] + [
+    (float(np.degrees(np.arcsin(u))), float(v))
+    for u, v in np.random.default_rng(1).uniform((-1, -180), (1, 180), (60, 2))]
+
+
+@pytest.mark.parametrize("capabilities", [(), ("emergency",), ("pediatric", "burns"),
+                                          ("emergency", "trauma_1", "burns")])
+@pytest.mark.parametrize("k", [1, 5])
+def test_grid_search_matches_brute_force(k, capabilities):
+    for lat, lon in QUERIES:
+        found = [f.distance_km for f in INDEX.nearest(lat, lon, k, capabilities)]
+        assert found == brute_force(INDEX, lat, lon, k, capabilities), (lat, lon)
+
+
+def test_results_are_nearest_first_and_have_the_capabilities():
+    found = INDEX.nearest(48.86, 2.34, 5, ["pediatric"])
+    assert [f.distance_km for f in found] == sorted(f.distance_km for f in found)
+    assert all("pediatric" in f.capabilities for f in found)
+
+
+def test_unknown_capability_or_bad_k_finds_nothing():
+    assert INDEX.nearest(0.0, 0.0, 1, ["helipad"]) == []
+    assert INDEX.nearest(0.0, 0.0, 0) == []
+
+
+def test_load_skips_rows_without_valid_coordinates(tmp_path):
+    path = tmp_path / "facilities.csv"
+    path.write_text(
+        "name,address,lat,lng,capabilities,trauma_level\n"
+        "Near,1 Rue A,48.85,2.35,emergency|pediatric,2\n"
+        "Far,2 Rue B,45.76,4.84,emergency,\n"
+        "Broken,3 Rue C,not a number,2.35,emergency,\n"
+        "Outside,4 Rue D,95.0,2.35,emergency,\n", encoding="utf-8")
+    index = load_facilities(str(path))
+    assert len(index) == 2
+    nearest = index.nearest(48.9, 2.3, 1, ["trauma_2"])[0]
+    assert (nearest.name, nearest.capabilities) == ("Near", ("emergency", "pediatric", "trauma_2"))
+
+
+def test_nearest_hospital_falls_back_to_the_placeholder():
+    emergency_services.set_facility_index(INDEX)
+    try:
+        found = find_nearest_hospital((48.86, 2.34))
+        assert "distance_km" in found and "emergency" in found["capabilities"]
+        assert find_nearest_hospital(None) == DEFAULT_HOSPITAL
+        emergency_services.set_facility_index(None)
+        assert find_nearest_hospital((48.86, 2.34)) == DEFAULT_HOSPITAL
+    finally:
+        emergency_services.set_facility_index(None)
@@ -0,0 +1,206 @@
+"""The LLM gateways against fake clients: retries and backoff, the
+shared deadline, and circuit breaker bookkeeping (a half-open trial slot
+must be released however an attempt ends)."""
+from types import SimpleNamespace
+import asyncio
+import time
+import httpx
+import pytest
+from groq import APIConnectionError, RateLimitError
+from src.utils.llm_gateway import (
+    AsyncLLMGateway,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    LLMGateway
+)
+
+REQUEST = {"model": "fake-model", "messages": [{"role": "user", "content": "hello"}]}
+
+
+def _response(text="answer"):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeClient:
+    def __init__(self, latency=0.0, error=None):
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, timeout=None, **request):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return _response()
+
+
+class AsyncFakeClient(FakeClient):
+    async def create(self, timeout=None, **request):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return _response()
+
+
+class FlakyClient(FakeClient):
+    """Raises each of ``errors`` in turn, then answers"""
+
+    def __init__(self, *errors):
+        super().__init__()
+        self.errors = list(errors)
+        self.timeouts = []
+
+    def create(self, timeout=None, **request):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.errors:
+            raise self.errors.pop(0)
+        return _response()
+
+
+def _connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "http://llm.test/"))
+
+
+def _rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers,
+                              request=httpx.Request("POST", "http://llm.test/"))
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def _gateway(client, **options):
+    return LLMGateway(client, backoff_base=0.001, backoff_cap=0.001, **options)
+
+
+def test_retryable_errors_are_retried():
+    client = FlakyClient(_connection_error(), _rate_limit_error())
+    assert _gateway(client).chat.completions.create(**REQUEST).choices[0].message.content == "answer"
+    assert client.calls == 3
+
+
+def test_gives_up_after_max_retries():
+    client = FlakyClient(*[_connection_error() for _ in range(5)])
+    with pytest.raises(APIConnectionError):
+        _gateway(client, max_retries=2).chat.completions.create(**REQUEST)
+    assert client.calls == 3
+
+
+def test_non_retryable_errors_are_not_retried():
+    client = FlakyClient(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        _gateway(client).chat.completions.create(**REQUEST)
+    assert client.calls == 1
+
+
+def test_retry_after_is_honoured_and_pauses_the_buckets():
+    client = FlakyClient(_rate_limit_error(retry_after=0.2))
+    gateway = _gateway(client, requests_per_minute=6000)
+    start = time.monotonic()
+    gateway.chat.completions.create(**REQUEST)
+    assert time.monotonic() - start >= 0.2
+    assert client.calls == 2
+    # Other callers of the same gateway hold off too
+    assert gateway.request_bucket.paused_until >= start + 0.2
+
+
+def test_retries_share_one_deadline():
+    client = FlakyClient(_rate_limit_error(retry_after=0.3), _rate_limit_error(retry_after=0.3))
+    start = time.monotonic()
+    with pytest.raises(RateLimitError):
+        # A second wait of 0.3s would end past the deadline
+        _gateway(client).chat.completions.create(deadline=0.5, **REQUEST)
+    assert time.monotonic() - start < 0.5
+    assert client.calls == 2
+    # Each attempt only gets what is left of the deadline
+    assert client.timeouts[1] < client.timeouts[0] <= 0.5
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast():
+    client = FlakyClient(*[_connection_error() for _ in range(10)])
+    gateway = _gateway(client, max_retries=0,
+                       breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0))
+    for _ in range(2):
+        with pytest.raises(APIConnectionError):
+            gateway.chat.completions.create(**REQUEST)
+    with pytest.raises(CircuitOpenError):
+        gateway.chat.completions.create(**REQUEST)
+    assert client.calls == 2
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_half_open_trial_success_closes_the_breaker():
+    breaker = _half_open_breaker()
+    gateway = LLMGateway(FakeClient(), breaker=breaker)
+    gateway.chat.completions.create(**REQUEST)
+    assert breaker.state == "closed"
+
+
+def test_only_one_half_open_trial_at_a_time():
+    breaker = _half_open_breaker()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_rate_limit_deadline_releases_the_trial():
+    breaker = _half_open_breaker()
+    client = FakeClient()
+    gateway = LLMGateway(client, requests_per_minute=1, breaker=breaker)
+    # Use up the only request of this minute
+    gateway.request_bucket.acquire(1, None)
+    with pytest.raises(DeadlineExceededError):
+        gateway.chat.completions.create(deadline=0.05, **REQUEST)
+    assert client.calls == 0
+    assert not breaker._trial_in_flight
+    breaker.before_call()
+
+
+def test_non_retryable_error_releases_the_trial():
+    breaker = _half_open_breaker()
+    gateway = LLMGateway(FakeClient(error=ValueError("bad request")), breaker=breaker)
+    with pytest.raises(ValueError):
+        gateway.chat.completions.create(**REQUEST)
+    assert not breaker._trial_in_flight
+
+
+def test_async_rate_limit_deadline_releases_the_trial():
+    breaker = _half_open_breaker()
+    gateway = AsyncLLMGateway(AsyncFakeClient(), requests_per_minute=1, breaker=breaker)
+
+    async def run():
+        await gateway.request_bucket.acquire(1, None)
+        with pytest.raises(DeadlineExceededError):
+            await gateway.chat.completions.create(deadline=0.05, **REQUEST)
+
+    asyncio.run(run())
+    assert not breaker._trial_in_flight
+
+
+def test_async_cancellation_releases_the_trial():
+    breaker = _half_open_breaker()
+    client = AsyncFakeClient(latency=5.0)
+    gateway = AsyncLLMGateway(client, breaker=breaker)
+
+    async def run():
+        task = asyncio.ensure_future(gateway.chat.completions.create(**REQUEST))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not breaker._trial_in_flight
+    # The next caller gets the trial instead of an open circuit
+    client.latency = 0.0
+    asyncio.run(gateway.chat.completions.create(**REQUEST))
+    assert breaker.state == "closed"
@@ -0,0 +1,73 @@
+"""Model tiers: parsing the route table and escalating an extraction to
+the next tier only when the answer is unusable."""
+import json
+from types import SimpleNamespace
+import pytest
+from src.utils import safety
+from src.utils.model_routing import DEFAULT_ROUTES, ModelRoute, parse_routes, set_routes
+
+ROUTES = {"extract_symptoms": [{"model": "small"}, {"model": "large"}]}
+
+
+class ScriptedClient:
+    """Answers each model with its scripted content and records the calls"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.models = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, **request):
+        self.models.append(model)
+        message = SimpleNamespace(content=self.answers[model])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def symptoms_json(*names):
+    return json.dumps({"symptoms": [{"name": name} for name in names]})
+
+
+@pytest.fixture(autouse=True)
+def two_tiers():
+    set_routes(ROUTES)
+    safety.set_response_cache(None)
+    yield
+    set_routes(None)
+    safety.set_response_cache(safety.MemoryCache())
+
+
+def test_missing_fields_default_to_the_first_default_tier():
+    routes = parse_routes({"extract_symptoms": [{"model": "large", "temperature": 0.5}]})
+    base = DEFAULT_ROUTES["extract_symptoms"][0]
+    assert routes["extract_symptoms"] == [ModelRoute("large", base.max_tokens, 0.5)]
+    assert routes["generate_recommendations"] == DEFAULT_ROUTES["generate_recommendations"]
+
+
+def test_empty_tier_list_is_rejected():
+    with pytest.raises(ValueError):
+        parse_routes({"extract_symptoms": []})
+
+
+def test_usable_answer_stays_on_the_first_tier():
+    client = ScriptedClient({"small": symptoms_json("headache"), "large": symptoms_json()})
+    assert safety.extract_symptoms("a pounding headache since noon", client) == ["headache"]
+    assert client.models == ["small"]
+
+
+def test_unparseable_answer_escalates():
+    client = ScriptedClient({"small": "I think a headache", "large": symptoms_json("headache")})
+    assert safety.extract_symptoms("a pounding headache since noon", client) == ["headache"]
+    assert client.models == ["small", "large"]
+
+
+def test_answer_missing_every_lexicon_symptom_escalates():
+    client = ScriptedClient({"small": symptoms_json("fatigue"), "large": symptoms_json("headache")})
+    assert safety.extract_symptoms("a pounding headache since noon", client) == ["headache"]
+    assert client.models == ["small", "large"]
+
+
+def test_denied_symptom_missing_from_the_answer_does_not_escalate():
+    client = ScriptedClient({"small": symptoms_json("malaise"), "large": symptoms_json("fever")})
+    assert safety.extract_symptoms("no fever, just feeling off since monday", client) == ["malaise"]
+    assert client.models == ["small"]
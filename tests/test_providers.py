@@ -0,0 +1,207 @@
+"""Hedging, cancellation and circuit breaking of the provider layer,
+against local fake providers with injectable latency and failures."""
+from types import SimpleNamespace
+import asyncio
+import threading
+import time
+import pytest
+from src.utils.llm_gateway import CircuitOpenError
+from src.utils.providers import AsyncHedgedClient, HedgedClient
+
+REQUEST = {"model": "fake-model", "messages": [{"role": "user", "content": "hello"}]}
+
+
+def _response(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeProvider:
+    """Groq-shaped client answering ``text`` after ``latency`` seconds, or
+    raising ``error``"""
+
+    def __init__(self, text="answer", latency=0.0, error=None):
+        self.text = text
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+        self.finished = threading.Event()
+        self.chat = self
+        self.completions = self
+
+    def create(self, **request):
+        self.calls += 1
+        try:
+            time.sleep(self.latency)
+            if self.error is not None:
+                raise self.error
+            return _response(self.text)
+        finally:
+            self.finished.set()
+
+
+class AsyncFakeProvider(FakeProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cancelled = False
+
+    async def create(self, **request):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return _response(self.text)
+
+
+def _half_open(client, name):
+    breaker = client.health[name].breaker
+    breaker.reset_timeout = 0.0
+    breaker.opened_at = time.monotonic()
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_fast_primary_is_not_hedged():
+    primary, alternate = FakeProvider("primary"), FakeProvider("alternate")
+    client = HedgedClient([("primary", primary), ("alternate", alternate)],
+                          default_hedge_delay=0.5)
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "primary"
+    assert alternate.calls == 0
+
+
+def test_slow_primary_is_hedged_to_the_alternate():
+    primary = FakeProvider("primary", latency=1.0)
+    alternate = FakeProvider("alternate", latency=0.01)
+    client = HedgedClient([("primary", primary), ("alternate", alternate)],
+                          default_hedge_delay=0.05)
+    start = time.monotonic()
+    response = client.chat.completions.create(**REQUEST)
+    assert response.choices[0].message.content == "alternate"
+    assert time.monotonic() - start < 0.5
+    assert client.health_report()["alternate"]["hedge_wins"] == 1
+
+
+def test_failing_primary_hands_over_without_waiting():
+    primary = FakeProvider(error=RuntimeError("boom"))
+    alternate = FakeProvider("alternate")
+    client = HedgedClient([("primary", primary), ("alternate", alternate)],
+                          default_hedge_delay=5.0)
+    start = time.monotonic()
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "alternate"
+    assert time.monotonic() - start < 1.0
+    assert client.health_report()["primary"]["failures"] == 1
+
+
+def test_empty_answer_counts_as_a_failure():
+    client = HedgedClient([("primary", FakeProvider("  ")), ("alternate", FakeProvider("ok"))])
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "ok"
+    assert client.health_report()["primary"]["failures"] == 1
+
+
+def test_open_breaker_skips_the_provider():
+    primary, alternate = FakeProvider("primary"), FakeProvider("alternate")
+    client = HedgedClient([("primary", primary), ("alternate", alternate)])
+    for _ in range(3):
+        client.health["primary"].breaker.record_failure()
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "alternate"
+    assert primary.calls == 0
+
+
+def test_every_provider_failing_raises_the_last_error():
+    client = HedgedClient([("primary", FakeProvider(error=RuntimeError("first"))),
+                           ("alternate", FakeProvider(error=RuntimeError("second")))])
+    with pytest.raises(RuntimeError, match="second"):
+        client.chat.completions.create(**REQUEST)
+
+
+def test_sync_loser_releases_its_half_open_trial():
+    primary = FakeProvider("primary", latency=0.3)
+    client = HedgedClient([("primary", primary), ("alternate", FakeProvider("alternate"))],
+                          default_hedge_delay=0.05)
+    breaker = _half_open(client, "primary")
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "alternate"
+    # The abandoned call still settles the breaker once it returns
+    assert primary.finished.wait(2.0)
+    time.sleep(0.05)
+    assert not breaker._trial_in_flight
+    assert breaker.state == "closed"
+
+
+def test_async_slow_primary_is_hedged_and_cancelled():
+    primary = AsyncFakeProvider("primary", latency=1.0)
+    alternate = AsyncFakeProvider("alternate", latency=0.01)
+    client = AsyncHedgedClient([("primary", primary), ("alternate", alternate)],
+                               default_hedge_delay=0.05)
+
+    async def run():
+        response = await client.chat.completions.create(**REQUEST)
+        # Give the cancelled task a turn to unwind
+        await asyncio.sleep(0.01)
+        return response
+
+    start = time.monotonic()
+    assert asyncio.run(run()).choices[0].message.content == "alternate"
+    assert time.monotonic() - start < 0.5
+    assert primary.cancelled
+    assert client.health_report()["alternate"]["hedge_wins"] == 1
+
+
+def test_async_cancelled_loser_frees_its_half_open_trial():
+    primary = AsyncFakeProvider("primary", latency=1.0)
+    client = AsyncHedgedClient([("primary", primary), ("alternate", AsyncFakeProvider("alternate"))],
+                               default_hedge_delay=0.05)
+    breaker = _half_open(client, "primary")
+
+    async def run():
+        await client.chat.completions.create(**REQUEST)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert primary.cancelled
+    assert not breaker._trial_in_flight
+    # Still half-open, so the next call may try the primary again
+    primary.latency = 0.0
+    assert asyncio.run(client.chat.completions.create(**REQUEST)).choices[0].message.content == "primary"
+    assert breaker.state == "closed"
+
+
+def test_async_caller_cancellation_cancels_every_attempt():
+    primary = AsyncFakeProvider(latency=1.0)
+    alternate = AsyncFakeProvider(latency=1.0)
+    client = AsyncHedgedClient([("primary", primary), ("alternate", alternate)],
+                               default_hedge_delay=0.01)
+
+    async def run():
+        task = asyncio.ensure_future(client.chat.completions.create(**REQUEST))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert primary.cancelled and alternate.cancelled
+    assert not client.health["primary"].breaker._trial_in_flight
+
+
+def test_no_provider_available():
+    client = HedgedClient([("primary", FakeProvider())])
+    for _ in range(3):
+        client.health["primary"].breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        client.chat.completions.create(**REQUEST)
+
+
+def test_call_queued_on_a_busy_pool_is_not_hedged_early():
+    primary = FakeProvider("primary", latency=0.01)
+    alternate = FakeProvider("alternate")
+    client = HedgedClient([("primary", primary), ("alternate", alternate)],
+                          max_workers=1, default_hedge_delay=0.1)
+    # The only worker is busy for longer than the hedge delay
+    client._executor.submit(time.sleep, 0.3)
+    assert client.chat.completions.create(**REQUEST).choices[0].message.content == "primary"
+    assert alternate.calls == 0
+    assert client.health_report()["primary"]["hedge_wins"] == 0
@@ -0,0 +1,68 @@
+"""Red-flag screening: the phrases that skip straight to the emergency
+answer, and the denials and past history that must not."""
+import pytest
+from src.knowledge_graph.red_flags import screen_emergency
+from src.knowledge_graph.symptom_lexicon import match_symptoms
+
+
+@pytest.mark.parametrize("text, reason", [
+    ("Crushing chest pain since an hour", "crushing chest pain"),
+    ("I have chest pain", "chest pain"),
+    ("my chest-pain is back", "chest-pain"),
+    ("I'm really short of breath", "short of breath"),
+    ("I think I'm having a stroke", "stroke"),
+    ("I had a stroke this morning", "stroke"),
+    ("I think I just had a heart attack", "heart attack"),
+    ("her lips are blue, blue lips", "blue lips"),
+    ("No fever, but crushing chest pain", "crushing chest pain"),
+    ("no cough and chest pain", "chest pain"),
+    ("I want to kill myself", "kill myself"),
+])
+def test_red_flags_are_screened(text, reason):
+    assert screen_emergency(text) == reason
+
+
+@pytest.mark.parametrize("text", [
+    "no chest pain",
+    "I don't have chest pain",
+    "I haven't had any chest pain",
+    "I didn't have chest pain today",
+    "I wasn't short of breath",
+    "never had a seizure",
+    "denies shortness of breath",
+    "I haven’t had chest pain",
+])
+def test_denied_red_flags_are_not_screened(text):
+    assert screen_emergency(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "My dad had a stroke years ago",
+    "history of heart attack, now a mild headache",
+    "previous stroke in 2019",
+])
+def test_past_history_is_not_screened(text):
+    assert screen_emergency(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "a mild headache and a runny nose",
+    "a heatstroke warning was on the news",
+    "I had strokes of luck",
+    None,
+    42,
+])
+def test_no_red_flag(text):
+    assert screen_emergency(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "I haven't had any chest pain",
+    "I didn't have shortness of breath",
+    "I wasn't short of breath",
+])
+def test_lexicon_and_screen_agree_on_denials(text):
+    # The local matcher leaves a denial to the LLM; the screen ignores it
+    assert match_symptoms(text).confidence == 0.0
+    assert screen_emergency(text) is None
@@ -0,0 +1,74 @@
+"""Safety keyword scanning: whole-word matches, case-sensitive
+abbreviations, and streamed chunks scanning the same as the joined text."""
+import pytest
+from src.utils.safety import safety_check, stream_safety_check
+from src.utils.safety_scanner import SAFETY_KEYWORD_CATEGORIES, SafetyScanner
+
+SCANNER = SafetyScanner(SAFETY_KEYWORD_CATEGORIES)
+
+
+@pytest.mark.parametrize("text, categories", [
+    ("Go to the ER now", {"emergency_care"}),
+    ("Call 911.", {"emergency_care"}),
+    ("This is URGENT", {"urgency"}),
+    ("a severe, life-threatening reaction", {"urgency", "danger"}),
+    ("(hospital)", {"emergency_care"}),
+])
+def test_keywords_are_found(text, categories):
+    assert SCANNER.scan(text) == categories
+
+
+@pytest.mark.parametrize("text", [
+    "A mild fever usually passes after a few days; tell her to rest.",
+    "go to the er",
+    "a non-emergency clinic",
+    "hospitalisation is rarely needed",
+    "call 9110",
+    "",
+])
+def test_partial_words_and_lowercase_abbreviations_are_not_found(text):
+    assert SCANNER.scan(text) == frozenset()
+
+
+def scan_in_chunks(text, size):
+    scan = SCANNER.stream()
+    for start in range(0, len(text), size):
+        scan.feed(text[start:start + size])
+    return scan.finish()
+
+
+@pytest.mark.parametrize("text", [
+    "Go to the ER now",
+    "Fever after the ERs closed",
+    "the hospitality was severe",
+    "a non-emergency, then an emergency",
+    "ambulances are not an ambulance",
+    "life-threatening",
+    "x" * 40 + " 911",
+    "911" + "x" * 40,
+])
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_streamed_chunks_scan_like_the_joined_text(text, size):
+    assert scan_in_chunks(text, size) == SCANNER.scan(text)
+
+
+def test_keyword_split_across_chunks_is_found():
+    scan = SCANNER.stream()
+    for chunk in ["Please go to the hosp", "ital"]:
+        scan.feed(chunk)
+    assert scan.finish() == {"emergency_care"}
+
+
+def test_keyword_prefix_at_chunk_end_is_held_back():
+    scan = SCANNER.stream()
+    scan.feed("see the hospital")
+    scan.feed("ity desk")
+    assert scan.finish() == frozenset()
+
+
+@pytest.mark.parametrize("chunks", [
+    ["Rest and drink ", "fluids after the fever."],
+    ["If it gets wor", "se, go to the E", "R."],
+])
+def test_stream_safety_check_matches_safety_check(chunks):
+    assert "".join(stream_safety_check(chunks)) == safety_check("".join(chunks))
@@ -0,0 +1,128 @@
+"""Which recommendation requests the semantic index lets share an answer."""
+import pytest
+from src.utils.semantic_cache import SemanticIndex, describe, embed
+
+HISTORY = {"allergies": ["penicillin"], "conditions": []}
+
+REWORDINGS = [
+    (["headache", "headache_intensity: bad", "headache_onset: since morning"],
+     ["headache", "headache_intensity: severe", "headache_onset: since this morning"]),
+    (["fever", "fever_duration: 2 days"],
+     ["Fever", "fever_duration: 2 days"]),
+    (["cough", "cough_frequency: all the time at night"],
+     ["cough", "cough_frequency: at night all the time"]),
+    (["headache", "headache_intensity: bad",
+      "headache_location: throbbing pain behind the eyes"],
+     ["headache", "headache_intensity: severe",
+      "headache_location: throbbing pain behind both eyes"]),
+]
+
+# Details both requests share, so only one detail tells them apart
+SHARED = ["headache", "headache_intensity: bad", "headache_duration: for two days",
+          "headache_frequency: constant, all day long", "headache_location: behind the eyes"]
+
+CLINICALLY_DIFFERENT = [
+    (SHARED + ["headache_onset: started suddenly"],
+     SHARED + ["headache_onset: started gradually"]),
+    (SHARED + ["headache_associated_nausea: yes, vomited twice"],
+     SHARED + ["headache_associated_nausea: none at all"]),
+    (SHARED + ["headache_response_to_medication: ibuprofen helps a lot"],
+     SHARED + ["headache_response_to_medication: ibuprofen does nothing"]),
+    (SHARED + ["headache_radiation: into the neck"],
+     SHARED + ["headache_radiation: into the jaw"]),
+    (["fever", "fever_max_temperature: 39"],
+     ["fever", "fever_max_temperature: 41"]),
+    (["chest_pain", "chest_pain_intensity: mild"],
+     ["chest_pain", "chest_pain_intensity: severe"]),
+    (SHARED, SHARED + ["headache_onset: sudden"]),
+]
+
+
+def _probe(symptoms, history=HISTORY):
+    partition, details = describe(symptoms, history, prompt_version="test")
+    return partition, embed(details)
+
+
+def _shares_answer(first, second, history=HISTORY):
+    index = SemanticIndex(capacity=16)
+    index.add(*_probe(first, history), "first")
+    found = index.search(*_probe(second, history))
+    return found is not None and found[0] == "first"
+
+
+@pytest.mark.parametrize("first, second", REWORDINGS)
+def test_rewordings_share_an_answer(first, second):
+    assert _shares_answer(first, second)
+
+
+@pytest.mark.parametrize("first, second", CLINICALLY_DIFFERENT)
+def test_clinically_different_details_never_share_an_answer(first, second):
+    assert not _shares_answer(first, second)
+    assert not _shares_answer(second, first)
+
+
+def test_wording_is_compared_by_vector_within_a_partition():
+    first = ["headache", "headache_location: behind the eyes"]
+    assert _probe(first)[0] == _probe(["headache", "headache_location: behind my left eye"])[0]
+    assert _probe(first)[0] == _probe(["headache", "headache_location: in the neck"])[0]
+    assert not _shares_answer(first, ["headache", "headache_location: in the neck"])
+
+
+@pytest.mark.parametrize("first, second", [
+    (["fever", "fever_response_to_medication: paracetamol helps"],
+     ["fever", "fever_response_to_medication: paracetamol doesn't help"]),
+    (["cough", "cough_intensity: a bit"], ["cough", "cough_intensity: awful"]),
+    (["fever", "fever_duration: 2 days"], ["fever", "fever_duration: 20 days"]),
+])
+def test_negations_intensities_and_numbers_partition(first, second):
+    assert _probe(first)[0] != _probe(second)[0]
+
+
+def test_medical_history_partitions():
+    symptoms = ["headache", "headache_intensity: mild"]
+    assert _probe(symptoms, {"allergies": ["aspirin"]})[0] != _probe(symptoms)[0]
+
+
+def test_index_overwrites_the_oldest_entry_when_full():
+    index = SemanticIndex(capacity=2)
+    for days in ("1", "2", "3"):
+        index.add(*_probe(["fever", f"fever_duration: {days} days"]), days)
+    assert len(index) == 2
+    assert index.search(*_probe(["fever", "fever_duration: 1 days"])) is None
+    assert index.search(*_probe(["fever", "fever_duration: 3 days"]))[0] == "3"
+
+
+@pytest.fixture
+def semantic_safety(monkeypatch):
+    from src.utils import safety
+
+    cache = safety.MemoryCache()
+    safety.set_response_cache(cache)
+    safety.set_semantic_index(SemanticIndex(capacity=16))
+    yield safety, cache
+    safety.set_response_cache(safety.MemoryCache())
+    safety.set_semantic_index(None)
+    monkeypatch.setattr(safety, "_semantic_index_ready", False)
+
+
+def test_semantic_hits_are_counted_apart_from_exact_hits(semantic_safety):
+    safety, cache = semantic_safety
+    first = ["headache", "headache_onset: since morning"]
+    key, probe, cached = safety._recommendation_cache_lookup(first, HISTORY)
+    assert cached is None
+    safety._recommendation_cache_store(key, probe, "Rest.")
+
+    reworded = ["headache", "headache_onset: since this morning"]
+    assert safety._recommendation_cache_lookup(reworded, HISTORY)[2] == "Rest."
+    assert safety._recommendation_cache_lookup(first, HISTORY)[2] == "Rest."
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["semantic_hits"]) == (1, 2, 1)
+
+
+def test_index_path_comes_from_the_environment(semantic_safety, monkeypatch, tmp_path):
+    safety, _ = semantic_safety
+    monkeypatch.setenv("MEDICAL_SEMANTIC_INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.setattr(safety, "_semantic_index_ready", False)
+    index = safety.get_semantic_index()
+    assert index.path == str(tmp_path / "index")
+    assert (tmp_path / "index.vectors.npy").exists()
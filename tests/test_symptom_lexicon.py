@@ -0,0 +1,66 @@
+"""Local symptom matching: the longest-match trie walk, its confidence and
+the negations that hand a message to the LLM."""
+import pytest
+from src.knowledge_graph.symptom_lexicon import SymptomMatch, canonical_symptom, match_symptoms
+
+
+@pytest.mark.parametrize("text, symptoms", [
+    ("headache", ["headache"]),
+    ("I have a headache and a fever", ["headache", "fever"]),
+    ("I'm feeling dizzy", ["dizziness"]),
+    ("Stomach ache", ["abdominal_pain"]),
+    ("sore throat, runny nose", ["sore_throat", "runny_nose"]),
+])
+def test_whole_message_of_known_phrases_matches_with_full_confidence(text, symptoms):
+    match = match_symptoms(text)
+    assert match.symptoms == symptoms
+    assert match.confidence == 1.0
+
+
+def test_longest_phrase_wins():
+    # "lower back pain" and not "back pain" plus an unknown "lower"
+    assert match_symptoms("lower back pain") == SymptomMatch(["back_pain"], 1.0)
+    assert match_symptoms("shortness of breath").symptoms == ["shortness_of_breath"]
+
+
+def test_repeated_symptom_is_reported_once():
+    assert match_symptoms("cough, dry cough, coughing").symptoms == ["cough"]
+
+
+def test_unknown_words_lower_the_confidence():
+    match = match_symptoms("severe headache for two days")
+    assert match.symptoms == ["headache"]
+    assert match.confidence == pytest.approx(1 / 5)
+
+
+@pytest.mark.parametrize("text", [
+    "no fever",
+    "I don't have a cough",
+    "headache but not nausea",
+    "never had chest pain",
+    "I haven't got a fever",
+])
+def test_negation_zeroes_the_confidence(text):
+    assert match_symptoms(text).confidence == 0.0
+
+
+def test_curly_apostrophe_negation():
+    assert match_symptoms("I don’t have a fever").confidence == 0.0
+
+
+def test_only_filler_words_match_nothing():
+    assert match_symptoms("I have been feeling") == SymptomMatch([], 0.0)
+    assert match_symptoms("") == SymptomMatch([], 0.0)
+
+
+@pytest.mark.parametrize("phrase, canonical", [
+    ("chest pains", "chest_pain"),
+    ("Chest Pain", "chest_pain"),
+    ("chest pain", "chest_pain"),
+    ("vomit", "vomiting"),
+    ("chest", None),
+    ("chest pain today", None),
+    ("", None),
+])
+def test_canonical_symptom_needs_the_whole_phrase(phrase, canonical):
+    assert canonical_symptom(phrase) == canonical
@@ -0,0 +1,72 @@
+"""Parsing of the extraction model's answer into symptom records, and its
+fallbacks for answers that are not the requested JSON."""
+import json
+from src.utils.safety import (
+    MAX_ATTRIBUTE_CHARS,
+    MAX_SYMPTOMS,
+    flatten_symptom_records,
+    parse_symptom_records
+)
+
+
+def test_json_records_keep_the_allowed_attributes():
+    text = json.dumps({"symptoms": [
+        {"name": "Chest pains", "duration": "2 hours", "intensity": "severe", "colour": "red"},
+        {"name": "nausea"}
+    ]})
+    assert parse_symptom_records(text) == [
+        {"name": "chest_pain", "duration": "2 hours", "intensity": "severe"},
+        {"name": "nausea"}
+    ]
+
+
+def test_json_is_found_inside_prose_and_after_reasoning():
+    text = ("<think>the user says fever {maybe}</think>Sure! "
+            '{"symptoms": [{"name": "fever", "max_temperature": 39.5}]} Hope this helps.')
+    assert parse_symptom_records(text) == [{"name": "fever", "max_temperature": "39.5"}]
+
+
+def test_invalid_entries_and_values_are_dropped():
+    text = json.dumps({"symptoms": [
+        {"name": ""}, {"name": 42}, {"duration": "2 days"}, None,
+        {"name": "cough", "duration": ["2 days"], "frequency": True,
+         "onset": "x" * (MAX_ATTRIBUTE_CHARS + 1), "intensity": "  mild \n"},
+        {"name": "x" * 200}
+    ]})
+    assert parse_symptom_records(text) == [{"name": "cough", "intensity": "mild"}]
+
+
+def test_bare_strings_in_the_symptoms_list():
+    assert parse_symptom_records('{"symptoms": ["headache", "Runny nose"]}') == [
+        {"name": "headache"}, {"name": "runny_nose"}]
+
+
+def test_duplicates_collapse_to_the_first_record():
+    text = json.dumps({"symptoms": [{"name": "cough", "duration": "1 day"},
+                                    {"name": "coughing"}]})
+    assert parse_symptom_records(text) == [{"name": "cough", "duration": "1 day"}]
+
+
+def test_records_are_capped():
+    text = json.dumps({"symptoms": [f"symptom {i}" for i in range(MAX_SYMPTOMS + 5)]})
+    assert len(parse_symptom_records(text)) == MAX_SYMPTOMS
+
+
+def test_comma_separated_fallback():
+    assert parse_symptom_records("headache, fever , sore throat") == [
+        {"name": "headache"}, {"name": "fever"}, {"name": "sore_throat"}]
+    # Prose is no symptom name
+    assert parse_symptom_records("I could not find " + "any symptom " * 10) == []
+
+
+def test_truncated_json_gives_no_records():
+    assert parse_symptom_records('{"symptoms": [{"name": "fever"}, {"name": "cou') == []
+    assert parse_symptom_records(None) == []
+    assert parse_symptom_records('{"symptoms": []}') == []
+
+
+def test_flatten_lists_attributes_after_their_symptom():
+    records = [{"name": "fever", "max_temperature": "39", "duration": "2 days"},
+               {"name": "cough"}]
+    assert flatten_symptom_records(records) == [
+        "fever", "fever_duration: 2 days", "fever_max_temperature: 39", "cough"]
@@ -0,0 +1,152 @@
+"""Checkpointed conversations: clarification replies, the questions asking
+for them, per-turn triage and the bounded in-memory saver."""
+import time
+from src.core.workflow import (
+    BoundedMemorySaver,
+    build_turn_input,
+    clarification_answers,
+    clarification_questions,
+    clarify_symptoms,
+    create_medical_workflow,
+    thread_config
+)
+
+TURN_SYMPTOMS = {
+    "my chest hurts a bit": ["chest_pain"],
+    "that's gone now, I just have a headache": ["headache"],
+    "a headache": ["headache"]
+}
+
+
+def make_workflow(checkpointer, missing_symptoms_fn=lambda symptoms: None):
+    return create_medical_workflow(
+        extract_fn=lambda text, client: list(TURN_SYMPTOMS.get(text, [])),
+        recommend_fn=lambda symptoms, history, client: "Rest and drink fluids.",
+        missing_symptoms_fn=missing_symptoms_fn,
+        llm_client=None,
+        emergency_screen_fn=lambda text: None,
+        checkpointer=checkpointer
+    )
+
+
+def run_turn(workflow, text, thread_id="t1"):
+    return workflow.invoke(build_turn_input(text, {}), thread_config(thread_id))
+
+
+def test_single_pending_detail_takes_the_whole_reply():
+    assert clarification_answers(["headache_duration"], "  about two   days ") == [
+        "headache_duration: about two days"]
+
+
+def test_reply_clauses_go_to_the_details_they_answer():
+    answers = clarification_answers(
+        ["headache_duration", "headache_intensity"], "since yesterday, pretty severe")
+    assert answers == ["headache_duration: since yesterday",
+                       "headache_intensity: pretty severe"]
+
+
+def test_clause_naming_a_symptom_only_answers_its_details():
+    answers = clarification_answers(
+        ["headache_duration", "fever_duration"], "the fever for 3 days")
+    assert answers == ["fever_duration: the fever for 3 days"]
+
+
+def test_decimal_point_does_not_split_a_clause():
+    answers = clarification_answers(
+        ["fever_max_temperature", "fever_duration"], "temperature 38.5 degrees, for two days")
+    assert answers == ["fever_max_temperature: temperature 38.5 degrees",
+                       "fever_duration: for two days"]
+
+
+def test_unanswered_details_stay_missing():
+    assert clarification_answers(
+        ["headache_duration", "headache_radiation"], "it is quite bad") == []
+    assert clarification_answers(["headache_duration"], "   ") == []
+    assert clarification_answers(None, "for two days") == []
+
+
+def test_pending_details_are_asked_as_questions():
+    assert clarification_questions(
+        ["chest_pain_duration", "fever_max_temperature", "back_pain_posture"]) == [
+        "How long has the chest pain lasted?",
+        "What is the highest temperature you have measured?",
+        "Could you describe the posture of the back pain?"]
+
+
+def test_clarify_node_lists_the_questions():
+    response = clarify_symptoms({"missing_symptoms": ["headache_duration"]})["response"]
+    assert response.splitlines()[1:] == ["- How long has the headache lasted?"]
+
+
+def test_clarification_reaches_the_user_through_the_workflow():
+    workflow = make_workflow(
+        BoundedMemorySaver(), missing_symptoms_fn=lambda symptoms: ["headache_onset"])
+    result = run_turn(workflow, "a headache")
+    assert result["needs_clarification"]
+    assert "- When did the headache start" in result["response"]
+
+
+def test_earlier_symptom_does_not_decide_later_triage():
+    workflow = make_workflow(BoundedMemorySaver())
+    first = run_turn(workflow, "my chest hurts a bit")
+    assert first["triage_level"] == "emergency"
+
+    second = run_turn(workflow, "that's gone now, I just have a headache")
+    assert second["triage_level"] == "non_emergency"
+    assert not second["emergency_detected"]
+    assert second["response"] == "Rest and drink fluids."
+    # The conversation still remembers both
+    assert second["symptoms"] == ["chest_pain", "headache"]
+
+
+def test_saver_keeps_only_the_latest_checkpoint():
+    saver = BoundedMemorySaver()
+    workflow = make_workflow(saver)
+    run_turn(workflow, "a headache")
+    run_turn(workflow, "a headache")
+    assert [len(checkpoints) for checkpoints in saver.storage["t1"].values()] == [1]
+
+
+def test_saver_evicts_the_least_recently_used_thread():
+    saver = BoundedMemorySaver(max_threads=2)
+    workflow = make_workflow(saver)
+    for thread_id in ("a", "b", "a", "c"):
+        run_turn(workflow, "a headache", thread_id)
+    assert set(saver.storage) == {"a", "c"}
+
+
+def test_saver_evicts_idle_threads():
+    saver = BoundedMemorySaver(thread_ttl=0)
+    workflow = make_workflow(saver)
+    run_turn(workflow, "a headache", "old")
+    time.sleep(0.01)
+    run_turn(workflow, "a headache", "new")
+    assert set(saver.storage) == {"new"}
+
+
+def test_deleted_thread_leaves_nothing_behind():
+    saver = BoundedMemorySaver()
+    workflow = make_workflow(saver)
+    run_turn(workflow, "a headache")
+    saver.delete_thread("t1")
+    assert "t1" not in saver.storage
+    assert not any(key[0] == "t1" for key in saver.writes)
+    assert not any(key[0] == "t1" for key in saver.blobs)
+    assert workflow.get_state(thread_config("t1")).values == {}
+
+
+def test_emergency_answer_names_the_nearest_facility_found():
+    hospital = {"name": "Hôpital Nord", "address": "1 Rue A", "distance": "1.2 miles",
+                "distance_km": 1.9}
+    workflow = create_medical_workflow(
+        extract_fn=lambda text, client: ["chest_pain"],
+        recommend_fn=lambda symptoms, history, client: "",
+        missing_symptoms_fn=lambda symptoms: None,
+        llm_client=None,
+        emergency_screen_fn=lambda text: None,
+        hospital_fn=lambda location: hospital if location else {"name": "placeholder"}
+    )
+    located = workflow.invoke(build_turn_input("my chest hurts", {}, (48.9, 2.3)))
+    assert "Hôpital Nord, 1 Rue A (1.2 miles)" in located["response"]
+    unlocated = workflow.invoke(build_turn_input("my chest hurts", {}))
+    assert "placeholder" not in unlocated["response"]